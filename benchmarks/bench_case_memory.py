@@ -0,0 +1,83 @@
+"""Memory footprint of compiled test cases and per-submission results.
+
+Builds a 10k-case problem (half of it batched) and reports, via tracemalloc,
+how much memory the compiled execution plan, one `Result` per case and a
+`ResultTable` take, along with the pickled size of the results.
+
+    python benchmarks/bench_case_memory.py [--cases N]
+"""
+
+from dmoj_judge.types import ExecutionPlan, Result, ResultTable
+import tracemalloc
+import argparse
+import pickle
+import time
+
+
+def build_case_configs(count: int) -> list[dict]:
+    configs: list[dict] = []
+    half = count // 2
+    for i in range(half):
+        configs.append({"in": "%d.in" % i, "out": "%d.out" % i, "points": 1})
+
+    batch_size = 10
+    for batch in range((count - half) // batch_size):
+        configs.append(
+            {
+                "batched": [
+                    {
+                        "in": "b%d.%d.in" % (batch, i),
+                        "out": "b%d.%d.out" % (batch, i),
+                    }
+                    for i in range(batch_size)
+                ],
+                "points": 5,
+                "dependencies": [batch] if batch else [],
+            }
+        )
+    return configs
+
+
+def measure(label: str, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-24s %10.1f KiB %10.2f ms" % (label, size / 1024, elapsed * 1000))
+    return value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=10000)
+    args = parser.parse_args()
+
+    configs = build_case_configs(args.cases)
+    plan = measure("execution plan", lambda: ExecutionPlan.compile(configs))
+    print("  %d cases, %d batches" % (len(plan.cases), len(plan.batches)))
+
+    results = measure(
+        "results", lambda: [Result.for_case(case) for case in plan.cases]
+    )
+
+    def fill_table() -> ResultTable:
+        table = ResultTable(len(plan.cases))
+        for result in results:
+            table.record(result)
+        return table
+
+    measure("result table", fill_table)
+
+    start = time.perf_counter()
+    pickled = [pickle.dumps(result) for result in results]
+    elapsed = time.perf_counter() - start
+    print(
+        "%-24s %10.1f KiB %10.2f ms"
+        % ("pickled results", sum(map(len, pickled)) / 1024, elapsed * 1000)
+    )
+
+
+if __name__ == "__main__":
+    main()
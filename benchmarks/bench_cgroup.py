@@ -0,0 +1,63 @@
+"""What a sandbox's usage is reported as, and what starting it costs, with and
+without a cgroup of its own.
+
+Runs a shell that starts children which allocate memory and spin, under the
+default submission profile, once limited by rlimits alone and once in a cgroup
+under the given delegated cgroup v2 directory. Without one, the usage of
+children the shell started is missed. Reports the memory and CPU time each was
+charged, and the launches per second of a trivial one. Needs the sandbox
+extension to be built.
+
+    python benchmarks/bench_cgroup.py --root /sys/fs/cgroup/judge [--launches N]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer, TracedPopen
+from dmoj_judge.executors.filesystem import Filesystem
+import argparse
+import time
+
+
+def measure(label: str, launches: int, run) -> None:
+    process = run(
+        b"for i in 1 2 3 4; do head -c 33554432 /dev/zero | tail; done"
+    )
+    start = time.perf_counter()
+    for _ in range(launches):
+        run(b"exit 0")
+    elapsed = time.perf_counter() - start
+    print(
+        "%-8s %10d KB %8.3f s %10.2f launches/s"
+        % (label, process.max_memory, process.cpu_time, launches / elapsed)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", required=True)
+    parser.add_argument("--launches", type=int, default=100)
+    args = parser.parse_args()
+
+    filesystem = Filesystem.default()
+    profile = IsolateTracer(read_fs=filesystem.read, write_fs=filesystem.write)
+
+    for cgroup in (None, args.root):
+
+        def run(script: bytes) -> TracedPopen:
+            process = TracedPopen(
+                [b"/bin/sh", b"-c", script],
+                executable=b"/bin/sh",
+                security=profile,
+                time=60,
+                memory=262144,
+                nproc=8,
+                cgroup=cgroup,
+            )
+            process.wait()
+            assert process.returncode == 0, process.protection_fault
+            return process
+
+        measure("cgroup" if cgroup else "rlimits", args.launches, run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""What opening files costs a sandboxed process, with its reads checked by the
+tracer, and with them left to Landlock.
+
+Runs a shell that opens a file many times over, under a profile that Landlock
+can enforce as a whole: recursive rules for the system directories, so that no
+symlink beside them leads into them unchecked. Reports the seconds per launch,
+checking opens through ptrace, through the seccomp supervisor, and through
+Landlock with either checking the rest.
+Needs the sandbox extension to be built, and Linux 5.13+ for Landlock.
+
+    python benchmarks/bench_landlock.py [--opens N] [--launches N]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer, TracedPopen
+from dmoj_judge.cptbox.filesystem_policies import RecursiveDir
+from dmoj_judge.cptbox.tracer import LANDLOCK_SUPPORTED
+import argparse
+import os
+import time
+
+READ_FS = [
+    RecursiveDir("/usr"),
+    RecursiveDir("/lib"),
+    RecursiveDir("/lib64"),
+    RecursiveDir("/lib32"),
+    RecursiveDir("/bin"),
+    RecursiveDir("/sbin"),
+    RecursiveDir("/etc"),
+]
+
+
+def measure(
+    label: str, profile: IsolateTracer, script: bytes, launches: int, **kwargs
+) -> None:
+    start = time.perf_counter()
+    for _ in range(launches):
+        process = TracedPopen(
+            [b"/bin/sh", b"-c", script],
+            executable=os.path.realpath("/bin/sh").encode(),
+            security=profile,
+            time=60,
+            memory=262144,
+            **kwargs,
+        )
+        process.wait()
+        assert process.returncode == 0, process.protection_fault
+    elapsed = time.perf_counter() - start
+    print("%-18s %10.4f s/launch" % (label, elapsed / launches))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--opens", type=int, default=10000)
+    parser.add_argument("--launches", type=int, default=10)
+    args = parser.parse_args()
+
+    # Only files and recursive directories, so that Landlock can enforce it.
+    read_fs = [rule for rule in READ_FS if os.path.exists(rule.path)]
+    profile = IsolateTracer(read_fs=read_fs, write_fs=[])
+    script = (
+        b"i=0; while [ $i -lt %d ]; do read x < /etc/passwd; i=$((i+1)); done"
+        % args.opens
+    )
+
+    measure("ptrace", profile, script, args.launches)
+    measure("notify", profile, script, args.launches, notify=True)
+    if not LANDLOCK_SUPPORTED:
+        print("Landlock is not supported here")
+        return
+    measure("landlock+ptrace", profile, script, args.launches, landlock=True)
+    measure(
+        "landlock+notify",
+        profile,
+        script,
+        args.launches,
+        landlock=True,
+        notify=True,
+    )
+    if not profile.landlock:
+        print("Landlock could not enforce the profile; it was not used")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Throughput of path-heavy sandboxes running side by side in one process.
+
+Runs a shell reading many files under the default submission profile, with
+one and with several launches at once. Path checks decided natively don't
+take the GIL, so the launches only contend on it for what is left to Python;
+the closer the throughput scales with the concurrency, the less they do.
+Needs the sandbox extension to be built.
+
+    python benchmarks/bench_parallel_fs.py [--launches N] [--concurrency N]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dmoj_judge.cptbox import IsolateTracer, TracedPopen
+from dmoj_judge.cptbox.filesystem_policies import RecursiveDir
+from dmoj_judge.executors.filesystem import Filesystem
+import tempfile
+import argparse
+import time
+import os
+
+
+def measure(label: str, launches: int, concurrency: int, run) -> None:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: run(), range(launches)))
+    elapsed = time.perf_counter() - start
+    print("%-24s %10.2f launches/s" % (label, launches / elapsed))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count())
+    parser.add_argument("--files", type=int, default=1000)
+    args = parser.parse_args()
+
+    filesystem = Filesystem.default()
+    with tempfile.TemporaryDirectory() as working_dir:
+        for i in range(args.files):
+            with open(os.path.join(working_dir, "%d.txt" % i), "w") as f:
+                f.write("%d\n" % i)
+
+        rules = [RecursiveDir(working_dir)]
+        profile = IsolateTracer(
+            read_fs=rules + filesystem.read, write_fs=filesystem.write
+        )
+        script = b"for f in *.txt; do read line < $f; done"
+
+        def run() -> None:
+            process = TracedPopen(
+                [b"/bin/sh", b"-c", script],
+                executable=b"/bin/sh",
+                security=profile,
+                time=60,
+                memory=262144,
+                cwd=working_dir.encode(),
+            )
+            process.wait()
+            assert process.returncode == 0, process.protection_fault
+
+        for concurrency in sorted({1, args.concurrency}):
+            measure("%d at once" % concurrency, args.launches, concurrency, run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Cost of the path checks of a runtime's startup, with and without caching.
+
+Checks every file under a few library directories, as a runtime starting up
+would, once per simulated launch on a profile layered on a shared one. With
+caching, later launches reuse the resolutions and decisions of the first.
+Needs the sandbox extension to be built.
+
+    python benchmarks/bench_path_cache.py [--launches N] [--paths N]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer
+from dmoj_judge.executors.filesystem import Filesystem
+import argparse
+import time
+import os
+
+
+class Debugger:
+    tid = os.getpid()
+
+
+def library_paths(limit: int) -> list[str]:
+    paths: list[str] = []
+    for root in ("/usr/lib", "/usr/share"):
+        for directory, _, files in os.walk(root):
+            paths.extend(os.path.join(directory, name) for name in files)
+            if len(paths) >= limit:
+                return paths[:limit]
+    return paths
+
+
+def measure(label: str, launches: int, paths, cache: bool) -> None:
+    filesystem = Filesystem.default()
+    profile = IsolateTracer(read_fs=filesystem.read, write_fs=filesystem.write)
+    start = time.perf_counter()
+    for _ in range(launches):
+        tracer = IsolateTracer(read_fs=[], write_fs=[], base=profile)
+        if not cache:
+            tracer.immutable_prefixes = ()
+        for path in paths:
+            try:
+                tracer._access_check(Debugger, path, tracer.read_fs_jail)
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - start
+    print(
+        "%-10s %10.3f ms/launch, %5.1f%% of checks, %5.1f%% of resolutions"
+        % (
+            label,
+            elapsed / launches * 1000,
+            profile.path_decisions.hit_rate * 100,
+            profile.path_resolutions.hit_rate * 100,
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=20)
+    parser.add_argument("--paths", type=int, default=2000)
+    args = parser.parse_args()
+
+    paths = library_paths(args.paths)
+    measure("uncached", args.launches, paths, False)
+    measure("cached", args.launches, paths, True)
+
+
+if __name__ == "__main__":
+    main()
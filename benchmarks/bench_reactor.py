@@ -0,0 +1,79 @@
+"""Threads and throughput of many sandboxes running at once, with and without
+the reactor.
+
+Runs short shells under the default compiler profile, which lets them spawn
+processes, several at a time, as parallel cases and interactive problems do,
+each monitored by a thread of its own or all of them by the reactor's. Reports the launches per second, and the
+most threads the judge had at once. Needs the sandbox extension to be built.
+
+    python benchmarks/bench_reactor.py [--launches N] [--concurrency N]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dmoj_judge.cptbox import TracedPopen
+from dmoj_judge.cptbox.compiler_isolate import CompilerIsolateTracer
+from dmoj_judge.executors.filesystem import Filesystem
+import threading
+import argparse
+import time
+import os
+
+
+def measure(label: str, launches: int, concurrency: int, run) -> None:
+    peak = [0]
+
+    def launch(_) -> None:
+        run(peak)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(launch, range(launches)))
+    elapsed = time.perf_counter() - start
+    print(
+        "%-10s %10.2f launches/s %6d threads at most"
+        % (label, launches / elapsed, peak[0])
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    filesystem = Filesystem.default()
+    profile = CompilerIsolateTracer(
+        read_fs=filesystem.read, write_fs=filesystem.write
+    )
+    shell = os.path.realpath("/bin/sh").encode()
+    script = (
+        b"for i in 1 2 3 4; do %s; done"
+        % os.path.realpath("/bin/true").encode()
+    )
+
+    for reactor in (False, True):
+
+        def run(peak) -> None:
+            process = TracedPopen(
+                [shell, b"-c", script],
+                executable=shell,
+                security=profile,
+                time=60,
+                memory=262144,
+                nproc=-1,
+                reactor=reactor,
+            )
+            peak[0] = max(peak[0], threading.active_count())
+            process.wait()
+            assert process.returncode == 0, process.protection_fault
+
+        measure(
+            "reactor" if reactor else "threads",
+            args.launches,
+            args.concurrency,
+            run,
+        )
+
+
+if __name__ == "__main__":
+    main()
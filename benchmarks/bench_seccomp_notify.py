@@ -0,0 +1,69 @@
+"""Cost of checking filesystem access with ptrace and with a seccomp supervisor.
+
+Runs a shell reading many files under the default submission profile, once
+with every path checked through ptrace and once with the checks left to a
+seccomp supervisor, which doesn't stop the process for any other syscall.
+Needs the sandbox extension to be built, and Linux 5.5+ for the supervisor.
+
+    python benchmarks/bench_seccomp_notify.py [--launches N] [--files N]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer, TracedPopen
+from dmoj_judge.cptbox.filesystem_policies import RecursiveDir
+from dmoj_judge.cptbox.tracer import SECCOMP_NOTIFY_SUPPORTED
+from dmoj_judge.executors.filesystem import Filesystem
+import tempfile
+import argparse
+import time
+import os
+
+
+def measure(label: str, launches: int, run) -> None:
+    start = time.perf_counter()
+    for _ in range(launches):
+        run()
+    elapsed = time.perf_counter() - start
+    print("%-24s %10.3f ms/launch" % (label, elapsed / launches * 1000))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=20)
+    parser.add_argument("--files", type=int, default=1000)
+    args = parser.parse_args()
+
+    if not SECCOMP_NOTIFY_SUPPORTED:
+        parser.error("the seccomp supervisor needs Linux 5.5+")
+
+    filesystem = Filesystem.default()
+    with tempfile.TemporaryDirectory() as working_dir:
+        for i in range(args.files):
+            with open(os.path.join(working_dir, "%d.txt" % i), "w") as f:
+                f.write("%d\n" % i)
+
+        rules = [RecursiveDir(working_dir)]
+        profile = IsolateTracer(
+            read_fs=rules + filesystem.read, write_fs=filesystem.write
+        )
+        script = b"for f in *.txt; do read line < $f; done"
+
+        for notify in (False, True):
+
+            def run() -> None:
+                process = TracedPopen(
+                    [b"/bin/sh", b"-c", script],
+                    executable=b"/bin/sh",
+                    security=profile,
+                    time=60,
+                    memory=262144,
+                    cwd=working_dir.encode(),
+                    notify=notify,
+                )
+                process.wait()
+                assert process.returncode == 0, process.protection_fault
+
+            measure("supervisor" if notify else "ptrace", args.launches, run)
+
+
+if __name__ == "__main__":
+    main()
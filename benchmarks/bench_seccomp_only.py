@@ -0,0 +1,71 @@
+"""Overhead of ptrace for policies seccomp can enforce on its own.
+
+Runs the same programs under a policy of static handlers only, once traced
+with ptrace and once confined by seccomp and rlimits alone. Under ptrace,
+every execve, fork, exit and signal still stops the process; `/bin/true`
+measures the launch, and a shell loop spawning processes measures the stops.
+Needs the sandbox extension to be built.
+
+    python benchmarks/bench_seccomp_only.py [--launches N] [--loops N]
+"""
+
+from dmoj_judge.cptbox import TracedPopen
+from dmoj_judge.cptbox.handlers import ALLOW
+from dmoj_judge.cptbox.syscalls import SYSCALL_COUNT
+import argparse
+import time
+
+
+# A dict, so that TracedPopen can cache what it derives from the policy on it.
+class Policy(dict):
+    pass
+
+
+def measure(label: str, launches: int, run) -> None:
+    start = time.perf_counter()
+    for _ in range(launches):
+        run()
+    elapsed = time.perf_counter() - start
+    print("%-32s %10.3f ms/launch" % (label, elapsed / launches * 1000))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=200)
+    parser.add_argument("--loops", type=int, default=10)
+    parser.add_argument("--spawns", type=int, default=500)
+    args = parser.parse_args()
+
+    policy = Policy({syscall: ALLOW for syscall in range(SYSCALL_COUNT)})
+    loop = (
+        "i=0; while [ $i -lt %d ]; do /bin/true; i=$((i+1)); done" % args.spawns
+    )
+    programs = [
+        ("true", [b"/bin/true"], args.launches),
+        ("spawn loop", [b"/bin/sh", b"-c", loop.encode()], args.loops),
+    ]
+
+    for name, argv, launches in programs:
+        for ptrace in (True, False):
+
+            def run() -> None:
+                process = TracedPopen(
+                    argv,
+                    executable=argv[0],
+                    security=policy,
+                    time=60,
+                    nproc=-1,
+                    ptrace=ptrace,
+                )
+                process.wait()
+                assert process.returncode == 0, process.returncode
+
+            measure(
+                "%s (%s)" % (name, "ptrace" if ptrace else "seccomp only"),
+                launches,
+                run,
+            )
+
+
+if __name__ == "__main__":
+    main()
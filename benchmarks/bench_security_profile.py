@@ -0,0 +1,53 @@
+"""Per-launch cost of building a submission's security policy.
+
+Compares building a full `IsolateTracer` for every launch, as executors used
+to, with layering the working directory on top of a profile shared by every
+launch of an executor class. Needs the sandbox extension to be built.
+
+    python benchmarks/bench_security_profile.py [--launches N]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer
+from dmoj_judge.cptbox.filesystem_policies import RecursiveDir
+from dmoj_judge.executors.filesystem import Filesystem
+import tempfile
+import argparse
+import time
+
+
+def measure(label: str, launches: int, build) -> None:
+    start = time.perf_counter()
+    for _ in range(launches):
+        build()
+    elapsed = time.perf_counter() - start
+    print("%-24s %10.3f ms/launch" % (label, elapsed / launches * 1000))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=1000)
+    args = parser.parse_args()
+
+    filesystem = Filesystem.default()
+    with tempfile.TemporaryDirectory() as working_dir:
+        rules = [RecursiveDir(working_dir)]
+
+        def full() -> IsolateTracer:
+            return IsolateTracer(
+                read_fs=rules + filesystem.read,
+                write_fs=rules + filesystem.write,
+            )
+
+        profile = IsolateTracer(
+            read_fs=filesystem.read, write_fs=filesystem.write
+        )
+
+        def layered() -> IsolateTracer:
+            return IsolateTracer(read_fs=rules, write_fs=rules, base=profile)
+
+        measure("full tracer", args.launches, full)
+        measure("layered on profile", args.launches, layered)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Cost of launching a sandboxed process.
+
+Launches `/bin/true` under the default submission profile, and reports the
+time from fork to the end of the first execve, which covers setting up the
+child and installing its seccomp filter, and the time of the whole launch.
+The first launch compiles the profile's filter, the rest reuse it. Needs the
+sandbox extension to be built.
+
+    python benchmarks/bench_spawn.py [--launches N]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer, TracedPopen
+from dmoj_judge.executors.filesystem import Filesystem
+import statistics
+import argparse
+import time
+
+
+def measure(label: str, samples: list[float]) -> None:
+    print(
+        "%-16s %10.3f ms mean %10.3f ms max"
+        % (label, statistics.mean(samples) * 1000, max(samples) * 1000)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=200)
+    args = parser.parse_args()
+
+    filesystem = Filesystem.default()
+    profile = IsolateTracer(read_fs=filesystem.read, write_fs=filesystem.write)
+
+    latencies: list[float] = []
+    launches: list[float] = []
+    for _ in range(args.launches):
+        start = time.perf_counter()
+        process = TracedPopen(
+            [b"/bin/true"],
+            executable=b"/bin/true",
+            security=profile,
+            time=10,
+            memory=65536,
+        )
+        process.wait()
+        launches.append(time.perf_counter() - start)
+        latencies.append(process.spawn_latency)
+
+    measure("fork to exec", latencies)
+    measure("launch", launches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""How long past its time limit a process runs before it is killed.
+
+Runs a shell that spins, and one that sleeps, under the default submission
+profile, and one that waits on a child under the compiler profile, each with a
+time limit it never finishes in, and reports by how much its execution and
+wall clock times overshoot the limit. Each runs under ptrace, on the shared
+reactor, and with a seccomp supervisor where the kernel supports it; a child
+left behind must not keep any of them from finishing, nor hold on to the
+output. Needs the sandbox extension to be built.
+
+    python benchmarks/bench_time_limit.py [--launches N] [--time SECONDS]
+"""
+
+from dmoj_judge.cptbox import IsolateTracer, TracedPopen
+from dmoj_judge.cptbox.compiler_isolate import CompilerIsolateTracer
+from dmoj_judge.cptbox.tracer import SECCOMP_NOTIFY_SUPPORTED
+from dmoj_judge.executors.filesystem import Filesystem
+from subprocess import PIPE
+import statistics
+import argparse
+
+
+def measure(label: str, launches: int, limit: float, run) -> None:
+    execution: list[float] = []
+    wall: list[float] = []
+    for _ in range(launches):
+        process = run()
+        assert process.is_tle, process.returncode
+        execution.append((process.execution_time - limit) * 1000)
+        wall.append((process.wall_clock_time - limit) * 1000)
+    print(
+        "%-20s execution %8.2f ms mean %8.2f ms max, "
+        "wall %8.2f ms mean %8.2f ms max"
+        % (
+            label,
+            statistics.mean(execution),
+            max(execution),
+            statistics.mean(wall),
+            max(wall),
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--launches", type=int, default=10)
+    parser.add_argument("--time", type=float, default=0.5)
+    args = parser.parse_args()
+
+    filesystem = Filesystem.default()
+    profile = IsolateTracer(read_fs=filesystem.read, write_fs=filesystem.write)
+    # Lets the shell start other programs, and them sleep with clock_nanosleep,
+    # which the default profile doesn't.
+    compiler_profile = CompilerIsolateTracer(
+        read_fs=filesystem.read, write_fs=filesystem.write
+    )
+    scripts = {
+        "spin": (profile, b"while :; do :; done"),
+        "sleep": (profile, b"read line"),
+        "child": (compiler_profile, b"sleep 60; echo"),
+    }
+    modes: dict[str, dict] = {"": {}, " (reactor)": {"reactor": True}}
+    if SECCOMP_NOTIFY_SUPPORTED:
+        modes[" (supervisor)"] = {"notify": True}
+
+    for suffix, options in modes.items():
+        for label, (security, script) in scripts.items():
+
+            def run() -> TracedPopen:
+                process = TracedPopen(
+                    [b"/bin/sh", b"-c", script],
+                    executable=b"/bin/sh",
+                    security=security,
+                    time=args.time,
+                    memory=262144,
+                    stdout=PIPE,
+                    **options,
+                )
+                process.wait()
+                # Only at its end once nothing left of the process holds it.
+                process.stdout.read()
+                process.stdout.close()
+                return process
+
+            measure(label + suffix, args.launches, args.time, run)
+
+
+if __name__ == "__main__":
+    main()
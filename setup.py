@@ -1,4 +1,5 @@
 from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 from Cython.Build import cythonize
 import sys
 import os
@@ -14,6 +15,8 @@ if len(sys.argv) > 1 and sys.argv[1] == "sdist":
 
 CPTBOX_PKG: str = "dmoj_judge.cptbox._cptbox"
 STD_CHECKER_PKG: str = "dmoj_judge.checkers._standard_checker"
+# Not a Python module: a plain shared object preloaded into submissions.
+SETBUFSIZE_PKG: str = "dmoj_judge.executors.setbufsize"
 
 EXTS: list[str] = [CPTBOX_PKG, STD_CHECKER_PKG]
 
@@ -21,12 +24,14 @@ EXT_LANG: dict[str, str] = {CPTBOX_PKG: "c++"}
 EXT_PATH_PREFIX: dict[str, str] = {
     CPTBOX_PKG: os.path.join(SRC_DIR, "dmoj_judge", "cptbox"),
     STD_CHECKER_PKG: os.path.join(SRC_DIR, "dmoj_judge", "checkers"),
+    SETBUFSIZE_PKG: os.path.join(SRC_DIR, "dmoj_judge", "executors"),
 }
 
 SRCS: dict[str, list[str]] = {
     CPTBOX_PKG: [
         "_cptbox.cpp" if not HAS_PYX else "_cptbox.pyx",
         "helper.cpp",
+        "fs_policy.cpp",
         "ptbox/ptdebug.cpp",
         "ptbox/ptdebug_x86.cpp",
         "ptbox/ptdebug_x64.cpp",
@@ -34,13 +39,16 @@ SRCS: dict[str, list[str]] = {
         "ptbox/ptdebug_arm64.cpp",
         "ptbox/ptdebug_freebsd_x64.cpp",
         "ptbox/ptproc.cpp",
+        "ptbox/ptreactor.cpp",
     ],
     STD_CHECKER_PKG: ["_standard_checker.c"],
+    SETBUFSIZE_PKG: ["setbufsize.c"],
 }
 
 HEADERS: dict[str, list[str]] = {
     CPTBOX_PKG: [
         "helper.h",
+        "fs_policy.h",
         "ptbox/ptbox.h",
         "ptbox/ptdebug_x86.h",
         "ptbox/ptdebug_x64.h",
@@ -98,6 +106,29 @@ for ext_id in EXTS:
     )
 
 
+class SharedObject(Extension):
+    # Exports nothing Python looks for.
+    pass
+
+
+class BuildExt(build_ext):
+    def get_export_symbols(self, ext: Extension) -> list[str]:
+        if isinstance(ext, SharedObject):
+            return ext.export_symbols
+        return super().get_export_symbols(ext)
+
+    def get_ext_filename(self, fullname: str) -> str:
+        # Named as executors/base.py looks for it, without the ABI tag. Build
+        # paths ask for the module's name alone.
+        if fullname.split(".")[-1] == SETBUFSIZE_PKG.split(".")[-1]:
+            return os.path.join(*fullname.split(".")) + ".so"
+        return super().get_ext_filename(fullname)
+
+
+extensions.append(SharedObject(SETBUFSIZE_PKG, sources=SRCS[SETBUFSIZE_PKG]))
+
+
 setup(
     ext_modules=cythonize(extensions),
+    cmdclass={"build_ext": BuildExt},
 )
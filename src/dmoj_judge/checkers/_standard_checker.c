@@ -99,9 +99,9 @@ static PyMethodDef checker_methods[] = { { "standard", checker_standard, METH_VA
                                          { NULL, NULL, 0, NULL } };
 
 static struct PyModuleDef moduledef = {
-    PyModuleDef_HEAD_INIT, "_checker", NULL, -1, checker_methods, NULL, NULL, NULL, NULL
+    PyModuleDef_HEAD_INIT, "_standard_checker", NULL, -1, checker_methods, NULL, NULL, NULL, NULL
 };
 
-PyMODINIT_FUNC PyInit__checker(void) {
+PyMODINIT_FUNC PyInit__standard_checker(void) {
     return PyModule_Create(&moduledef);
 }
@@ -0,0 +1,6 @@
+from ._standard_checker import standard
+
+
+def check(process_output: bytes, judge_output: bytes, **kwargs) -> bool:
+    # Equal up to whitespace between tokens, and trailing whitespace.
+    return standard(judge_output, process_output)
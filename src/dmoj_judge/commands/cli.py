@@ -1,5 +1,5 @@
 from ..utils.builtin_int_patch import install as install_int_patch
-from ..executors import ExecutorManager
+from ..executors import ExecutorManager, ProbeResult
 from ..problems import ProblemManager
 from ..graders import GraderManager
 from ..pm import PacketManager
@@ -13,6 +13,9 @@ import yaml
 import os
 
 
+log = logging.getLogger(__name__)
+
+
 def load_argument(
     args: argparse.Namespace, config_defaults: dict[str, Any], argname: str
 ) -> Any:
@@ -182,16 +185,28 @@ def main() -> None:
 
     # TODO: setproctitle
     execm = ExecutorManager(config.executors)
+    connected = False
+
+    def on_probed(result: ProbeResult) -> None:
+        # Executors that pass after the handshake are announced as they do.
+        if connected and result.passed:
+            pm.lazy_send_packet(
+                {"name": "executors", "executors": execm.runtime_versions()}
+            )
+
+    # Started before anything else, as it forks.
+    execm.probe(self_test=config.do_self_tests, callback=on_probed)
     graderm = GraderManager(config.graders)
     probm = ProblemManager(config)
 
     pm = PacketManager(config)
-    pm.connect(
-        probm.problems, {"PY3": [("python3", (3, 13, 3))]}
-    )  # TODO: For test purposes; change me!
+    if not execm.wait(config.executors.probe_grace):
+        log.info("Connecting before every executor self-test is done")
+    connected = True
+    pm.connect(probm.problems, execm.runtime_versions())
     pm.start()
 
-    judge = Judge(config, pm, probm)
+    judge = Judge(config, pm, probm, graderm, execm)
     judge.start()
 
     judge._receiver_handle.join()
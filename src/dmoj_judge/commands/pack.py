@@ -0,0 +1,28 @@
+from ..storage import write_pack, PACK_SUFFIX
+
+import argparse
+import sys
+import os
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Packs a problem directory into a single indexed file."
+    )
+    parser.add_argument("problem_dir", help="problem directory to pack")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="pack file to write (default: <problem_dir>%s)" % PACK_SUFFIX,
+    )
+    args = parser.parse_args()
+
+    problem_dir: str = os.path.normpath(args.problem_dir)
+    if not os.path.isfile(os.path.join(problem_dir, "init.yml")):
+        print("`%s` has no init.yml" % problem_dir, file=sys.stderr)
+        sys.exit(1)
+
+    output: str = args.output or problem_dir + PACK_SUFFIX
+    count = write_pack(problem_dir, output)
+    print("Packed %d files into %s" % (count, output))
@@ -5,6 +5,8 @@ import logging
 
 
 class BaseConfig:
+    __slots__ = ()
+
     def load_dict(self, base: dict[str, Any]) -> None:
         for key, value in base.items():
             try:
@@ -39,6 +41,20 @@ class ExecutorConfig(BaseConfig):
     runtime: dict[str, Any] = field(default_factory=dict)
     temp_directory: str = "/tmp/"
     submission_cpu_affinity: list[int] | None = None
+    # Check submissions' filesystem access with a seccomp supervisor instead
+    # of ptrace, on Linux 5.5+.
+    seccomp_notify: bool = False
+    # Monitor every traced submission of a worker from one thread, instead of
+    # one each, on Linux.
+    reactor: bool = False
+    # A delegated cgroup v2 directory, to give every sandbox a cgroup of its
+    # own in; without one, they are only limited by rlimits.
+    cgroup_root: str | None = None
+    # Leave plain reads of files to Landlock, on Linux 5.13+, for profiles it
+    # decides the same as the tracer; anything else is still checked as
+    # before. Profiles granting a process's own files under /proc, or with
+    # symlinks they deny beside what they grant, are still traced as a whole.
+    landlock: bool = False
 
 
 # FIXME: This wasn't tested nor investigated enough, so I can't ensure every
@@ -88,16 +104,29 @@ class ExecutorManagerConfig(BaseConfig):
     builtin_whitelist: list[str] | None = None
     builtin_blacklist: list[str] | None = None
     external: dict[str, str] = field(default_factory=dict)
-
-
-@dataclass
+    # Settings shared by every executor.
+    executor: ExecutorConfig = field(default_factory=ExecutorConfig)
+    # Executors are self-tested in this many processes at startup; 0 means
+    # one per CPU.
+    probe_processes: int = 0
+    # How long to wait for self-tests before connecting to the server, in
+    # seconds; executors that pass later are announced as they do.
+    probe_grace: float = 30
+    # Where probe results are kept, so that executors whose commands haven't
+    # changed aren't probed again; defaults to a file under the system
+    # temporary directory.
+    snapshot_path: str | None = None
+
+
+# One of these is kept for every compiled test case, hence the slots.
+@dataclass(slots=True)
 class BatchedTestCaseConfig(BaseConfig):
     batched: list[dict[str, Any]]
     points: int = 0
     dependencies: list = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class TestCaseConfig(BaseConfig):
     _in: str | None = None
     out: str | None = None
@@ -124,6 +153,29 @@ class Config(BaseConfig):
 
     # TODO: Add command argument for populating this
     problem_storage_globs: list[str] | None = None
+    # Where derived problem data (e.g. inflated archive members) is cached;
+    # defaults to a directory under the system temporary directory.
+    problem_data_cache_dir: str | None = None
+    # In MiB.
+    problem_data_cache_size: int = 1024
+    # Where problem manifests (content digests of problem files) and, with
+    # `problem_store_dedupe`, the content-addressed store are kept. Defaults
+    # to a directory under the system temporary directory.
+    problem_store_dir: str | None = None
+    # Replaces identical problem files with hardlinks into the store; they are
+    # made read-only in the process.
+    problem_store_dedupe: bool = False
+    problem_hash_threads: int = 4
+    # How much test data of queued submissions may be read ahead, in MiB; 0
+    # disables prefetching.
+    prefetch_budget: int = 256
+
+    # Runs the cases that most often reject submissions first when a
+    # submission short-circuits, based on statistics kept in
+    # `case_stats_dir` (defaults to a directory under the system temporary
+    # directory).
+    adaptive_case_order: bool = False
+    case_stats_dir: str | None = None
 
     # Flags
     ansi: bool = True
@@ -1,4 +1,4 @@
-from typing import Callable, Dict, List, Tuple, Optional
+from typing import Callable, Dict, Iterable, List, Tuple, Optional
 
 PTBOX_ABI_X86: int
 PTBOX_ABI_X64: int
@@ -39,6 +39,54 @@ class Debugger:
     def readbytes(self, address: int, size: int) -> bytes: ...
     def on_return(self, callback: Callable[[], None]): ...
 
+class HandlerTable:
+    def __init__(self, handlers: List[int]): ...
+
+class SeccompFilter:
+    trace: bool
+    notify: bool
+    landlock: bool
+    def __init__(
+        self,
+        handlers: List[int],
+        trace: bool = True,
+        notify: bool = False,
+        read_opens: Optional[List[int]] = None,
+    ): ...
+    def __len__(self) -> int: ...
+
+class FilesystemTrie:
+    def __init__(self, rules: Iterable[Tuple[str, int]]): ...
+    def check(self, path: str) -> bool: ...
+
+class FilesystemFastPath:
+    def __init__(
+        self,
+        read_policies: List[FilesystemTrie],
+        write_policies: List[FilesystemTrie],
+        syscalls: Iterable[Tuple[int, int, int, int, int]],
+        base: Optional[FilesystemFastPath] = None,
+    ): ...
+
+class LandlockRuleset:
+    fd: int
+    def __init__(self, paths: Iterable[str]): ...
+
+class SeccompListener:
+    def __init__(self, sock: int): ...
+    def receive(self) -> bool: ...
+    def valid(self) -> bool: ...
+    def respond(self, error: int = ...) -> None: ...
+    def close(self) -> None: ...
+    @property
+    def pid(self) -> int: ...
+    @property
+    def syscall(self) -> int: ...
+    @property
+    def arch(self) -> int: ...
+    @property
+    def args(self) -> Tuple[int, int, int, int, int, int]: ...
+
 class Process:
     debugger: Debugger
     _child_stdin: int
@@ -51,17 +99,24 @@ class Process:
     _nproc: int
     _fsize: int
     _cpu_affinity_mask: int
+    _cgroup_fd: int
 
     use_seccomp: bool
     _trace_syscalls: bool
+    _use_ptrace: bool
+    _notify_socket: int
     def create_debugger(self) -> Debugger: ...
     def _callback(self, syscall: int) -> bool: ...
     def _ptrace_error(self, errno: int) -> None: ...
     def _protection_fault(self, syscall: int, is_update: bool) -> None: ...
     def _cpu_time_exceeded(self) -> None: ...
-    def _handler(self, abi: int, syscall: int, handler: int) -> None: ...
-    def _get_seccomp_whitelist(self) -> List[bool]: ...
-    def _get_seccomp_errnolist(self) -> List[int]: ...
+    def _set_handlers(self, table: HandlerTable) -> None: ...
+    def _set_fs_fast_path(self, fast_path: FilesystemFastPath) -> None: ...
+    def _set_time_limits(self, execution: float, wall: float) -> None: ...
+    def _send_signal(self, signal: int) -> None: ...
+    def _get_seccomp_filter(self) -> Optional[SeccompFilter]: ...
+    def _get_seccomp_notify_filter(self) -> Optional[SeccompFilter]: ...
+    def _get_landlock_ruleset(self) -> Optional[LandlockRuleset]: ...
     def _spawn(
         self,
         file: bytes,
@@ -70,6 +125,7 @@ class Process:
         chdir: bytes = ...,
     ) -> None: ...
     def _monitor(self) -> int: ...
+    def _monitor_exited(self, exitcode: int) -> None: ...
     @property
     def _exited(self): ...
     @property
@@ -83,6 +139,10 @@ class Process:
     @property
     def wall_clock_time(self) -> float: ...
     @property
+    def _timed_out(self) -> bool: ...
+    @property
+    def spawn_latency(self) -> float: ...
+    @property
     def cpu_time(self) -> float: ...
     @property
     def max_memory(self) -> int: ...
@@ -93,6 +153,12 @@ class Process:
     @property
     def returncode(self) -> Optional[int]: ...
 
+class Reactor:
+    def run(self) -> None: ...
+    def post(self, callback: Callable[[], None]) -> None: ...
+    def stop(self) -> None: ...
+    def add(self, process: Process) -> None: ...
+
 MAX_SYSCALL_NUMBER: int
 NATIVE_ABI: int
 
@@ -101,6 +167,14 @@ PTBOX_SPAWN_FAIL_SECCOMP: int
 PTBOX_SPAWN_FAIL_TRACEME: int
 PTBOX_SPAWN_FAIL_EXECVE: int
 PTBOX_SPAWN_FAIL_SETAFFINITY: int
+PTBOX_SPAWN_FAIL_CGROUP: int
+PTBOX_SPAWN_FAIL_LANDLOCK: int
+PTBOX_SECCOMP_NOTIFY: int
+
+PTBOX_FS_NONE: int
+PTBOX_FS_EXACT: int
+PTBOX_FS_RECURSIVE: int
+PTBOX_FS_FILE: int
 
 AT_FDCWD: int
 bsd_get_proc_cwd: Callable[[int], str]
@@ -108,6 +182,7 @@ bsd_get_proc_fdno: Callable[[int, int], str]
 
 memfd_create: Callable[[], int]
 memfd_seal: Callable[[int], None]
+landlock_abi: Callable[[], int]
 
 class BufferProxy:
     def _get_real_buffer(self): ...
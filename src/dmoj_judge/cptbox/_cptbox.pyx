@@ -1,5 +1,6 @@
 # cython: language_level=3
 from cpython.exc cimport PyErr_NoMemory, PyErr_SetFromErrno
+from cpython.ref cimport Py_DECREF, Py_INCREF
 from cpython.buffer cimport PyObject_GetBuffer
 from cpython.bytes cimport PyBytes_AsString, PyBytes_FromStringAndSize
 from libc.stdio cimport FILE, fopen, fclose, fgets, sprintf
@@ -9,13 +10,19 @@ from libc.signal cimport SIGTRAP, SIGXCPU
 from libcpp cimport bool
 from posix.resource cimport rusage
 from posix.types cimport pid_t
+from posix.unistd cimport close
 
-__all__ = ['Process', 'Debugger', 'bsd_get_proc_cwd', 'bsd_get_proc_fdno', 'MAX_SYSCALL_NUMBER',
+__all__ = ['Process', 'Reactor', 'Debugger', 'HandlerTable', 'SeccompFilter', 'SeccompListener', 'FilesystemTrie',
+           'FilesystemFastPath', 'LandlockRuleset', 'landlock_abi', 'bsd_get_proc_cwd', 'bsd_get_proc_fdno',
+           'MAX_SYSCALL_NUMBER',
            'AT_FDCWD', 'ALL_ABIS', 'SUPPORTED_ABIS', 'NATIVE_ABI',
            'PTBOX_ABI_X86', 'PTBOX_ABI_X64', 'PTBOX_ABI_X32', 'PTBOX_ABI_ARM', 'PTBOX_ABI_ARM64',
            'PTBOX_ABI_FREEBSD_X64', 'PTBOX_ABI_INVALID', 'PTBOX_ABI_COUNT',
            'PTBOX_SPAWN_FAIL_NO_NEW_PRIVS', 'PTBOX_SPAWN_FAIL_SECCOMP', 'PTBOX_SPAWN_FAIL_TRACEME',
-           'PTBOX_SPAWN_FAIL_EXECVE', 'PTBOX_SPAWN_FAIL_SETAFFINITY']
+           'PTBOX_SPAWN_FAIL_EXECVE', 'PTBOX_SPAWN_FAIL_SETAFFINITY', 'PTBOX_SPAWN_FAIL_CGROUP',
+           'PTBOX_SPAWN_FAIL_LANDLOCK',
+           'PTBOX_SECCOMP_NOTIFY',
+           'PTBOX_FS_NONE', 'PTBOX_FS_EXACT', 'PTBOX_FS_RECURSIVE', 'PTBOX_FS_FILE']
 
 
 cdef extern from 'ptbox/ptbox.h' nogil:
@@ -59,17 +66,34 @@ cdef extern from 'ptbox/ptbox.h' nogil:
         pt_process(pt_debugger *) except +
         void set_callback(pt_handler_callback callback, void* context)
         void set_event_proc(pt_event_callback, void *context)
-        int set_handler(int abi, int syscall, int handler)
+        void set_handlers(const int *handlers)
         bint trace_syscalls()
         void trace_syscalls(bint value)
+        bint use_ptrace()
+        void use_ptrace(bint value)
+        void set_exec_fd(int fd)
         int spawn(pt_fork_handler, void *context)
+        int set_time_limits(double execution, double wall)
+        bint timed_out()
+        int send_signal(int signal)
         int monitor()
         int getpid()
         double execution_time()
         double wall_clock_time()
+        double spawn_latency()
         const rusage *getrusage()
         bint was_initialized()
 
+    ctypedef void (*pt_reactor_callback)(void *context)
+    ctypedef void (*pt_exit_callback)(void *context, int code)
+
+    cdef cppclass pt_reactor:
+        pt_reactor() except +
+        int run()
+        int post(pt_reactor_callback callback, void *context)
+        void stop()
+        void add(pt_process *process, pt_exit_callback callback, void *context) except +
+
     cdef bint PTBOX_FREEBSD
     cdef int MAX_SYSCALL
 
@@ -104,6 +128,9 @@ SUPPORTED_ABIS = list(filter(debugger_supports_abi, ALL_ABIS))
 NATIVE_ABI = native_abi
 
 cdef extern from 'helper.h' nogil:
+    cdef struct sock_fprog:
+        unsigned short len
+
     cdef struct child_config:
         unsigned long memory # affects only sbrk heap
         unsigned long address_space # affects sbrk and mmap but not all address space is used memory
@@ -118,12 +145,35 @@ cdef extern from 'helper.h' nogil:
         int stdin_
         int stdout_
         int stderr_
-        int abi_for_seccomp
-        int *seccomp_handlers
+        const sock_fprog *seccomp_filter
+        const sock_fprog *seccomp_notify_filter
+        int notify_fd
+        int use_ptrace
+        int exec_fd
         unsigned long cpu_affinity_mask
+        int cgroup_fd
+        int landlock_fd
 
     void cptbox_closefrom(int lowfd)
     int cptbox_child_run(child_config *)
+    sock_fprog *cptbox_seccomp_compile(const int *handlers, int trace, const int *read_opens)
+    sock_fprog *cptbox_seccomp_compile_notify(const int *handlers, const int *read_opens)
+    void cptbox_seccomp_free(sock_fprog *prog)
+
+    cdef struct cptbox_notification:
+        unsigned long long id
+        pid_t pid
+        int syscall
+        unsigned int arch
+        unsigned long long args[6]
+
+    int cptbox_seccomp_recv_listener(int sock)
+    int cptbox_seccomp_notify_recv(int listener, cptbox_notification *notification)
+    int cptbox_seccomp_notify_valid(int listener, unsigned long long id)
+    int cptbox_seccomp_notify_send(int listener, unsigned long long id, int error)
+    int cptbox_landlock_abi()
+    int cptbox_landlock_create()
+    int cptbox_landlock_add(int ruleset, const char *path)
     char *_bsd_get_proc_cwd "bsd_get_proc_cwd"(pid_t pid)
     char *_bsd_get_proc_fdno "bsd_get_proc_fdno"(pid_t pid, int fdno)
 
@@ -133,6 +183,9 @@ cdef extern from 'helper.h' nogil:
         PTBOX_SPAWN_FAIL_TRACEME
         PTBOX_SPAWN_FAIL_EXECVE
         PTBOX_SPAWN_FAIL_SETAFFINITY
+        PTBOX_SPAWN_FAIL_CGROUP
+        PTBOX_SPAWN_FAIL_LANDLOCK
+        PTBOX_SECCOMP_NOTIFY
 
     int cptbox_memfd_create()
     int cptbox_memfd_seal(int fd)
@@ -142,9 +195,44 @@ cdef extern from 'fcntl.h' nogil:
     cpdef enum:
         AT_FDCWD
 
+    enum:
+        O_CLOEXEC
+
+cdef extern from 'fs_policy.h' nogil:
+    cdef cppclass fs_policy:
+        void add(const char *path, int mode) except +
+        bint check(const char *path)
+
+    cdef cppclass fs_fast_path:
+        void add_syscall(int abi, int syscall, int dir_reg, int file_reg, int flag_reg) except +
+        void add_read_policy(const fs_policy *policy) except +
+        void add_write_policy(const fs_policy *policy) except +
+        void set_base(const fs_fast_path *base)
+        bint allows(pt_debugger *debugger, int syscall)
+
+    cpdef enum:
+        PTBOX_FS_NONE
+        PTBOX_FS_EXACT
+        PTBOX_FS_RECURSIVE
+        PTBOX_FS_FILE
+
+cdef extern from 'unistd.h' nogil:
+    int pipe2(int *pipefd, int flags)
+
+cdef extern from 'sys/socket.h' nogil:
+    enum:
+        AF_UNIX
+        SOCK_SEQPACKET
+        SOCK_CLOEXEC
+
+    int socketpair(int domain, int type, int protocol, int *sv)
+
 cdef extern from "errno.h":
     int errno
 
+    enum:
+        ENOENT
+
 MAX_SYSCALL_NUMBER = MAX_SYSCALL
 
 cdef int pt_child(void *context) noexcept nogil:
@@ -163,6 +251,16 @@ cdef void pt_syscall_return_handler(void *context, pid_t pid, int syscall) noexc
 cdef int pt_event_handler(void *context, int event, unsigned long param) noexcept nogil:
     return (<Process>context)._event_handler(event, param)
 
+cdef void pt_reactor_handler(void *context) noexcept with gil:
+    callback = <object>context
+    Py_DECREF(callback)
+    callback()
+
+cdef void pt_exit_handler(void *context, int code) noexcept with gil:
+    process = <Process>context
+    Py_DECREF(process)
+    process._reactor_exited(code)
+
 cdef char **alloc_byte_array(list list) except NULL:
     cdef size_t length = len(list)
     cdef char **array = <char**>malloc((length + 1) * sizeof(char*))
@@ -226,9 +324,221 @@ def memfd_seal(int fd):
     if result == -1:
         PyErr_SetFromErrno(OSError)
 
+def landlock_abi():
+    return cptbox_landlock_abi()
+
 cdef class Process
 
 
+cdef class SeccompFilter:
+    # A seccomp BPF program compiled from MAX_SYSCALL handlers: -1 to trace
+    # the syscall (or, without `trace`, to kill the process), 0 to allow it,
+    # or an errno to fail it with. It is compiled once, in the parent, and
+    # installed as is in every child spawned with it.
+    #
+    # With `notify`, it is instead the filter that notifies the supervisor of
+    # the syscalls whose handler is PTBOX_SECCOMP_NOTIFY, and allows the rest.
+    #
+    # With `read_opens`, the register of the open flags of every syscall
+    # number that opens files, or -1, opens that only read are left to
+    # Landlock, and neither traced nor notified about.
+    cdef sock_fprog *prog
+    cdef readonly bint trace
+    cdef readonly bint notify
+    cdef readonly bint landlock
+
+    def __cinit__(self, handlers, bint trace=True, bint notify=False, read_opens=None):
+        cdef int *array
+        cdef int *opens = NULL
+
+        if len(handlers) != MAX_SYSCALL:
+            raise ValueError('expected %d handlers' % MAX_SYSCALL)
+        if read_opens is not None and len(read_opens) != MAX_SYSCALL:
+            raise ValueError('expected %d open flag registers' % MAX_SYSCALL)
+
+        array = <int*>malloc(sizeof(int) * MAX_SYSCALL * 2)
+        if not array:
+            PyErr_NoMemory()
+        try:
+            for i in range(MAX_SYSCALL):
+                array[i] = handlers[i]
+            if read_opens is not None:
+                opens = array + MAX_SYSCALL
+                for i in range(MAX_SYSCALL):
+                    opens[i] = read_opens[i]
+            if notify:
+                self.prog = cptbox_seccomp_compile_notify(array, opens)
+            else:
+                self.prog = cptbox_seccomp_compile(array, trace, opens)
+        finally:
+            free(array)
+        self.trace = trace
+        self.notify = notify
+        self.landlock = read_opens is not None
+
+        if self.prog == NULL:
+            PyErr_SetFromErrno(OSError)
+
+    def __dealloc__(self):
+        cptbox_seccomp_free(self.prog)
+
+    def __len__(self):
+        return self.prog.len
+
+
+cdef class HandlerTable:
+    # The handler of every syscall number of every ABI, as a flat array of
+    # PTBOX_ABI_COUNT rows of MAX_SYSCALL handlers. It is built once per
+    # security profile, and shared by every process launched with it.
+    cdef int *table
+
+    def __cinit__(self, handlers):
+        cdef int size = PTBOX_ABI_COUNT * MAX_SYSCALL
+
+        if len(handlers) != size:
+            raise ValueError('expected %d handlers' % size)
+
+        self.table = <int*>malloc(sizeof(int) * size)
+        if not self.table:
+            PyErr_NoMemory()
+        for i in range(size):
+            self.table[i] = handlers[i]
+
+    def __dealloc__(self):
+        free(self.table)
+
+
+cdef class FilesystemTrie:
+    # A FilesystemPolicy compiled for the native fast path of path checks,
+    # from (path, mode) pairs with the PTBOX_FS_* modes.
+    cdef fs_policy *thisptr
+
+    def __cinit__(self, rules):
+        self.thisptr = new fs_policy()
+        for path, mode in rules:
+            self.thisptr.add(path.encode('utf-8'), mode)
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    def check(self, path):
+        return self.thisptr.check(path.encode('utf-8'))
+
+
+cdef class FilesystemFastPath:
+    # Decides, without the GIL, the common case of the path checks of
+    # `syscalls`: (abi, syscall, dir_reg, file_reg, flag_reg) tuples, where
+    # dir_reg is -1 for the working directory and flag_reg -1 for a read.
+    # Only allows; everything else is left to the Python handlers. With
+    # `base`, it only adds the policies of a layer on top of it, and its
+    # syscalls are the base's.
+    cdef fs_fast_path *thisptr
+    # Referenced by the native fast path, so they must live as long as it.
+    cdef list _policies
+    cdef FilesystemFastPath _base
+
+    def __cinit__(self, read_policies, write_policies, syscalls, FilesystemFastPath base=None):
+        cdef FilesystemTrie policy
+
+        self.thisptr = new fs_fast_path()
+        self._policies = list(read_policies) + list(write_policies)
+        self._base = base
+        if base is not None:
+            self.thisptr.set_base(base.thisptr)
+        for policy in read_policies:
+            self.thisptr.add_read_policy(policy.thisptr)
+        for policy in write_policies:
+            self.thisptr.add_write_policy(policy.thisptr)
+        for abi, syscall, dir_reg, file_reg, flag_reg in syscalls:
+            self.thisptr.add_syscall(abi, syscall, dir_reg, file_reg, flag_reg)
+
+    def __dealloc__(self):
+        del self.thisptr
+
+
+cdef class LandlockRuleset:
+    # A Landlock ruleset that only lets the files at or beneath `paths` be
+    # read. It is built once, in the parent, and every child spawned with it
+    # restricts itself to it.
+    cdef readonly int fd
+
+    def __cinit__(self, paths):
+        self.fd = cptbox_landlock_create()
+        if self.fd < 0:
+            PyErr_SetFromErrno(OSError)
+        for path in paths:
+            # Paths that are gone can't be opened anyway.
+            if cptbox_landlock_add(self.fd, path.encode('utf-8')) and errno != ENOENT:
+                PyErr_SetFromErrno(OSError)
+
+    def __dealloc__(self):
+        if self.fd >= 0:
+            close(self.fd)
+
+
+cdef class SeccompListener:
+    # The supervisor's end of a child's notify filter, received over `sock`,
+    # which is then closed. Each `receive` waits for the next syscall to
+    # check, which is described by the properties until it is answered.
+    cdef int fd
+    cdef cptbox_notification notification
+
+    def __cinit__(self, int sock):
+        global errno
+        cdef int fd, error
+        with nogil:
+            fd = cptbox_seccomp_recv_listener(sock)
+            error = errno
+            close(sock)
+        self.fd = fd
+        if fd < 0 and error:
+            errno = error
+            PyErr_SetFromErrno(OSError)
+
+    def __dealloc__(self):
+        self.close()
+
+    def close(self):
+        if self.fd >= 0:
+            close(self.fd)
+            self.fd = -1
+
+    def receive(self):
+        # False once there is nothing left to check: the child didn't get to
+        # install the filter, or every thread under it is gone.
+        cdef int result
+        if self.fd < 0:
+            return False
+        with nogil:
+            result = cptbox_seccomp_notify_recv(self.fd, &self.notification)
+        if result < 0:
+            PyErr_SetFromErrno(OSError)
+        return result == 0
+
+    def valid(self):
+        return cptbox_seccomp_notify_valid(self.fd, self.notification.id) != 0
+
+    def respond(self, int error=0):
+        if cptbox_seccomp_notify_send(self.fd, self.notification.id, error):
+            PyErr_SetFromErrno(OSError)
+
+    @property
+    def pid(self):
+        return self.notification.pid
+
+    @property
+    def syscall(self):
+        return self.notification.syscall
+
+    @property
+    def arch(self):
+        return self.notification.arch
+
+    @property
+    def args(self):
+        return tuple(self.notification.args[i] for i in range(6))
+
+
 cdef class Debugger:
     cdef pt_debugger *thisptr
     cdef Process process
@@ -422,8 +732,15 @@ cdef class Process:
     cdef public unsigned int _cpu_time
     cdef public int _nproc, _fsize
     cdef public unsigned long _cpu_affinity_mask
+    cdef public int _cgroup_fd
     cdef unsigned long _max_memory
     cdef unsigned long _init_nvcsw, _init_nivcsw
+    # Referenced by the native process, so it must live as long as it does.
+    cdef HandlerTable _handler_table
+    # The socket the child sends the listener of its notify filter over.
+    cdef public int _notify_socket
+    cdef FilesystemFastPath _fs_fast_path
+    cdef fs_fast_path *_fs_fast_path_ptr
 
     cpdef Debugger create_debugger(self):
         return Debugger(self)
@@ -435,7 +752,10 @@ cdef class Process:
         self._fsize = -1
         self._nproc = -1
         self._cpu_affinity_mask = 0
+        self._cgroup_fd = -1
         self._init_nvcsw = self._init_nivcsw = 0
+        self._notify_socket = -1
+        self._fs_fast_path_ptr = NULL
 
         self.debugger = self.create_debugger()
         self.process = new pt_process(self.debugger.thisptr)
@@ -448,8 +768,13 @@ cdef class Process:
     def _callback(self, syscall):
         return False
 
-    cdef int _syscall_handler(self, int syscall) with gil:
-        return self._callback(syscall)
+    cdef int _syscall_handler(self, int syscall) noexcept nogil:
+        # Most path checks are allowed here, without waiting for the GIL,
+        # which is only taken for everything else.
+        if self._fs_fast_path_ptr != NULL and self._fs_fast_path_ptr.allows(self.debugger.thisptr, syscall):
+            return 1
+        with gil:
+            return self._callback(syscall)
 
     cdef int _event_handler(self, int event, unsigned long param) nogil:
         cdef const rusage *usage
@@ -475,8 +800,21 @@ cdef class Process:
             self._init_nivcsw = usage.ru_nivcsw
         return 0
 
-    cpdef _handler(self, abi, syscall, handler):
-        self.process.set_handler(abi, syscall, handler)
+    cpdef _set_handlers(self, HandlerTable table):
+        self._handler_table = table
+        self.process.set_handlers(table.table)
+
+    cpdef _set_fs_fast_path(self, FilesystemFastPath fast_path):
+        self._fs_fast_path = fast_path
+        self._fs_fast_path_ptr = fast_path.thisptr
+
+    cpdef _set_time_limits(self, double execution, double wall):
+        if self.process.set_time_limits(execution, wall):
+            PyErr_SetFromErrno(OSError)
+
+    cpdef _send_signal(self, int signal):
+        if self.process.send_signal(signal):
+            PyErr_SetFromErrno(OSError)
 
     cpdef _protection_fault(self, syscall, is_update):
         pass
@@ -487,14 +825,32 @@ cdef class Process:
     cpdef _cpu_time_exceeded(self):
         pass
 
-    cpdef _get_seccomp_handlers(self):
-        return [-1] * MAX_SYSCALL
+    cpdef _get_seccomp_filter(self):
+        return None
+
+    cpdef _get_seccomp_notify_filter(self):
+        return None
+
+    cpdef _get_landlock_ruleset(self):
+        return None
 
     cpdef _spawn(self, file, args, env=(), chdir=''):
         cdef child_config config
+        # Kept alive until the child has installed it.
+        cdef SeccompFilter seccomp_filter = None, notify_filter = None
+        cdef LandlockRuleset landlock_ruleset = None
+        cdef int exec_pipe[2]
+        cdef int notify_socket[2]
+        exec_pipe[0] = exec_pipe[1] = -1
+        notify_socket[0] = notify_socket[1] = -1
         config.argv = NULL
         config.envp = NULL
-        config.seccomp_handlers = NULL
+        config.seccomp_filter = NULL
+        config.seccomp_notify_filter = NULL
+        config.notify_fd = -1
+        config.landlock_fd = -1
+        config.use_ptrace = self.process.use_ptrace()
+        config.exec_fd = -1
 
         try:
             config.address_space = self._child_address
@@ -504,6 +860,7 @@ cdef class Process:
             config.fsize = self._fsize
             config.personality = self._child_personality
             config.cpu_affinity_mask = self._cpu_affinity_mask
+            config.cgroup_fd = self._cgroup_fd
             config.file = file
             config.dir = chdir
             config.stdin_ = self._child_stdin
@@ -513,22 +870,41 @@ cdef class Process:
             config.envp = alloc_byte_array(env)
 
             if not PTBOX_FREEBSD:
-                handlers = self._get_seccomp_handlers()
-                assert len(handlers) == MAX_SYSCALL
-
-                config.seccomp_handlers = <int*>malloc(sizeof(int) * MAX_SYSCALL)
-                if not config.seccomp_handlers:
-                    PyErr_NoMemory()
-
-                for i in range(MAX_SYSCALL):
-                    config.seccomp_handlers[i] = handlers[i]
+                seccomp_filter = self._get_seccomp_filter()
+                if seccomp_filter is not None:
+                    config.seccomp_filter = seccomp_filter.prog
+
+                notify_filter = self._get_seccomp_notify_filter()
+                if notify_filter is not None:
+                    if socketpair(AF_UNIX, SOCK_SEQPACKET | SOCK_CLOEXEC, 0, notify_socket):
+                        PyErr_SetFromErrno(OSError)
+                    config.seccomp_notify_filter = notify_filter.prog
+                    config.notify_fd = notify_socket[1]
+
+                landlock_ruleset = self._get_landlock_ruleset()
+                if landlock_ruleset is not None:
+                    config.landlock_fd = landlock_ruleset.fd
+
+            if not config.use_ptrace:
+                if pipe2(exec_pipe, O_CLOEXEC):
+                    PyErr_SetFromErrno(OSError)
+                config.exec_fd = exec_pipe[1]
 
             if self.process.spawn(pt_child, &config):
                 raise RuntimeError('failed to spawn child')
+
+            if exec_pipe[0] >= 0:
+                self.process.set_exec_fd(exec_pipe[0])
+                exec_pipe[0] = -1
+            if notify_socket[0] >= 0:
+                self._notify_socket = notify_socket[0]
+                notify_socket[0] = -1
         finally:
             free(config.argv)
             free(config.envp)
-            free(config.seccomp_handlers)
+            for fd in (exec_pipe[0], exec_pipe[1], notify_socket[0], notify_socket[1]):
+                if fd >= 0:
+                    close(fd)
 
     cpdef _monitor(self):
         cdef int exitcode
@@ -538,6 +914,14 @@ cdef class Process:
         self._exited = True
         return self._exitcode
 
+    cdef _reactor_exited(self, int exitcode):
+        self._exitcode = exitcode
+        self._exited = True
+        self._monitor_exited(exitcode)
+
+    cpdef _monitor_exited(self, exitcode):
+        pass
+
     @property
     def was_initialized(self):
         return self.process.was_initialized()
@@ -550,6 +934,14 @@ cdef class Process:
     def _trace_syscalls(self, bint value):
         self.process.trace_syscalls(value)
 
+    @property
+    def _use_ptrace(self):
+        return self.process.use_ptrace()
+
+    @_use_ptrace.setter
+    def _use_ptrace(self, bint value):
+        self.process.use_ptrace(value)
+
     @property
     def pid(self):
         return self.process.getpid()
@@ -562,6 +954,14 @@ cdef class Process:
     def wall_clock_time(self):
         return self.process.wall_clock_time()
 
+    @property
+    def _timed_out(self):
+        return self.process.timed_out()
+
+    @property
+    def spawn_latency(self):
+        return self.process.spawn_latency()
+
     @property
     def cpu_time(self):
         cdef const rusage *usage = self.process.getrusage()
@@ -603,6 +1003,37 @@ cdef class Process:
         return self._exitcode
 
 
+cdef class Reactor:
+    cdef pt_reactor *thisptr
+
+    def __cinit__(self):
+        self.thisptr = new pt_reactor()
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    def run(self):
+        cdef int result
+        with nogil:
+            result = self.thisptr.run()
+        if result:
+            PyErr_SetFromErrno(OSError)
+
+    def post(self, callback):
+        Py_INCREF(callback)
+        if self.thisptr.post(pt_reactor_handler, <void*>callback):
+            Py_DECREF(callback)
+            PyErr_SetFromErrno(OSError)
+
+    def stop(self):
+        self.thisptr.stop()
+
+    def add(self, Process process not None):
+        # Kept alive until it's gone.
+        Py_INCREF(process)
+        self.thisptr.add(process.process, pt_exit_handler, <void*>process)
+
+
 cdef class BufferProxy:
     def _get_real_buffer(self):
         raise NotImplementedError
@@ -0,0 +1,176 @@
+import errno
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+CONTROLLERS = ("cpu", "memory", "pids")
+# The period of cpu.max, in microseconds; the kernel's default.
+CPU_PERIOD = 100000
+
+_names = itertools.count()
+# Whether each delegated subtree is usable, checked once.
+_roots: Dict[str, bool] = {}
+_roots_lock = threading.Lock()
+
+
+def _enable_controllers(root: str) -> bool:
+    try:
+        with open(os.path.join(root, "cgroup.controllers")) as f:
+            available = f.read().split()
+        with open(os.path.join(root, "cgroup.subtree_control")) as f:
+            enabled = f.read().split()
+    except OSError:
+        log.warning("%s is not a cgroup v2 directory", root)
+        return False
+
+    missing = [c for c in CONTROLLERS if c not in enabled]
+    if any(c not in available for c in missing):
+        log.warning(
+            "Controllers %s are not delegated to %s",
+            ", ".join(c for c in missing if c not in available),
+            root,
+        )
+        return False
+    if missing:
+        try:
+            with open(os.path.join(root, "cgroup.subtree_control"), "w") as f:
+                f.write(" ".join("+" + c for c in missing))
+        except OSError:
+            # E.g. processes in it, which would then have to be moved out.
+            log.warning(
+                "Failed to enable controllers on %s", root, exc_info=True
+            )
+            return False
+    return True
+
+
+def _usable(root: str) -> bool:
+    with _roots_lock:
+        if root not in _roots:
+            _roots[root] = _enable_controllers(root)
+            if not _roots[root]:
+                log.warning(
+                    "Not using cgroups, sandboxes are only limited by rlimits"
+                )
+        return _roots[root]
+
+
+class Cgroup:
+    # A cgroup of its own for a sandboxed process, in a delegated cgroup v2
+    # subtree, which everything it starts stays in.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # cgroup.procs, opened for the child to move itself in.
+        self.procs_fd = -1
+
+    @classmethod
+    def create(
+        cls, root: str, memory: int = 0, nproc: int = 0, cpus: int = 0
+    ) -> Optional["Cgroup"]:
+        # `memory` is in bytes. None if it can't be, and the process is then
+        # only limited by its rlimits.
+        if not _usable(root):
+            return None
+
+        path = os.path.join(root, "cptbox-%d-%d" % (os.getpid(), next(_names)))
+        try:
+            os.mkdir(path)
+        except OSError:
+            log.exception("Failed to create cgroup %s", path)
+            return None
+
+        cgroup = cls(path)
+        try:
+            if memory:
+                cgroup._write("memory.max", str(memory))
+                try:
+                    cgroup._write("memory.swap.max", "0")
+                except FileNotFoundError:
+                    pass  # No swap accounting.
+            if nproc > 0:
+                cgroup._write("pids.max", str(nproc))
+            if cpus:
+                cgroup._write(
+                    "cpu.max", "%d %d" % (cpus * CPU_PERIOD, CPU_PERIOD)
+                )
+            cgroup.procs_fd = os.open(
+                os.path.join(path, "cgroup.procs"), os.O_WRONLY | os.O_CLOEXEC
+            )
+        except OSError:
+            log.exception("Failed to set up cgroup %s", path)
+            cgroup.remove()
+            return None
+        return cgroup
+
+    def _write(self, name: str, value: str) -> None:
+        # Interface files are never created, or truncated.
+        fd = os.open(os.path.join(self.path, name), os.O_WRONLY | os.O_CLOEXEC)
+        try:
+            os.write(fd, value.encode())
+        finally:
+            os.close(fd)
+
+    def close_procs(self) -> None:
+        if self.procs_fd >= 0:
+            os.close(self.procs_fd)
+            self.procs_fd = -1
+
+    def _read_stat(self, name: str, key: str) -> int:
+        # A value of a flat keyed file, such as cpu.stat, or 0 if it's missing.
+        with open(os.path.join(self.path, name)) as f:
+            for line in f:
+                field, value = line.split()
+                if field == key:
+                    return int(value)
+        return 0
+
+    @property
+    def peak_memory(self) -> Optional[int]:
+        # In KB, or None before Linux 5.19. It includes the page cache of the
+        # files read or written while charged to it, which memory.max counts
+        # too; only the peak of the total is kept.
+        try:
+            with open(os.path.join(self.path, "memory.peak")) as f:
+                return int(f.read()) // 1024
+        except FileNotFoundError:
+            return None
+
+    @property
+    def oom_killed(self) -> bool:
+        # Whether anything in it was killed for going over memory.max.
+        return self._read_stat("memory.events", "oom_kill") > 0
+
+    @property
+    def cpu_time(self) -> float:
+        # User time, as in rusage, of everything that ran in it.
+        return self._read_stat("cpu.stat", "user_usec") / 1000000.0
+
+    def kill(self) -> bool:
+        # Whether everything in it was killed; cgroup.kill needs Linux 5.14+.
+        try:
+            self._write("cgroup.kill", "1")
+        except OSError:
+            return False
+        return True
+
+    def remove(self) -> None:
+        self.close_procs()
+        self.kill()
+        # Killed processes leave it shortly after.
+        for _ in range(1000):
+            try:
+                os.rmdir(self.path)
+                return
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    return
+                if e.errno != errno.EBUSY:
+                    break
+            time.sleep(0.001)
+        log.warning("Failed to remove cgroup %s", self.path)
@@ -0,0 +1,142 @@
+import sys
+from typing import Any, List
+
+from ._cptbox import Debugger
+from .filesystem_policies import FilesystemAccessRule
+from .handlers import ALLOW
+from .isolate import AccessChecker, FilesystemSyscallKind, IsolateTracer
+from .syscalls import *
+
+
+class CompilerIsolateTracer(IsolateTracer):
+    # Compilers run other programs (the driver runs the compiler proper, the
+    # assembler and the linker), and create, rename and remove files where
+    # they may write, which submissions can't. Paths are still checked
+    # against the policies, so they can only do so in the working directory.
+
+    def __init__(
+        self,
+        *,
+        read_fs: List[FilesystemAccessRule],
+        write_fs: List[FilesystemAccessRule],
+        base: "CompilerIsolateTracer | None" = None,
+    ):
+        super().__init__(read_fs=read_fs, write_fs=write_fs, base=base)
+        if base is not None:
+            return
+
+        self.update(
+            {
+                # Process spawning
+                sys_fork: ALLOW,
+                sys_vfork: ALLOW,
+                sys_execve: ALLOW,
+                sys_wait4: ALLOW,
+                sys_waitid: ALLOW,
+                sys_getpgid: ALLOW,
+                sys_getcpu: ALLOW,
+                sys_setrlimit: ALLOW,
+                sys_getpriority: ALLOW,
+                sys_getresuid: ALLOW,
+                sys_getresgid: ALLOW,
+                sys_mincore: ALLOW,
+                sys_memfd_create: ALLOW,
+                # Sleeping; glibc's sleep and nanosleep use clock_nanosleep
+                sys_clock_nanosleep: ALLOW,
+                sys_clock_nanosleep_time64: ALLOW,
+                # Files already open
+                sys_readv: ALLOW,
+                sys_pwrite64: ALLOW,
+                sys_preadv: ALLOW,
+                sys_pwritev: ALLOW,
+                sys_sendfile: ALLOW,
+                sys_copy_file_range: ALLOW,
+                sys_fchmod: ALLOW,
+                sys_fchdir: ALLOW,
+                sys_fstatfs: ALLOW,
+                sys_umask: ALLOW,
+                sys_flock: ALLOW,
+                sys_fsync: ALLOW,
+                sys_fdatasync: ALLOW,
+                sys_fadvise64: ALLOW,
+                sys_fallocate: ALLOW,
+                sys_ftruncate: ALLOW,
+            }
+        )
+
+    def _filesystem_handlers(self) -> dict[int, Any]:
+        # Bound to the policies, so rebuilt for every layer like the rest.
+        read = FilesystemSyscallKind.READ
+        write = FilesystemSyscallKind.WRITE
+        handlers = super()._filesystem_handlers()
+        if "freebsd" in sys.platform:
+            return handlers
+
+        handlers.update(
+            {
+                sys_chdir: self.handle_file_access(read, file_reg=0),
+                sys_mkdir: self.handle_file_access(write, file_reg=0),
+                sys_mkdirat: self.handle_file_access_at(
+                    write, dir_reg=0, file_reg=1
+                ),
+                sys_rmdir: self.handle_file_access(write, file_reg=0),
+                sys_unlink: self.handle_file_access(write, file_reg=0),
+                sys_unlinkat: self.handle_file_access_at(
+                    write, dir_reg=0, file_reg=1
+                ),
+                sys_truncate: self.handle_file_access(write, file_reg=0),
+                sys_chmod: self.handle_file_access(write, file_reg=0),
+                sys_fchmodat: self.handle_file_access_at(
+                    write, dir_reg=0, file_reg=1
+                ),
+                sys_utimensat: self._handle_utimensat(),
+                # A symlink's name must be writable; where it points is only
+                # checked when opened through it. A hard link's target must
+                # be readable, and its name writable; renames write both.
+                sys_symlink: self.handle_file_access(write, file_reg=1),
+                sys_symlinkat: self.handle_file_access_at(
+                    write, dir_reg=1, file_reg=2
+                ),
+                sys_link: self._handle_all(
+                    self.handle_file_access(read, file_reg=0),
+                    self.handle_file_access(write, file_reg=1),
+                ),
+                sys_linkat: self._handle_all(
+                    self.handle_file_access_at(read, dir_reg=0, file_reg=1),
+                    self.handle_file_access_at(write, dir_reg=2, file_reg=3),
+                ),
+                sys_rename: self._handle_all(
+                    self.handle_file_access(write, file_reg=0),
+                    self.handle_file_access(write, file_reg=1),
+                ),
+                sys_renameat: self._handle_all(
+                    self.handle_file_access_at(write, dir_reg=0, file_reg=1),
+                    self.handle_file_access_at(write, dir_reg=2, file_reg=3),
+                ),
+                sys_renameat2: self._handle_all(
+                    self.handle_file_access_at(write, dir_reg=0, file_reg=1),
+                    self.handle_file_access_at(write, dir_reg=2, file_reg=3),
+                ),
+            }
+        )
+        return handlers
+
+    def _handle_utimensat(self) -> AccessChecker:
+        check_path = self.handle_file_access_at(
+            FilesystemSyscallKind.WRITE, dir_reg=0, file_reg=1
+        )
+
+        def check(debugger: Debugger) -> None:
+            # Without a path, as futimens(), it changes a file already open.
+            if debugger.uarg1:
+                check_path(debugger)
+
+        return check
+
+    @staticmethod
+    def _handle_all(*checks: AccessChecker) -> AccessChecker:
+        def check(debugger: Debugger) -> None:
+            for inner in checks:
+                inner(debugger)
+
+        return check
@@ -1,6 +1,8 @@
 import os
 from enum import Enum
-from typing import Sequence, Union
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+from ._cptbox import FilesystemTrie, PTBOX_FS_FILE
 
 
 class AccessMode(Enum):
@@ -79,12 +81,69 @@ class RecursiveDir(DirFilesystemAccessRule):
 FilesystemAccessRule = Union[ExactFile, ExactDir, RecursiveDir]
 
 
+def _process_relative(path: str) -> bool:
+    # Whether it is, or leads to, something of a process, which would be the
+    # judge's own in a ruleset it builds.
+    for candidate in (path, os.path.realpath(path)):
+        parts = candidate.split("/")
+        if (
+            len(parts) > 2
+            and parts[1] == "proc"
+            and (parts[2] in ("self", "thread-self") or parts[2].isdigit())
+        ):
+            return True
+    return False
+
+
 class FilesystemPolicy:
     def __init__(self, rules: Sequence[FilesystemAccessRule]):
         self.root = Dir()
+        self._native: Optional[FilesystemTrie] = None
+        self._landlock: Optional[List[Tuple[str, bool]]] = None
+        self._landlock_exported = False
         for rule in rules:
             self._add_rule(rule)
 
+    @property
+    def native_policies(self) -> List[FilesystemTrie]:
+        # Compiled on first use, and shared by every launch using the policy.
+        if self._native is None:
+            self._native = FilesystemTrie(self._export(self.root, ""))
+        return [self._native]
+
+    @property
+    def landlock_rules(self) -> Optional[List[Tuple[str, bool]]]:
+        # The rules granting files to read, as (path, recursive) pairs of a
+        # Landlock ruleset, or None if it can't enforce them. Directories
+        # alone grant none, and their listings are left to the tracer. The
+        # files of a process can't be granted, as a ruleset the judge builds
+        # would name its own, and need the tracer's checks.
+        if not self._landlock_exported:
+            self._landlock = self._export_landlock()
+            self._landlock_exported = True
+        return self._landlock
+
+    def _export_landlock(self) -> Optional[List[Tuple[str, bool]]]:
+        rules = []
+        for path, mode in self._export(self.root, ""):
+            if _process_relative(path):
+                return None
+            if mode != AccessMode.EXACT.value:
+                rules.append((path, mode == AccessMode.RECURSIVE.value))
+        return rules
+
+    def _export(
+        self, node: Union[Dir, File], path: str
+    ) -> Iterator[Tuple[str, int]]:
+        if isinstance(node, File):
+            yield path, PTBOX_FS_FILE
+            return
+        if node.access_mode != AccessMode.NONE:
+            # The native modes match AccessMode's values.
+            yield path or "/", node.access_mode.value
+        for component, child in node.subpath_map.items():
+            yield from self._export(child, f"{path}/{component}")
+
     def _add_rule(self, rule: FilesystemAccessRule) -> None:
         if not rule.exists():
             return
@@ -157,3 +216,55 @@ class FilesystemPolicy:
 
     def _check_final_node(self, node: Union[Dir, File]) -> bool:
         return isinstance(node, File) or node.access_mode != AccessMode.NONE
+
+    # `path` should be a normalized path
+    def check_recursive(self, path: str) -> bool:
+        # Whether everything beneath it is allowed too.
+        components = [] if path == "/" else path.split("/")[1:]
+
+        node: Optional[Union[Dir, File]] = self.root
+        for component in components:
+            if not isinstance(node, Dir):
+                return False
+            elif node.access_mode == AccessMode.RECURSIVE:
+                return True
+            node = node.subpath_map.get(component)
+
+        return (
+            isinstance(node, Dir) and node.access_mode == AccessMode.RECURSIVE
+        )
+
+
+class LayeredFilesystemPolicy:
+    # A policy shared by many uses, with a few rules of this use on top. A
+    # path is allowed if either allows it, as if all the rules were in one
+    # policy, but the shared one is only compiled once.
+    def __init__(
+        self,
+        base: Union[FilesystemPolicy, "LayeredFilesystemPolicy"],
+        rules: Sequence[FilesystemAccessRule],
+    ):
+        self.base = base
+        self.layer = FilesystemPolicy(rules)
+
+    @property
+    def native_policies(self) -> List[FilesystemTrie]:
+        return self.layer.native_policies + self.base.native_policies
+
+    @property
+    def landlock_rules(self) -> Optional[List[Tuple[str, bool]]]:
+        layer = self.layer.landlock_rules
+        base = self.base.landlock_rules
+        if layer is None or base is None:
+            return None
+        return layer + base
+
+    # `path` should be a normalized path
+    def check(self, path: str) -> bool:
+        return self.layer.check(path) or self.base.check(path)
+
+    # `path` should be a normalized path
+    def check_recursive(self, path: str) -> bool:
+        return self.layer.check_recursive(path) or self.base.check_recursive(
+            path
+        )
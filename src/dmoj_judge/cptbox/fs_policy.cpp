@@ -0,0 +1,175 @@
+#include "fs_policy.h"
+#include "ptbox/ptbox.h"
+
+#include <fcntl.h>
+#include <limits.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+void fs_policy::add(const char *path, int mode) {
+    node *current = &root;
+    const char *start = path + 1;
+
+    while (*start) {
+        const char *end = strchr(start, '/');
+        if (!end)
+            end = start + strlen(start);
+        std::unique_ptr<node> &child = current->children[std::string(start, end - start)];
+        if (!child)
+            child.reset(new node);
+        current = child.get();
+        start = *end ? end + 1 : end;
+    }
+    current->mode = mode;
+}
+
+bool fs_policy::check(const char *path) const {
+    const node *current = &root;
+    const char *start = path + 1;
+
+    while (*start) {
+        if (current->mode == PTBOX_FS_FILE)
+            return false;
+        if (current->mode == PTBOX_FS_RECURSIVE)
+            return true;
+
+        const char *end = strchr(start, '/');
+        if (!end)
+            end = start + strlen(start);
+        auto child = current->children.find(std::string(start, end - start));
+        if (child == current->children.end())
+            return false;
+        current = child->second.get();
+        start = *end ? end + 1 : end;
+    }
+    return current->mode != PTBOX_FS_NONE;
+}
+
+void fs_fast_path::add_syscall(int abi, int syscall, int dir_reg, int file_reg, int flag_reg) {
+    syscalls[abi * MAX_SYSCALL + syscall] = {dir_reg, file_reg, flag_reg};
+}
+
+static unsigned long get_arg(pt_debugger *debugger, int reg) {
+    switch (reg) {
+        case 0:
+            return debugger->arg0();
+        case 1:
+            return debugger->arg1();
+        case 2:
+            return debugger->arg2();
+        case 3:
+            return debugger->arg3();
+        case 4:
+            return debugger->arg4();
+        default:
+            return debugger->arg5();
+    }
+}
+
+// Whether `path` is as os.path.normpath would leave it, and can be checked against the policies as is. Non-ASCII
+// paths are left to Python, which denies those that aren't UTF-8.
+static bool is_normalized(const std::string &path) {
+    if (path[0] != '/')
+        return false;
+    if (path.size() == 1)
+        return true;
+
+    size_t start = 1;
+    while (start <= path.size()) {
+        size_t end = path.find('/', start);
+        if (end == std::string::npos)
+            end = path.size();
+        size_t length = end - start;
+        if (!length || (length == 1 && path[start] == '.') || (length == 2 && !path.compare(start, 2, "..")))
+            return false;
+        start = end + 1;
+    }
+
+    for (unsigned char c : path) {
+        if (c >= 0x80)
+            return false;
+    }
+    return true;
+}
+
+static bool is_write(unsigned long flags) {
+    static const unsigned long write_flags[] = {
+        O_WRONLY, O_RDWR, O_TRUNC, O_CREAT, O_EXCL,
+#ifdef O_TMPFILE
+        O_TMPFILE,
+#endif
+    };
+
+    // Strict equality, as in IsolateTracer: some flags have several bits set.
+    for (unsigned long flag : write_flags) {
+        if ((flags & flag) == flag)
+            return true;
+    }
+    return false;
+}
+
+bool fs_fast_path::allows(pt_debugger *debugger, int syscall) const {
+    int abi = debugger->abi();
+    if (abi == PTBOX_ABI_INVALID)
+        return false;
+
+    const fs_fast_path *root = this;
+    while (root->base)
+        root = root->base;
+    auto entry = root->syscalls.find(abi * MAX_SYSCALL + syscall);
+    if (entry == root->syscalls.end())
+        return false;
+    const registers &regs = entry->second;
+
+    unsigned long address = get_arg(debugger, regs.file_reg);
+    if (abi == PTBOX_ABI_X86 || abi == PTBOX_ABI_X32 || abi == PTBOX_ABI_ARM)
+        address &= 0xFFFFFFFF;
+
+    char *file = debugger->readstr(address, PATH_MAX);
+    if (!file)
+        return false;
+    std::string path(file);
+    debugger->freestr(file);
+    // Empty paths, e.g. fstatat with AT_EMPTY_PATH, and overly long ones are left to Python.
+    if (path.empty() || path.size() >= PATH_MAX)
+        return false;
+
+    if (path[0] != '/') {
+        char link[64], dir[PATH_MAX];
+        int dirfd = regs.dir_reg < 0 ? AT_FDCWD : (int) get_arg(debugger, regs.dir_reg);
+        if (dirfd == AT_FDCWD)
+            snprintf(link, sizeof link, "/proc/%d/cwd", debugger->gettid());
+        else
+            snprintf(link, sizeof link, "/proc/%d/fd/%d", debugger->gettid(), dirfd);
+
+        ssize_t length = readlink(link, dir, sizeof dir - 1);
+        if (length <= 0 || dir[0] != '/')
+            return false;
+        dir[length] = '\0';
+        path = length == 1 ? "/" + path : std::string(dir) + "/" + path;
+    }
+
+    // /proc/self and /proc/<tid> are projected by Python.
+    if (!is_normalized(path) || !path.compare(0, 5, "/proc"))
+        return false;
+
+    // A path with symlinks in it must be allowed both as is and once resolved, which Python checks.
+    char real[PATH_MAX];
+    if (!realpath(path.c_str(), real) || path != real)
+        return false;
+
+    bool write = regs.flag_reg >= 0 && is_write(get_arg(debugger, regs.flag_reg));
+    return check(real, write);
+}
+
+bool fs_fast_path::check(const char *path, bool write) const {
+    for (const fs_fast_path *layer = this; layer; layer = layer->base) {
+        for (const fs_policy *policy : write ? layer->write_policies : layer->read_policies) {
+            if (policy->check(path))
+                return true;
+        }
+    }
+    return false;
+}
@@ -0,0 +1,59 @@
+#pragma once
+#ifndef id5C1E8F0A_7B2D_4E61_A9C3F4D2E8B71A06
+#define id5C1E8F0A_7B2D_4E61_A9C3F4D2E8B71A06
+
+#include <memory>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+class pt_debugger;
+
+// Matches filesystem_policies.AccessMode, plus a node for ExactFile rules.
+#define PTBOX_FS_NONE      0
+#define PTBOX_FS_EXACT     1
+#define PTBOX_FS_RECURSIVE 2
+#define PTBOX_FS_FILE      3
+
+// A compiled FilesystemPolicy, checked the same way, but without the GIL.
+class fs_policy {
+  public:
+    // Paths are absolute, and normalized; intermediate directories are added as needed.
+    void add(const char *path, int mode);
+    bool check(const char *path) const;
+
+  private:
+    struct node {
+        int mode = PTBOX_FS_NONE;
+        std::unordered_map<std::string, std::unique_ptr<node>> children;
+    };
+    node root;
+};
+
+// Allows the common case of the path checks of IsolateTracer natively: a normalized path, with no symlinks in it,
+// allowed by one of the policies. Anything else is left for Python to decide, and to report.
+class fs_fast_path {
+  public:
+    // Registers of the path, its directory file descriptor, or -1 for the working directory, and its open flags,
+    // or -1 to check the read policies.
+    void add_syscall(int abi, int syscall, int dir_reg, int file_reg, int flag_reg);
+    // The policies are not copied, and must outlive this.
+    void add_read_policy(const fs_policy *policy) { read_policies.push_back(policy); }
+    void add_write_policy(const fs_policy *policy) { write_policies.push_back(policy); }
+    // Layers this on top of `base`, which must outlive it: its syscalls are the base's, and its policies are checked
+    // before the base's. Only the layer's own policies are then added to it.
+    void set_base(const fs_fast_path *base) { this->base = base; }
+    bool allows(pt_debugger *debugger, int syscall) const;
+
+  private:
+    struct registers {
+        int dir_reg, file_reg, flag_reg;
+    };
+    bool check(const char *path, bool write) const;
+
+    std::unordered_map<int, registers> syscalls;
+    std::vector<const fs_policy *> read_policies, write_policies;
+    const fs_fast_path *base = nullptr;
+};
+
+#endif
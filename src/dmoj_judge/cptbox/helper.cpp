@@ -21,10 +21,27 @@
 
 #include <libprocstat.h>
 #else
+#include <alloca.h>
+#include <limits.h>
+#include <linux/seccomp.h>
+#include <poll.h>
 #include <sched.h>
+#include <sys/ioctl.h>
 // No ASLR on FreeBSD... not as of 11.0, anyway
 #include <sys/personality.h>
 #include <sys/prctl.h>
+#include <sys/socket.h>
+#include <sys/syscall.h>
+#include <sys/uio.h>
+#if __has_include(<linux/landlock.h>)
+#include <linux/landlock.h>
+#endif
+#endif
+
+#if !PTBOX_FREEBSD && defined(LANDLOCK_CREATE_RULESET_VERSION) && defined(__NR_landlock_create_ruleset)
+#define PTBOX_LANDLOCK 1
+#else
+#define PTBOX_LANDLOCK 0
 #endif
 
 #if defined(__FreeBSD__) || (defined(__APPLE__) && defined(__MACH__))
@@ -44,14 +61,83 @@ inline void setrlimit2(int resource, rlim_t limit) {
     setrlimit2(resource, limit, limit);
 }
 
+static int child_fail(int exec_fd, int code) {
+    // Without a tracer, this is how the parent tells a failure to set up the child from the submission's exit code.
+    if (exec_fd >= 0) {
+        ssize_t written = write(exec_fd, &code, sizeof code);
+        (void) written;
+    }
+    return code;
+}
+
+#if !PTBOX_FREEBSD
+static int send_fd(int sock, int fd) {
+    char data = 0;
+    struct iovec iov = {&data, 1};
+    union {
+        char buf[CMSG_SPACE(sizeof(int))];
+        struct cmsghdr align;
+    } control;
+    struct msghdr msg;
+
+    memset(&msg, 0, sizeof msg);
+    memset(&control, 0, sizeof control);
+    msg.msg_iov = &iov;
+    msg.msg_iovlen = 1;
+    msg.msg_control = control.buf;
+    msg.msg_controllen = sizeof control.buf;
+
+    struct cmsghdr *cmsg = CMSG_FIRSTHDR(&msg);
+    cmsg->cmsg_level = SOL_SOCKET;
+    cmsg->cmsg_type = SCM_RIGHTS;
+    cmsg->cmsg_len = CMSG_LEN(sizeof(int));
+    memcpy(CMSG_DATA(cmsg), &fd, sizeof fd);
+    return sendmsg(sock, &msg, 0) < 0 ? -1 : 0;
+}
+
+static int install_seccomp(const struct child_config *config, int notify_fd) {
+    // The filters were compiled in the parent; PR_SET_NO_NEW_PRIVS is already set.
+    if (config->seccomp_notify_filter) {
+        // Installed first, and on its own: it allows everything but the syscalls it notifies about, so the
+        // listener can still be sent to the supervisor.
+        int listener = syscall(__NR_seccomp, SECCOMP_SET_MODE_FILTER, SECCOMP_FILTER_FLAG_NEW_LISTENER,
+                               config->seccomp_notify_filter);
+        if (listener < 0) {
+            perror("seccomp(SECCOMP_FILTER_FLAG_NEW_LISTENER)");
+            return -1;
+        }
+        if (send_fd(notify_fd, listener)) {
+            perror("sendmsg");
+            return -1;
+        }
+        close(listener);
+    }
+
+    // Through seccomp rather than prctl, which the notify filter may hold for the supervisor to check against the
+    // submission's policy.
+    if (config->seccomp_filter && syscall(__NR_seccomp, SECCOMP_SET_MODE_FILTER, 0, config->seccomp_filter)) {
+        perror("seccomp(SECCOMP_SET_MODE_FILTER)");
+        return -1;
+    }
+    return 0;
+}
+#endif
+
 int cptbox_child_run(const struct child_config *config) {
+    int exec_fd = config->exec_fd, notify_fd = config->notify_fd;
+
+    if (config->cgroup_fd >= 0 && write(config->cgroup_fd, "0", 1) != 1) {
+        perror("cgroup.procs");
+        return child_fail(exec_fd, PTBOX_SPAWN_FAIL_CGROUP);
+    }
+
 #ifndef __FreeBSD__
     // There is no ASLR on FreeBSD, but disable it elsewhere
     if (config->personality > 0)
         personality(config->personality);
 
     if (prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0))
-        return PTBOX_SPAWN_FAIL_NO_NEW_PRIVS;
+        return child_fail(exec_fd, PTBOX_SPAWN_FAIL_NO_NEW_PRIVS);
 
 #ifdef PR_SET_SPECULATION_CTRL  // Since Linux 4.17
     // Turn off Spectre Variant 4 protection in case it is turned on; we don't
@@ -62,14 +148,14 @@ int cptbox_child_run(const struct child_config *config) {
 #endif
 #endif
 
-    if (ptrace_traceme()) {
+    if (config->use_ptrace && ptrace_traceme()) {
         perror("ptrace");
         return PTBOX_SPAWN_FAIL_TRACEME;
     }
 
     if (config->cpu_affinity_mask) {
 #if PTBOX_FREEBSD
-        return PTBOX_SPAWN_FAIL_SETAFFINITY;
+        return child_fail(exec_fd, PTBOX_SPAWN_FAIL_SETAFFINITY);
 #else
         cpu_set_t cpuset;
         CPU_ZERO(&cpuset);
@@ -82,21 +168,152 @@ int cptbox_child_run(const struct child_config *config) {
 
         if (sched_setaffinity(getpid(), sizeof(cpuset), &cpuset)) {
             perror("sched_setaffinity");
-            return PTBOX_SPAWN_FAIL_SETAFFINITY;
+            return child_fail(exec_fd, PTBOX_SPAWN_FAIL_SETAFFINITY);
         }
 #endif
     }
 
-    kill(getpid(), SIGSTOP);
+    if (config->use_ptrace)
+        kill(getpid(), SIGSTOP);
+
+    if (config->stdin_ >= 0)
+        dup2(config->stdin_, 0);
+    if (config->stdout_ >= 0)
+        dup2(config->stdout_, 1);
+    if (config->stderr_ >= 0)
+        dup2(config->stderr_, 2);
+
+    // The pipe and socket to the parent, and the Landlock ruleset, are kept from 3 on, besides the standard
+    // streams; execve still closes them. They are first moved out of the way, so that none is overwritten by moving
+    // another.
+    int lowfd = 3, landlock_fd = config->landlock_fd;
+    int *keep[] = {&exec_fd, &notify_fd, &landlock_fd};
+    for (int i = 0; i < 3; i++) {
+        if (*keep[i] >= 0)
+            *keep[i] = fcntl(*keep[i], F_DUPFD_CLOEXEC, 6);
+    }
+    for (int i = 0; i < 3; i++) {
+        if (*keep[i] >= 0) {
+            dup2(*keep[i], lowfd);
+            fcntl(lowfd, F_SETFD, FD_CLOEXEC);
+            *keep[i] = lowfd++;
+        }
+    }
+    cptbox_closefrom(lowfd);
+
+    // All these limits are dropped as late as possible, so that nothing above can run into them.
+    if (config->address_space)
+        setrlimit2(RLIMIT_AS, config->address_space);
+
+    if (config->memory)
+        setrlimit2(RLIMIT_DATA, config->memory);
+
+    if (config->cpu_time)
+        setrlimit2(RLIMIT_CPU, config->cpu_time, config->cpu_time + 1);
+
+    if (config->nproc >= 0)
+        setrlimit2(RLIMIT_NPROC, config->nproc);
+
+    if (config->fsize >= 0)
+        setrlimit2(RLIMIT_FSIZE, config->fsize);
+
+    if (config->dir && *config->dir)
+        chdir(config->dir);
+
+    setrlimit2(RLIMIT_STACK, RLIM_INFINITY);
+    setrlimit2(RLIMIT_CORE, 0);
+
+#if PTBOX_LANDLOCK
+    // Like the filters, only applies from here on; PR_SET_NO_NEW_PRIVS is already set.
+    if (landlock_fd >= 0) {
+        if (syscall(__NR_landlock_restrict_self, landlock_fd, 0)) {
+            perror("landlock_restrict_self");
+            return child_fail(exec_fd, PTBOX_SPAWN_FAIL_LANDLOCK);
+        }
+        close(landlock_fd);
+    }
+#endif
+
+#if !PTBOX_FREEBSD
+    // The filters go in last, so that they never apply to the setup above: without a tracer nothing would allow
+    // it, and a supervisor would check it against the submission's policy. Only execve is left.
+    if (install_seccomp(config, notify_fd))
+        return child_fail(exec_fd, PTBOX_SPAWN_FAIL_SECCOMP);
+#endif
+
+    execve(config->file, config->argv, config->envp);
+    perror("execve");
+    return child_fail(exec_fd, PTBOX_SPAWN_FAIL_EXECVE);
+}
+
+#if !PTBOX_FREEBSD && !defined(SCMP_ACT_KILL_PROCESS)
+// libseccomp before 2.4 can only kill the offending thread.
+#define SCMP_ACT_KILL_PROCESS SCMP_ACT_KILL
+#endif
 
 #if !PTBOX_FREEBSD
-    scmp_filter_ctx ctx = seccomp_init(SCMP_ACT_TRACE(0));
-    if (!ctx) {
-        fprintf(stderr, "Failed to initialize seccomp context!");
-        goto seccomp_init_fail;
+// Opens with any of these are checked against the write policy, or, with O_PATH or O_DIRECTORY, aren't checked by
+// Landlock, which only handles reading files; the rest only read. O_TMPFILE includes O_DIRECTORY.
+#define PTBOX_OPEN_CHECKED_FLAGS \
+    ((scmp_datum_t) (O_WRONLY | O_RDWR | O_CREAT | O_EXCL | O_TRUNC | O_TMPFILE | O_PATH))
+
+static struct sock_fprog *seccomp_export(scmp_filter_ctx ctx) {
+    struct sock_fprog *prog = NULL;
+    int rc, fd = -1, saved_errno;
+    off_t size;
+
+    // seccomp_export_bpf only writes to file descriptors, so the program goes through a memfd.
+    if ((fd = cptbox_memfd_create()) < 0)
+        goto fail;
+    if ((rc = seccomp_export_bpf(ctx, fd))) {
+        errno = -rc;
+        goto fail;
+    }
+    if ((size = lseek(fd, 0, SEEK_END)) < 0)
+        goto fail;
+    if (size % sizeof(struct sock_filter) || size / sizeof(struct sock_filter) > USHRT_MAX) {
+        errno = E2BIG;
+        goto fail;
     }
 
+    // The program is allocated along with its header, so that it can be freed at once.
+    if (!(prog = (struct sock_fprog *) malloc(sizeof *prog + size))) {
+        errno = ENOMEM;
+        goto fail;
+    }
+    prog->len = size / sizeof(struct sock_filter);
+    prog->filter = (struct sock_filter *) (prog + 1);
+    if (pread(fd, prog->filter, size, 0) != size) {
+        if (!errno)
+            errno = EIO;
+        free(prog);
+        prog = NULL;
+    }
+
+fail:
+    saved_errno = errno;
+    if (fd >= 0)
+        close(fd);
+    seccomp_release(ctx);
+    errno = saved_errno;
+    return prog;
+}
+#endif
+
+struct sock_fprog *cptbox_seccomp_compile(const int *handlers, int trace, const int *read_opens) {
+#if PTBOX_FREEBSD
+    errno = ENOSYS;
+    return NULL;
+#else
+    scmp_filter_ctx ctx;
     int rc;
+
+    if (!(ctx = seccomp_init(trace ? SCMP_ACT_TRACE(0) : SCMP_ACT_KILL_PROCESS))) {
+        fprintf(stderr, "Failed to initialize seccomp context!\n");
+        errno = ENOMEM;
+        return NULL;
+    }
+
     // By default, the native architecture is added to the filter already, so we add all the non-native ones.
     // This will bloat the filter due to additional architectures, but a few extra compares in the BPF matters
     // very little when syscalls are rare and other overhead is expensive.
@@ -108,8 +325,9 @@ int cptbox_child_run(const struct child_config *config) {
     }
 
     for (int syscall = 0; syscall < MAX_SYSCALL; syscall++) {
-        int handler = config->seccomp_handlers[syscall];
-        if (handler == 0) {
+        int handler = handlers[syscall];
+        // The notify filter decides on these.
+        if (handler == 0 || handler == PTBOX_SECCOMP_NOTIFY) {
             if ((rc = seccomp_rule_add(ctx, SCMP_ACT_ALLOW, syscall, 0))) {
                 fprintf(stderr, "seccomp_rule_add(..., SCMP_ACT_ALLOW, %d): %s\n", syscall, strerror(-rc));
                 // This failure is not fatal, it'll just cause the syscall to trap anyway.
@@ -119,59 +337,231 @@ int cptbox_child_run(const struct child_config *config) {
                 fprintf(stderr, "seccomp_rule_add(..., SCMP_ACT_ERRNO(%d), %d): %s\n", handler, syscall, strerror(-rc));
                 // This failure is not fatal, it'll just cause the syscall to trap anyway.
             }
+        } else if (read_opens && read_opens[syscall] >= 0) {
+            unsigned int reg = read_opens[syscall];
+            if ((rc = seccomp_rule_add(ctx, SCMP_ACT_ALLOW, syscall, 1,
+                                       SCMP_CMP(reg, SCMP_CMP_MASKED_EQ, PTBOX_OPEN_CHECKED_FLAGS, 0)))) {
+                fprintf(stderr, "seccomp_rule_add(..., SCMP_ACT_ALLOW, %d, <read>): %s\n", syscall, strerror(-rc));
+                // This failure is not fatal, it'll just cause the syscall to trap anyway.
+            }
         }
     }
 
-    if ((rc = seccomp_load(ctx))) {
-        fprintf(stderr, "seccomp_load: %s\n", strerror(-rc));
-        goto seccomp_load_fail;
+    return seccomp_export(ctx);
+#endif
+}
+
+struct sock_fprog *cptbox_seccomp_compile_notify(const int *handlers, const int *read_opens) {
+#if PTBOX_FREEBSD || !defined(SCMP_ACT_NOTIFY)
+    errno = ENOSYS;
+    return NULL;
+#else
+    scmp_filter_ctx ctx;
+    int rc;
+
+    if (!(ctx = seccomp_init(SCMP_ACT_ALLOW))) {
+        fprintf(stderr, "Failed to initialize seccomp context!\n");
+        errno = ENOMEM;
+        return NULL;
     }
 
-    seccomp_release(ctx);
-#endif
+    // Only native syscalls are notified about; the main filter still traces or kills the others.
+    if ((rc = seccomp_attr_set(ctx, SCMP_FLTATR_ACT_BADARCH, SCMP_ACT_ALLOW))) {
+        seccomp_release(ctx);
+        errno = -rc;
+        return NULL;
+    }
 
-    if (config->stdin_ >= 0)
-        dup2(config->stdin_, 0);
-    if (config->stdout_ >= 0)
-        dup2(config->stdout_, 1);
-    if (config->stderr_ >= 0)
-        dup2(config->stderr_, 2);
-    cptbox_closefrom(3);
+    for (int syscall = 0; syscall < MAX_SYSCALL; syscall++) {
+        if (handlers[syscall] != PTBOX_SECCOMP_NOTIFY)
+            continue;
+        if (read_opens && read_opens[syscall] >= 0) {
+            unsigned int reg = read_opens[syscall];
+            // Only opens with any of the flags, one rule each, as there is no comparison for that.
+            for (scmp_datum_t flag = 1; flag <= PTBOX_OPEN_CHECKED_FLAGS; flag <<= 1) {
+                if (!(PTBOX_OPEN_CHECKED_FLAGS & flag))
+                    continue;
+                rc = seccomp_rule_add(ctx, SCMP_ACT_NOTIFY, syscall, 1, SCMP_CMP(reg, SCMP_CMP_MASKED_EQ, flag, flag));
+                if (rc)
+                    break;
+            }
+        } else
+            rc = seccomp_rule_add(ctx, SCMP_ACT_NOTIFY, syscall, 0);
+        if (rc) {
+            // Unlike above, a syscall missing from this filter would go unchecked.
+            seccomp_release(ctx);
+            errno = -rc;
+            return NULL;
+        }
+    }
 
-    // All these limits should be dropped after initializing seccomp, since seccomp allocates
-    // memory, and if an arena isn't sufficiently free it could force seccomp into an OOM
-    // situation where we'd fail to initialize.
-    if (config->address_space)
-        setrlimit2(RLIMIT_AS, config->address_space);
+    return seccomp_export(ctx);
+#endif
+}
 
-    if (config->memory)
-        setrlimit2(RLIMIT_DATA, config->memory);
+void cptbox_seccomp_free(struct sock_fprog *prog) {
+    free(prog);
+}
 
-    if (config->cpu_time)
-        setrlimit2(RLIMIT_CPU, config->cpu_time, config->cpu_time + 1);
+int cptbox_landlock_abi(void) {
+#if PTBOX_LANDLOCK
+    int abi = syscall(__NR_landlock_create_ruleset, NULL, 0, LANDLOCK_CREATE_RULESET_VERSION);
+    return abi < 0 ? 0 : abi;
+#else
+    return 0;
+#endif
+}
 
-    if (config->nproc >= 0)
-        setrlimit2(RLIMIT_NPROC, config->nproc);
+int cptbox_landlock_create(void) {
+#if PTBOX_LANDLOCK
+    struct landlock_ruleset_attr attr;
 
-    if (config->fsize >= 0)
-        setrlimit2(RLIMIT_FSIZE, config->fsize);
+    // Nothing else is restricted: writes are still checked by the tracer, and executing a file needs it to be
+    // readable already. Neither are directories, as a rule could only ever grant listing one along with everything
+    // beneath it; the tracer checks their listings instead.
+    memset(&attr, 0, sizeof attr);
+    attr.handled_access_fs = LANDLOCK_ACCESS_FS_READ_FILE;
+    return syscall(__NR_landlock_create_ruleset, &attr, sizeof attr, 0);
+#else
+    errno = ENOSYS;
+    return -1;
+#endif
+}
 
-    if (config->dir && *config->dir)
-        chdir(config->dir);
+int cptbox_landlock_add(int ruleset, const char *path) {
+#if PTBOX_LANDLOCK
+    struct landlock_path_beneath_attr rule;
+    int fd, rc, saved_errno;
+
+    if ((fd = open(path, O_PATH | O_CLOEXEC)) < 0)
+        return -1;
+    rule.parent_fd = fd;
+    rule.allowed_access = LANDLOCK_ACCESS_FS_READ_FILE;
+    rc = syscall(__NR_landlock_add_rule, ruleset, LANDLOCK_RULE_PATH_BENEATH, &rule, 0);
+    saved_errno = errno;
+    close(fd);
+    errno = saved_errno;
+    return rc;
+#else
+    errno = ENOSYS;
+    return -1;
+#endif
+}
 
-    setrlimit2(RLIMIT_STACK, RLIM_INFINITY);
-    setrlimit2(RLIMIT_CORE, 0);
+int cptbox_seccomp_recv_listener(int sock) {
+#if PTBOX_FREEBSD
+    errno = ENOSYS;
+    return -1;
+#else
+    char data;
+    struct iovec iov = {&data, 1};
+    union {
+        char buf[CMSG_SPACE(sizeof(int))];
+        struct cmsghdr align;
+    } control;
+    struct msghdr msg;
+    ssize_t bytes;
+    int fd;
+
+    memset(&msg, 0, sizeof msg);
+    msg.msg_iov = &iov;
+    msg.msg_iovlen = 1;
+    msg.msg_control = control.buf;
+    msg.msg_controllen = sizeof control.buf;
+
+    do {
+        bytes = recvmsg(sock, &msg, MSG_CMSG_CLOEXEC);
+    } while (bytes < 0 && errno == EINTR);
+    if (bytes < 0)
+        return -1;
+
+    struct cmsghdr *cmsg = CMSG_FIRSTHDR(&msg);
+    if (!bytes || !cmsg || cmsg->cmsg_level != SOL_SOCKET || cmsg->cmsg_type != SCM_RIGHTS) {
+        errno = 0;
+        return -1;
+    }
+    memcpy(&fd, CMSG_DATA(cmsg), sizeof fd);
+    return fd;
+#endif
+}
 
-    execve(config->file, config->argv, config->envp);
-    perror("execve");
-    return PTBOX_SPAWN_FAIL_EXECVE;
+int cptbox_seccomp_notify_recv(int listener, struct cptbox_notification *notification) {
+#if PTBOX_FREEBSD || !defined(SECCOMP_IOCTL_NOTIF_RECV)
+    errno = ENOSYS;
+    return -1;
+#else
+    struct seccomp_notif_sizes sizes;
+    struct pollfd pfd = {listener, POLLIN, 0};
+
+    // The kernel may fill in more than this header knows about.
+    if (syscall(__NR_seccomp, SECCOMP_GET_NOTIF_SIZES, 0, &sizes))
+        return -1;
+    size_t size = sizes.seccomp_notif > sizeof(struct seccomp_notif) ? sizes.seccomp_notif
+                                                                       : sizeof(struct seccomp_notif);
+    struct seccomp_notif *req = (struct seccomp_notif *) alloca(size);
+
+    while (true) {
+        if (poll(&pfd, 1, -1) < 0) {
+            if (errno == EINTR)
+                continue;
+            return -1;
+        }
+        // Every thread using the filter is gone.
+        if (pfd.revents & POLLHUP)
+            return 1;
+
+        memset(req, 0, size);
+        if (ioctl(listener, SECCOMP_IOCTL_NOTIF_RECV, req)) {
+            // The thread was killed, or was interrupted, before the notification was received.
+            if (errno == EINTR || errno == ENOENT)
+                continue;
+            return -1;
+        }
+        break;
+    }
 
-#if !PTBOX_FREEBSD
-seccomp_init_fail:
-    seccomp_release(ctx);
+    notification->id = req->id;
+    notification->pid = req->pid;
+    notification->syscall = req->data.nr;
+    notification->arch = req->data.arch;
+    for (int i = 0; i < 6; i++)
+        notification->args[i] = req->data.args[i];
+    return 0;
+#endif
+}
+
+int cptbox_seccomp_notify_valid(int listener, unsigned long long id) {
+#if PTBOX_FREEBSD || !defined(SECCOMP_IOCTL_NOTIF_ID_VALID)
+    return 0;
+#else
+    __u64 notification_id = id;
+    return ioctl(listener, SECCOMP_IOCTL_NOTIF_ID_VALID, &notification_id) == 0;
+#endif
+}
 
-seccomp_load_fail:
-    return PTBOX_SPAWN_FAIL_SECCOMP;
+int cptbox_seccomp_notify_send(int listener, unsigned long long id, int error) {
+#if PTBOX_FREEBSD || !defined(SECCOMP_USER_NOTIF_FLAG_CONTINUE)
+    errno = ENOSYS;
+    return -1;
+#else
+    struct seccomp_notif_resp resp;
+
+    memset(&resp, 0, sizeof resp);
+    resp.id = id;
+    if (error)
+        resp.error = -error;
+    else
+        // The kernel carries on with the syscall as is. Like under ptrace, other threads could change its
+        // arguments in memory since they were checked; the check is only as good as ptrace's.
+        resp.flags = SECCOMP_USER_NOTIF_FLAG_CONTINUE;
+
+    if (ioctl(listener, SECCOMP_IOCTL_NOTIF_SEND, &resp)) {
+        // The thread was killed, or interrupted, while it was being checked; there is no one to answer.
+        if (errno == ENOENT)
+            return 0;
+        return -1;
+    }
+    return 0;
 #endif
 }
 
@@ -4,11 +4,23 @@
 
 #include <sys/types.h>
 
+#ifdef __linux__
+#include <linux/filter.h>
+#else
+// Only so that the declarations below compile; seccomp is Linux-only.
+struct sock_fprog {
+    unsigned short len;
+    void *filter;
+};
+#endif
+
 #define PTBOX_SPAWN_FAIL_NO_NEW_PRIVS 202
 #define PTBOX_SPAWN_FAIL_SECCOMP      203
 #define PTBOX_SPAWN_FAIL_TRACEME      204
 #define PTBOX_SPAWN_FAIL_EXECVE       205
 #define PTBOX_SPAWN_FAIL_SETAFFINITY  206
+#define PTBOX_SPAWN_FAIL_CGROUP       207
+#define PTBOX_SPAWN_FAIL_LANDLOCK     208
 
 struct child_config {
     unsigned long memory;
@@ -24,14 +36,79 @@ struct child_config {
     int stdin_;
     int stdout_;
     int stderr_;
-    int *seccomp_handlers;
+    // Built by cptbox_seccomp_compile in the parent, and shared by every
+    // child spawned with the same handlers. NULL for no filter.
+    const struct sock_fprog *seccomp_filter;
+    // Notifies the supervisor of some syscalls rather than tracing them; its
+    // listener is sent over `notify_fd`, a socket. NULL for none.
+    const struct sock_fprog *seccomp_notify_filter;
+    int notify_fd;
+    // Without ptrace, the child is only confined by its seccomp filter and
+    // rlimits, and reports failures before execve through `exec_fd`, the
+    // write end of a close-on-exec pipe.
+    int use_ptrace;
+    int exec_fd;
     // 64 cores ought to be enough for anyone.
     unsigned long cpu_affinity_mask;
+    // cgroup.procs of the cgroup the child moves itself into, before anything
+    // else, so that all it and its descendants use is accounted for there; -1
+    // for none.
+    int cgroup_fd;
+    // A Landlock ruleset, built by cptbox_landlock_create in the parent, that
+    // the child restricts itself to right before its seccomp filters; -1 for
+    // none.
+    int landlock_fd;
 };
 
 void cptbox_closefrom(int lowfd);
 int cptbox_child_run(const struct child_config *config);
 
+// Compiles a seccomp filter from MAX_SYSCALL handlers: -1 to trace the
+// syscall (or, without `trace`, to kill the process), 0 to allow it, or an
+// errno to fail it with. Returns NULL and sets errno on failure; the result is
+// freed with cptbox_seccomp_free.
+//
+// With `read_opens`, the register of the open flags of each syscall that
+// opens files, or -1 for the rest, opens of them that only read are allowed
+// anyway, leaving them to Landlock; NULL for none.
+struct sock_fprog *cptbox_seccomp_compile(const int *handlers, int trace, const int *read_opens);
+// Compiles the filter notifying the supervisor of the syscalls whose handler
+// is PTBOX_SECCOMP_NOTIFY, which cptbox_seccomp_compile then allows.
+struct sock_fprog *cptbox_seccomp_compile_notify(const int *handlers, const int *read_opens);
+void cptbox_seccomp_free(struct sock_fprog *prog);
+
+#define PTBOX_SECCOMP_NOTIFY -2
+
+// A syscall the supervisor was notified about, and must answer with
+// cptbox_seccomp_notify_send; `pid` is the thread that made it.
+struct cptbox_notification {
+    unsigned long long id;
+    pid_t pid;
+    int syscall;
+    unsigned int arch;
+    unsigned long long args[6];
+};
+
+// Receives the listener of a child's notify filter from `sock`. Returns -1,
+// with errno set to 0 if the child exited or executed without sending one.
+int cptbox_seccomp_recv_listener(int sock);
+// Waits for the next notification; returns 1 once there will be no more.
+int cptbox_seccomp_notify_recv(int listener, struct cptbox_notification *notification);
+// Whether the notification is still pending, i.e. its thread is alive and
+// still in the syscall; anything read from the thread is only trustworthy if
+// it still is afterwards.
+int cptbox_seccomp_notify_valid(int listener, unsigned long long id);
+// Lets the syscall go ahead if `error` is 0, or fails it with `error`.
+int cptbox_seccomp_notify_send(int listener, unsigned long long id, int error);
+
+// The Landlock ABI version the kernel supports, or 0 if it doesn't.
+int cptbox_landlock_abi(void);
+// Creates a ruleset that only restricts reading files, to which
+// cptbox_landlock_add grants reading `path`, or every file beneath it. Both
+// return -1 and set errno on failure.
+int cptbox_landlock_create(void);
+int cptbox_landlock_add(int ruleset, const char *path);
+
 char *bsd_get_proc_cwd(pid_t pid);
 char *bsd_get_proc_fdno(pid_t pid, int fdno);
 
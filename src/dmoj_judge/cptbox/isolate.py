@@ -1,11 +1,25 @@
 import logging
+import operator
 import os
 import sys
 from enum import Enum
 from typing import Any, Callable, List, Mapping, Sequence
 
-from ._cptbox import AT_FDCWD, Debugger, bsd_get_proc_cwd, bsd_get_proc_fdno
-from .filesystem_policies import FilesystemAccessRule, FilesystemPolicy
+from ._cptbox import (
+    AT_FDCWD,
+    Debugger,
+    FilesystemFastPath,
+    HandlerTable,
+    LandlockRuleset,
+    SeccompFilter,
+    bsd_get_proc_cwd,
+    bsd_get_proc_fdno,
+)
+from .filesystem_policies import (
+    FilesystemAccessRule,
+    FilesystemPolicy,
+    LayeredFilesystemPolicy,
+)
 from .handlers import (
     ACCESS_EACCES,
     ACCESS_EFAULT,
@@ -30,6 +44,14 @@ except AttributeError:
     pass
 
 
+# Getters of the syscall arguments, rather than formatting their names on
+# every check.
+_uargs = [operator.attrgetter("uarg%d" % reg) for reg in range(6)]
+# The decision cached for allowed paths; denials cache their handler and
+# reason.
+_ALLOWED = True
+
+
 class FilesystemSyscallKind(Enum):
     READ = 1
     WRITE = 2
@@ -37,20 +59,142 @@ class FilesystemSyscallKind(Enum):
 
 AccessChecker = Callable[[Debugger], None]
 
-FSJailGetter = Callable[[Debugger], FilesystemPolicy]
+FSJail = FilesystemPolicy | LayeredFilesystemPolicy
+FSJailGetter = Callable[[Debugger], FSJail]
 DirFDGetter = Callable[[Debugger], int]
 
 
+class PathCache(dict):
+    # Memoized path checks, with their hits and misses. Those of a cache
+    # layered on `base` count towards the base's too, so that they add up
+    # over every launch sharing it.
+    max_size = 65536
+
+    def __init__(self, base: "PathCache | None" = None):
+        super().__init__()
+        self.base = base
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: Any, counted: "PathCache | None" = None) -> Any:
+        # Counted towards `counted` instead, when looked up for a cache
+        # layered on this one.
+        value = self.get(key)
+        cache: PathCache | None = self if counted is None else counted
+        while cache is not None:
+            if value is None:
+                cache.misses += 1
+            else:
+                cache.hits += 1
+            cache = cache.base
+        return value
+
+    def store(self, key: Any, value: Any) -> None:
+        if len(self) >= self.max_size:
+            self.clear()
+        self[key] = value
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.hits + self.misses:
+            return 0
+        return self.hits / (self.hits + self.misses)
+
+
+class DerivedHandlers:
+    # What launches compile from a profile's handlers alone, and cache on
+    # it. Layered profiles only replace the callbacks checking paths with
+    # others, so they share this with their base until their own handlers
+    # are changed, and it is compiled once for all of them.
+    def __init__(self) -> None:
+        self.seccomp_filter: SeccompFilter | None = None
+        # The main and notify filters of a launch with a seccomp supervisor.
+        self.seccomp_notify_filters: (
+            tuple[SeccompFilter, SeccompFilter] | None
+        ) = None
+        self.handler_table: HandlerTable | None = None
+        # Whether seccomp alone can enforce the profile, without ptrace;
+        # with `notify_static`, once its filesystem checks are left to a
+        # seccomp supervisor.
+        self.static: bool | None = None
+        self.notify_static: bool | None = None
+
+
+def _derived(name: str) -> property:
+    def get(self: "IsolateTracer") -> Any:
+        return getattr(self.derived, name)
+
+    def set(self: "IsolateTracer", value: Any) -> None:
+        setattr(self.derived, name, value)
+
+    return property(get, set)
+
+
 class IsolateTracer(dict):
+    # With `base`, the tracer starts as a copy of it, with `read_fs` and
+    # `write_fs` layered on top of its filesystem policies. Building the
+    # handlers and compiling the policies is costly; a base shared by many
+    # launches only pays for it once.
+
+    # Prefixes of system paths which don't change while the judge runs.
+    immutable_prefixes: tuple[str, ...] = (
+        "/usr/",
+        "/lib/",
+        "/lib32/",
+        "/lib64/",
+        "/bin/",
+        "/sbin/",
+    )
+
+    seccomp_filter = _derived("seccomp_filter")
+    seccomp_notify_filters = _derived("seccomp_notify_filters")
+    handler_table = _derived("handler_table")
+    static = _derived("static")
+    notify_static = _derived("notify_static")
+
     def __init__(
         self,
         *,
         read_fs: List[FilesystemAccessRule],
         write_fs: List[FilesystemAccessRule],
+        base: "IsolateTracer | None" = None,
     ):
         super().__init__()
-        self.read_fs_jail = self._compile_fs_jail(read_fs)
-        self.write_fs_jail = self._compile_fs_jail(write_fs)
+        self.base = base
+        # Compiled from this profile's handlers by the first launch using it.
+        self.derived = DerivedHandlers()
+        # Checks this profile's own policies, so is never taken from `base`,
+        # but only adds the layer's on top of the base's while they share
+        # their handlers.
+        self.fs_fast_path: FilesystemFastPath | None = None
+        # Whether Landlock can enforce the read policy, the rules it was
+        # checked with, and the ruleset built from them, once known. A layer
+        # only checks its own rules, and uses its base's ruleset if it adds
+        # none.
+        self.landlock: bool | None = None
+        self.landlock_rules: list[tuple[str, bool]] | None = None
+        self.landlock_ruleset: LandlockRuleset | None = None
+        # Resolutions of paths don't depend on the policies, and are shared
+        # with `base`; decisions do, and only those its policies alone make
+        # are kept on the base's.
+        self.path_resolutions: PathCache = (
+            PathCache() if base is None else base.path_resolutions
+        )
+        self.path_decisions = PathCache(
+            None if base is None else base.path_decisions
+        )
+        self.read_fs_jail: FSJail
+        self.write_fs_jail: FSJail
+        if base is None:
+            self.read_fs_jail = self._compile_fs_jail(read_fs)
+            self.write_fs_jail = self._compile_fs_jail(write_fs)
+        else:
+            self.read_fs_jail = LayeredFilesystemPolicy(
+                base.read_fs_jail, read_fs
+            )
+            self.write_fs_jail = LayeredFilesystemPolicy(
+                base.write_fs_jail, write_fs
+            )
 
         if sys.platform.startswith("freebsd"):
             self._getcwd_pid = lambda pid: utf8text(bsd_get_proc_cwd(pid))
@@ -63,42 +207,32 @@ class IsolateTracer(dict):
                 "/proc/%d/fd/%d" % (pid, fd)
             )
 
+        if base is not None:
+            # Handlers that don't check paths don't depend on the policies,
+            # and are shared as they are. Those that do are bound to the
+            # base's policies, and are rebuilt unless they were replaced.
+            dict.update(self, base)
+            self._fs_handlers = {}
+            for syscall, handler in self._filesystem_handlers().items():
+                if dict.get(base, syscall) is base._fs_handlers.get(syscall):
+                    self[syscall] = handler
+                    self._fs_handlers[syscall] = dict.__getitem__(self, syscall)
+            self._process_handlers = base._process_handlers
+            # Only callbacks were replaced, which the filter traces and the
+            # table dispatches to either way.
+            self.derived = base.derived
+            return
+
+        fs_handlers = self._filesystem_handlers()
+        self.update(fs_handlers)
+        # The wrapped handlers, so that copies can tell them apart from ones
+        # set later.
+        self._fs_handlers = {
+            syscall: dict.__getitem__(self, syscall) for syscall in fs_handlers
+        }
+
         self.update(
             {
-                # Deny with report
-                sys_openat: self.handle_openat(
-                    dir_reg=0, file_reg=1, flag_reg=2
-                ),
-                sys_open: self.handle_open(file_reg=0, flag_reg=1),
-                sys_faccessat: self.handle_file_access_at(
-                    FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
-                ),
-                sys_faccessat2: self.handle_file_access_at(
-                    FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
-                ),
-                sys_access: self.handle_file_access(
-                    FilesystemSyscallKind.READ, file_reg=0
-                ),
-                sys_readlink: self.handle_file_access(
-                    FilesystemSyscallKind.READ, file_reg=0
-                ),
-                sys_readlinkat: self.handle_file_access_at(
-                    FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
-                ),
-                sys_stat: self.handle_file_access(
-                    FilesystemSyscallKind.READ, file_reg=0
-                ),
-                sys_stat64: self.handle_file_access(
-                    FilesystemSyscallKind.READ, file_reg=0
-                ),
-                sys_lstat: self.handle_file_access(
-                    FilesystemSyscallKind.READ, file_reg=0
-                ),
-                sys_lstat64: self.handle_file_access(
-                    FilesystemSyscallKind.READ, file_reg=0
-                ),
-                sys_fstatat: self.handle_fstat(dir_reg=0, file_reg=1),
-                sys_statx: self.handle_fstat(dir_reg=0, file_reg=1),
                 sys_tkill: self.handle_kill,
                 sys_tgkill: self.handle_kill,
                 sys_kill: self.handle_kill,
@@ -167,7 +301,6 @@ class IsolateTracer(dict):
                 sys_getgid: ALLOW,
                 sys_setfsgid: ACCESS_EPERM,
                 sys_setfsuid: ACCESS_EPERM,
-                sys_getdents: ALLOW,
                 sys_lseek: ALLOW,
                 sys_getrusage: ALLOW,
                 sys_sigaltstack: ALLOW,
@@ -199,10 +332,21 @@ class IsolateTracer(dict):
                 sys_fcntl64: ALLOW,
                 sys_time: ALLOW,
                 sys_prlimit64: self.handle_prlimit,
-                sys_getdents64: ALLOW,
                 sys_rseq: ALLOW,
             }
         )
+        # Their targets are only known once the process runs, so they can't
+        # be compared in the filter, but the supervisor can check them.
+        self._process_handlers = {
+            syscall: dict.__getitem__(self, syscall)
+            for syscall in (
+                sys_kill,
+                sys_tkill,
+                sys_tgkill,
+                sys_prctl,
+                sys_prlimit64,
+            )
+        }
 
         # FreeBSD-specific syscalls
         if "freebsd" in sys.platform:
@@ -220,8 +364,6 @@ class IsolateTracer(dict):
                     sys_setcontext: ALLOW,
                     sys_pread: ALLOW,
                     sys_fsync: ALLOW,
-                    sys_shm_open: self.handle_open(file_reg=0, flag_reg=1),
-                    sys_shm_open2: self.handle_open(file_reg=0, flag_reg=1),
                     sys_cpuset_getaffinity: ALLOW,
                     sys_thr_new: ALLOW,
                     sys_thr_exit: ALLOW,
@@ -231,6 +373,8 @@ class IsolateTracer(dict):
                     sys_clock_getcpuclockid2: ALLOW,
                     sys_fstatfs: ALLOW,
                     sys_getdirentries: ALLOW,  # TODO: maybe check path?
+                    sys_getdents: ALLOW,
+                    sys_getdents64: ALLOW,
                     sys_getdtablesize: ALLOW,
                     sys_kqueue: ALLOW,
                     sys_kevent: ALLOW,
@@ -241,11 +385,117 @@ class IsolateTracer(dict):
                     sys_minherit: ALLOW,
                     sys_thr_set_name: ALLOW,
                     sys_sigfastblock: ALLOW,
+                }
+            )
+
+    @property
+    def notify_syscalls(self) -> frozenset[int]:
+        # The syscalls whose checks a seccomp supervisor can run instead of
+        # ptrace: those still handled by this profile's own checks of paths,
+        # or of the processes they act on.
+        return frozenset(
+            syscall
+            for handlers in (self._fs_handlers, self._process_handlers)
+            for syscall, handler in handlers.items()
+            if dict.get(self, syscall) is handler
+        )
+
+    @property
+    def listing_syscalls(self) -> frozenset[int]:
+        # The syscalls listing directories whose checks are still this
+        # profile's own. Their directories were checked when opened, unless
+        # Landlock is left to check opens, which can't tell which to allow.
+        return frozenset(
+            syscall
+            for syscall in (sys_getdents, sys_getdents64)
+            if syscall in self._fs_handlers
+            and dict.get(self, syscall) is self._fs_handlers[syscall]
+        )
+
+    @property
+    def fs_registers(self) -> dict[int, tuple[int, int, int]]:
+        # The syscalls whose path checks can be decided natively, and the
+        # registers of their directory file descriptor, or -1 for the working
+        # directory, of their path, and of their open flags, or -1 for a read.
+        # Only the ones still handled by this profile's own checks.
+        if "freebsd" in sys.platform:
+            return {}
+        notify_syscalls = self.notify_syscalls
+        return {
+            syscall: registers
+            for syscall, registers in {
+                sys_openat: (0, 1, 2),
+                sys_open: (-1, 0, 1),
+                sys_faccessat: (0, 1, -1),
+                sys_faccessat2: (0, 1, -1),
+                sys_access: (-1, 0, -1),
+                sys_readlink: (-1, 0, -1),
+                sys_readlinkat: (0, 1, -1),
+                sys_stat: (-1, 0, -1),
+                sys_stat64: (-1, 0, -1),
+                sys_lstat: (-1, 0, -1),
+                sys_lstat64: (-1, 0, -1),
+                sys_fstatat: (0, 1, -1),
+                sys_statx: (0, 1, -1),
+            }.items()
+            if syscall in notify_syscalls
+        }
+
+    def _filesystem_handlers(self) -> dict[int, Any]:
+        # Handlers that check paths against `read_fs_jail` and
+        # `write_fs_jail`.
+        handlers = {
+            # Deny with report
+            sys_openat: self.handle_openat(dir_reg=0, file_reg=1, flag_reg=2),
+            sys_open: self.handle_open(file_reg=0, flag_reg=1),
+            sys_faccessat: self.handle_file_access_at(
+                FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
+            ),
+            sys_faccessat2: self.handle_file_access_at(
+                FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
+            ),
+            sys_access: self.handle_file_access(
+                FilesystemSyscallKind.READ, file_reg=0
+            ),
+            sys_readlink: self.handle_file_access(
+                FilesystemSyscallKind.READ, file_reg=0
+            ),
+            sys_readlinkat: self.handle_file_access_at(
+                FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
+            ),
+            sys_stat: self.handle_file_access(
+                FilesystemSyscallKind.READ, file_reg=0
+            ),
+            sys_stat64: self.handle_file_access(
+                FilesystemSyscallKind.READ, file_reg=0
+            ),
+            sys_lstat: self.handle_file_access(
+                FilesystemSyscallKind.READ, file_reg=0
+            ),
+            sys_lstat64: self.handle_file_access(
+                FilesystemSyscallKind.READ, file_reg=0
+            ),
+            sys_fstatat: self.handle_fstat(dir_reg=0, file_reg=1),
+            sys_statx: self.handle_fstat(dir_reg=0, file_reg=1),
+        }
+        if "freebsd" in sys.platform:
+            handlers.update(
+                {
+                    sys_shm_open: self.handle_open(file_reg=0, flag_reg=1),
+                    sys_shm_open2: self.handle_open(file_reg=0, flag_reg=1),
                     sys_realpathat: self.handle_file_access_at(
                         FilesystemSyscallKind.READ, dir_reg=0, file_reg=1
                     ),
                 }
             )
+        else:
+            handlers.update(
+                {
+                    sys_getdents: self.handle_listing(fd_reg=0),
+                    sys_getdents64: self.handle_listing(fd_reg=0),
+                }
+            )
+        return handlers
 
     def _compile_fs_jail(
         self, fs: Sequence[FilesystemAccessRule]
@@ -253,17 +503,16 @@ class IsolateTracer(dict):
         return FilesystemPolicy(fs)
 
     def _dirfd_getter_from_reg(self, reg: int) -> DirFDGetter:
-        def getter(debugger: Debugger) -> int:
-            return getattr(debugger, "uarg%d" % reg)
-
-        return getter
+        return _uargs[reg]
 
     def _dirfd_getter_cwd(self, debugger: Debugger) -> int:
         return AT_FDCWD
 
     def _fs_jail_getter_from_open_flags_reg(self, reg: int) -> FSJailGetter:
-        def getter(debugger: Debugger) -> FilesystemPolicy:
-            open_flags = getattr(debugger, "uarg%d" % reg)
+        get_flags = _uargs[reg]
+
+        def getter(debugger: Debugger) -> FSJail:
+            open_flags = get_flags(debugger)
             for flag in open_write_flags:
                 # Strict equality is necessary here, since e.g. O_TMPFILE has multiple bits set,
                 # and O_DIRECTORY & O_TMPFILE > 0.
@@ -277,7 +526,7 @@ class IsolateTracer(dict):
     def _fs_jail_getter_from_kind(
         self, kind: FilesystemSyscallKind
     ) -> FSJailGetter:
-        def getter(debugger: Debugger) -> FilesystemPolicy:
+        def getter(debugger: Debugger) -> FSJail:
             return {
                 FilesystemSyscallKind.READ: self.read_fs_jail,
                 FilesystemSyscallKind.WRITE: self.write_fs_jail,
@@ -339,7 +588,7 @@ class IsolateTracer(dict):
                 # We already allowed this one way or another, don't check again.
                 return
 
-            dirfd = getattr(debugger, "uarg%d" % dir_reg)
+            dirfd = _uargs[dir_reg](debugger)
             full_path = self.get_full_path_unnormalized(
                 debugger, rel_file, dirfd=dirfd
             )
@@ -347,6 +596,13 @@ class IsolateTracer(dict):
 
         return check
 
+    def handle_listing(self, *, fd_reg: int) -> AccessChecker:
+        def check(debugger: Debugger) -> None:
+            path = self.get_dir(debugger, dirfd=_uargs[fd_reg](debugger))
+            self._access_check(debugger, path, self.read_fs_jail)
+
+        return check
+
     def access_check(
         self,
         fs_jail_getter: FSJailGetter,
@@ -366,7 +622,7 @@ class IsolateTracer(dict):
         return check
 
     def get_rel_file(self, debugger: Debugger, *, reg: int) -> str:
-        ptr = getattr(debugger, "uarg%d" % reg)
+        ptr = _uargs[reg](debugger)
         try:
             file = debugger.readstr(ptr)
         except MaxLengthExceeded as e:
@@ -405,8 +661,65 @@ class IsolateTracer(dict):
         return self._getfd_pid(debugger.tid, dirfd)
 
     def _access_check(
-        self, debugger: Debugger, file: str, fs_jail: FilesystemPolicy
+        self, debugger: Debugger, file: str, fs_jail: FSJail
     ) -> None:
+        # Paths under `immutable_prefixes` resolve the same way every time,
+        # so their resolution is shared with every profile layered on the same
+        # base, and decisions on them are memoized. Anything that resolves
+        # elsewhere, or that this profile can write, is never cached.
+        if not file.startswith(self.immutable_prefixes):
+            return self._check_resolved(
+                debugger, file, fs_jail, *self._resolve(debugger, file)
+            )
+
+        resolved = self.path_resolutions.lookup(file)
+        fresh = resolved is None
+        if fresh:
+            resolved = self._resolve(debugger, file)
+        normalized, _, real, _ = resolved
+        # Checked every time, as the resolution may have been cached by a
+        # profile that can't write where this one can.
+        if (
+            not normalized.startswith(self.immutable_prefixes)
+            or not real.startswith(self.immutable_prefixes)
+            or self.write_fs_jail.check(normalized)
+            or self.write_fs_jail.check(real)
+        ):
+            if not fresh:
+                resolved = self._resolve(debugger, file)
+            return self._check_resolved(debugger, file, fs_jail, *resolved)
+        if fresh:
+            self.path_resolutions.store(file, resolved)
+
+        # Unless a layer's own rules cover the path, the decision is its
+        # base's, and is kept there for every profile layered on it.
+        decisions = self.path_decisions
+        while (
+            isinstance(fs_jail, LayeredFilesystemPolicy)
+            and decisions.base is not None
+            and not fs_jail.layer.check(normalized)
+            and not fs_jail.layer.check(real)
+        ):
+            fs_jail = fs_jail.base
+            decisions = decisions.base
+
+        key = (file, fs_jail)
+        decision = decisions.lookup(key, self.path_decisions)
+        if decision is not None:
+            if decision is not _ALLOWED:
+                raise DeniedSyscall(*decision)
+            return
+
+        try:
+            self._check_resolved(debugger, file, fs_jail, *resolved)
+        except DeniedSyscall as denial:
+            decisions.store(key, (denial.handler, denial.reason))
+            raise
+        decisions.store(key, _ALLOWED)
+
+    def _resolve(
+        self, debugger: Debugger, file: str
+    ) -> tuple[str, str, str, bool | None]:
         # We want to ensure that if there are symlinks, the user must be able to access both the symlink and
         # its destination. However, we are doing path-based checks, which means we have to check these as
         # as normalized paths. normpath can normalize a path, but also changes the meaning of paths in presence of
@@ -439,6 +752,21 @@ class IsolateTracer(dict):
                 or os.path.samefile(projected, real)
             )
         except OSError:
+            # Either can't be stat'd.
+            same = None
+        return normalized, projected, real, same
+
+    def _check_resolved(
+        self,
+        debugger: Debugger,
+        file: str,
+        fs_jail: FSJail,
+        normalized: str,
+        projected: str,
+        real: str,
+        same: bool | None,
+    ) -> None:
+        if same is None:
             raise DeniedSyscall(
                 ACCESS_ENOENT,
                 f"Cannot stat, file: {file}, projected: {projected}, real: {real}",
@@ -515,6 +843,10 @@ class IsolateTracer(dict):
             self[syscall] = handler
 
     def __setitem__(self, syscall: int, handler) -> None:
+        # Any change to the handlers invalidates what was derived from them,
+        # which is then no longer shared with the base either.
+        self.derived = DerivedHandlers()
+        self.fs_fast_path = None
         if handler == ALLOW or isinstance(handler, ErrnoHandlerCallback):
             super().__setitem__(syscall, handler)
         else:
@@ -533,7 +865,7 @@ def wrap_access_check(syscall: int, check: AccessChecker) -> HandlerCallback:
     return inner
 
 
-def protection_fault(self, debugger: Debugger) -> bool:
+def protection_fault(debugger: Debugger) -> bool:
     return False
 
 
@@ -11,6 +11,9 @@
 #include <sys/types.h>
 
 #include <map>
+#include <mutex>
+#include <set>
+#include <vector>
 
 #if defined(__FreeBSD__) || defined(__FreeBSD_kernel__)
 #define PTBOX_FREEBSD 1
@@ -98,35 +101,128 @@ typedef int (*pt_event_callback)(void *context, int event, unsigned long param);
 class pt_process {
   public:
     pt_process(pt_debugger *debugger);
+    ~pt_process();
     void set_callback(pt_handler_callback, void *context);
     void set_event_proc(pt_event_callback, void *context);
-    int set_handler(int abi, int syscall, int handler);
+    // `handlers` holds MAX_SYSCALL handlers for each ABI, and is not copied: it is shared by every process
+    // launched with the same security profile, and must outlive this one.
+    void set_handlers(const int *handlers) { this->handlers = handlers; }
     bool trace_syscalls() { return _trace_syscalls; }
     void trace_syscalls(bool value) { _trace_syscalls = value; }
+    // Without ptrace, the process is only confined by seccomp and rlimits, and is waited for rather than traced.
+    bool use_ptrace() { return _use_ptrace; }
+    void use_ptrace(bool value) { _use_ptrace = value; }
+    // The read end of the child's close-on-exec pipe, which is closed by monitor(); only used without ptrace.
+    void set_exec_fd(int fd) { exec_fd = fd; }
     int spawn(pt_fork_handler child, void *context);
+    // Limits on the execution and wall clock times, in seconds, or 0 for none: the process is killed as soon as it
+    // runs out of either. Set before monitor(); returns -1 with errno set if they can't be enforced.
+    int set_time_limits(double execution, double wall);
+    bool timed_out() { return _timed_out; }
+    // Signals the process itself, never one that reused its pid, where the kernel allows it.
+    int send_signal(int signal);
     int monitor();
     int getpid() { return pid; }
-    double execution_time() { return exec_time.tv_sec + exec_time.tv_nsec / 1000000000.0; }
+    double execution_time();
     double wall_clock_time();
+    // Time from fork to the end of the first execve, i.e. the child's setup.
+    double spawn_latency();
     const rusage *getrusage() { return &_rusage; }
     bool was_initialized() { return _initialized; }
 
   protected:
     int dispatch(int event, unsigned long param);
+    int handler(int abi, int syscall) {
+        return handlers && abi != PTBOX_ABI_INVALID ? handlers[abi * MAX_SYSCALL + syscall] : PTBOX_HANDLER_DENY;
+    }
     int protection_fault(int syscall, int type = PTBOX_EVENT_PROTECTION);
+    int monitor_untraced();
+    // monitor(), one event at a time: handle_event() returns whether the process is gone, and finish_monitor() its
+    // exit code. Events come from wait4 on the thread that spawned the process, which is the only one tracing it.
+    void start_monitor();
+    bool handle_event(pid_t pid, int status);
+    bool handle_stop(pid_t pid, int status);
+    int finish_monitor(int status);
+    // After monitor(), reaps what is left of the process group, which is then already killed.
+    void reap_tracees();
+    void start_deadline();
+    void update_deadline(struct timespec *now);
+    void stop_deadline();
+    static void enforce_deadlines(int epoll_fd);
 
   private:
     pid_t pid;
-    int handler[PTBOX_ABI_COUNT][MAX_SYSCALL];
+    const int *handlers;
     pt_handler_callback callback;
     void *context;
     struct timespec exec_time, start_time, end_time;
+    struct timespec fork_time, initial_exec_time;
     struct rusage _rusage;
     pt_debugger *debugger;
     pt_event_callback event_proc;
     void *event_context;
     bool _trace_syscalls;
+    bool _use_ptrace;
+    int exec_fd;
     bool _initialized;
+    int pidfd;
+    int timer_fd;
+    uint64_t deadline_id;
+    struct timespec time_limit, wall_time_limit;
+    bool _timed_out;
+    // State of monitor(), kept across events.
+    bool first, spawned;
+    int exit_reason;
+    pid_t pgid;
+    std::set<pid_t> children;
+    struct timespec resumed, last_event;
+
+    friend class pt_reactor;
+};
+
+typedef void (*pt_reactor_callback)(void *context);
+typedef void (*pt_exit_callback)(void *context, int code);
+
+// Monitors many traced processes from one thread, the one that calls run(). Only that thread can trace them, so they
+// must be spawned from it, by callbacks posted to it.
+class pt_reactor {
+  public:
+    pt_reactor();
+    ~pt_reactor();
+    // Runs posted callbacks and monitors processes until stop() and all of them are gone; returns -1 with errno set
+    // if it can't.
+    int run();
+    // Calls `callback` on the reactor thread as soon as it can; safe from any thread. Fails once stopped.
+    int post(pt_reactor_callback callback, void *context);
+    void stop();
+    // From the reactor thread: monitors a traced process it just spawned, and calls `callback` with its exit code
+    // once it's gone.
+    void add(pt_process *process, pt_exit_callback callback, void *context);
+
+  private:
+    struct monitored {
+        pt_process *process;
+        pt_exit_callback callback;
+        void *context;
+    };
+
+    int start_doorbell();
+    void stop_doorbell();
+    void ring();
+    void run_posted();
+    void handle(pid_t pid, int status, const struct rusage *usage);
+
+    // By the pid of their first process, which is also their process group.
+    std::map<pid_t, monitored> processes;
+    // The thread and processes of each, as they are seen.
+    std::map<pid_t, pid_t> tasks;
+    std::mutex lock;
+    std::vector<std::pair<pt_reactor_callback, void *>> posted;
+    bool stopping;
+    // A child that stops itself whenever a byte is written to it, which is the only way to wake up wait4.
+    pid_t doorbell;
+    int doorbell_fd;
+    pid_t owner;
 };
 
 class pt_debugger {
@@ -2,6 +2,7 @@
 #define _BSD_SOURCE
 
 #include <errno.h>
+#include <fcntl.h>
 #include <signal.h>
 #include <stdio.h>
 #include <stdlib.h>
@@ -13,20 +14,69 @@
 #include <time.h>
 #include <unistd.h>
 
+#include <mutex>
 #include <set>
+#include <system_error>
+#include <thread>
 
 #include "ptbox.h"
 
+#if !PTBOX_FREEBSD
+#include <sys/epoll.h>
+#include <sys/syscall.h>
+#include <sys/timerfd.h>
+
+// The deadlines of every process are enforced by one thread, waiting on a timerfd for each. Processes are looked up
+// by an id that is never reused, under the lock, since they may have stopped waiting on theirs by then.
+static std::mutex deadline_lock;
+static std::map<uint64_t, pt_process *> deadline_processes;
+static uint64_t deadline_next_id = 1;
+static std::once_flag deadline_thread_started;
+static int deadline_epoll_fd = -1, deadline_errno = 0;
+#endif
+
+static void timespec_from_seconds(double seconds, struct timespec *result) {
+    result->tv_sec = (time_t) seconds;
+    result->tv_nsec = (long) ((seconds - result->tv_sec) * 1000000000.0);
+}
+
+static bool timespec_is_zero(const struct timespec *a) {
+    return !a->tv_sec && !a->tv_nsec;
+}
+
+static bool timespec_less(const struct timespec *a, const struct timespec *b) {
+    return a->tv_sec < b->tv_sec || (a->tv_sec == b->tv_sec && a->tv_nsec < b->tv_nsec);
+}
+
 pt_process::pt_process(pt_debugger *debugger)
-    : pid(0), callback(NULL), context(NULL), debugger(debugger), event_proc(NULL), event_context(NULL),
-      _trace_syscalls(true), _initialized(false) {
+    : pid(0), handlers(NULL), callback(NULL), context(NULL), debugger(debugger), event_proc(NULL), event_context(NULL),
+      _trace_syscalls(true), _use_ptrace(true), exec_fd(-1), _initialized(false), pidfd(-1), timer_fd(-1),
+      deadline_id(0), _timed_out(false), first(true), spawned(false), exit_reason(PTBOX_EXIT_NORMAL), pgid(0) {
     memset(&exec_time, 0, sizeof exec_time);
     memset(&start_time, 0, sizeof exec_time);
     memset(&end_time, 0, sizeof exec_time);
-    memset(handler, 0, sizeof handler);
+    memset(&fork_time, 0, sizeof fork_time);
+    memset(&initial_exec_time, 0, sizeof initial_exec_time);
+    memset(&time_limit, 0, sizeof time_limit);
+    memset(&wall_time_limit, 0, sizeof wall_time_limit);
+    memset(&resumed, 0, sizeof resumed);
+    memset(&last_event, 0, sizeof last_event);
     debugger->set_process(this);
 }
 
+pt_process::~pt_process() {
+    stop_deadline();
+    if (pidfd >= 0)
+        close(pidfd);
+}
+
+double pt_process::execution_time() {
+    // Without ptrace, the process is never stopped, so all of its wall time counts.
+    if (!_use_ptrace)
+        return wall_clock_time();
+    return exec_time.tv_sec + exec_time.tv_nsec / 1000000000.0;
+}
+
 double pt_process::wall_clock_time() {
     struct timespec now, delta;
 
@@ -41,6 +91,16 @@ double pt_process::wall_clock_time() {
     return delta.tv_sec + delta.tv_nsec / 1000000000.0;
 }
 
+double pt_process::spawn_latency() {
+    struct timespec delta;
+
+    if (!initial_exec_time.tv_sec && !initial_exec_time.tv_nsec)
+        return 0;
+
+    timespec_sub(&initial_exec_time, &fork_time, &delta);
+    return delta.tv_sec + delta.tv_nsec / 1000000000.0;
+}
+
 void pt_process::set_callback(pt_handler_callback callback, void *context) {
     this->callback = callback;
     this->context = context;
@@ -51,13 +111,6 @@ void pt_process::set_event_proc(pt_event_callback callback, void *context) {
     this->event_context = context;
 }
 
-int pt_process::set_handler(int abi, int syscall, int handler) {
-    if (syscall >= MAX_SYSCALL || syscall < 0)
-        return 1;
-    this->handler[abi][syscall] = handler;
-    return 0;
-}
-
 int pt_process::dispatch(int event, unsigned long param) {
     if (event_proc != NULL)
         return event_proc(event_context, event, param);
@@ -65,6 +118,7 @@ int pt_process::dispatch(int event, unsigned long param) {
 }
 
 int pt_process::spawn(pt_fork_handler child, void *context) {
+    clock_gettime(CLOCK_MONOTONIC, &fork_time);
     pid_t pid = fork();
     if (pid == -1)
         return 1;
@@ -73,10 +127,141 @@ int pt_process::spawn(pt_fork_handler child, void *context) {
         _exit(child(context));
     }
     this->pid = pid;
+#if !PTBOX_FREEBSD && defined(__NR_pidfd_open)
+    // Fails before Linux 5.3, where signals go to the pid instead.
+    pidfd = syscall(__NR_pidfd_open, pid, 0);
+#endif
     debugger->new_process();
     return 0;
 }
 
+int pt_process::send_signal(int signal) {
+#if !PTBOX_FREEBSD && defined(__NR_pidfd_send_signal)
+    if (pidfd >= 0)
+        return syscall(__NR_pidfd_send_signal, pidfd, signal, NULL, 0);
+#endif
+    return ::kill(pid, signal);
+}
+
+int pt_process::set_time_limits(double execution, double wall) {
+#if PTBOX_FREEBSD
+    errno = ENOSYS;
+    return -1;
+#else
+    struct epoll_event event;
+
+    std::call_once(deadline_thread_started, [] {
+        int epoll_fd = epoll_create1(EPOLL_CLOEXEC);
+        if (epoll_fd < 0) {
+            deadline_errno = errno;
+            return;
+        }
+        try {
+            std::thread(enforce_deadlines, epoll_fd).detach();
+        } catch (const std::system_error &e) {
+            deadline_errno = e.code().value();
+            close(epoll_fd);
+            return;
+        }
+        deadline_epoll_fd = epoll_fd;
+    });
+    if (deadline_epoll_fd < 0) {
+        errno = deadline_errno;
+        return -1;
+    }
+
+    timespec_from_seconds(execution, &time_limit);
+    timespec_from_seconds(wall, &wall_time_limit);
+    if (timer_fd >= 0)
+        return 0;
+    if ((timer_fd = timerfd_create(CLOCK_MONOTONIC, TFD_CLOEXEC | TFD_NONBLOCK)) < 0)
+        return -1;
+
+    // Registered now, so that failing to is reported, but only armed once the process starts.
+    std::lock_guard<std::mutex> guard(deadline_lock);
+    memset(&event, 0, sizeof event);
+    event.events = EPOLLIN;
+    event.data.u64 = deadline_next_id;
+    if (epoll_ctl(deadline_epoll_fd, EPOLL_CTL_ADD, timer_fd, &event)) {
+        close(timer_fd);
+        timer_fd = -1;
+        return -1;
+    }
+    deadline_id = deadline_next_id++;
+    deadline_processes[deadline_id] = this;
+    return 0;
+#endif
+}
+
+void pt_process::update_deadline(struct timespec *now) {
+#if !PTBOX_FREEBSD
+    struct itimerspec deadline;
+    struct timespec limit, wall_deadline;
+
+    if (timer_fd < 0)
+        return;
+
+    memset(&deadline, 0, sizeof deadline);
+    if (!timespec_is_zero(&time_limit)) {
+        // Execution time is only used up while the process isn't stopped, so it has at most what is left of it, from
+        // now, before it runs out.
+        timespec_add(now, &time_limit, &limit);
+        timespec_sub(&limit, &exec_time, &deadline.it_value);
+    }
+    if (!timespec_is_zero(&wall_time_limit)) {
+        timespec_add(&start_time, &wall_time_limit, &wall_deadline);
+        if (timespec_is_zero(&deadline.it_value) || timespec_less(&wall_deadline, &deadline.it_value))
+            deadline.it_value = wall_deadline;
+    }
+    // A deadline already past expires right away.
+    timerfd_settime(timer_fd, TFD_TIMER_ABSTIME, &deadline, NULL);
+#endif
+}
+
+void pt_process::stop_deadline() {
+#if !PTBOX_FREEBSD
+    if (timer_fd < 0)
+        return;
+
+    std::lock_guard<std::mutex> guard(deadline_lock);
+    deadline_processes.erase(deadline_id);
+    epoll_ctl(deadline_epoll_fd, EPOLL_CTL_DEL, timer_fd, NULL);
+    close(timer_fd);
+    timer_fd = -1;
+#endif
+}
+
+void pt_process::enforce_deadlines(int epoll_fd) {
+#if !PTBOX_FREEBSD
+    struct epoll_event events[64];
+    uint64_t expirations;
+
+    while (true) {
+        int count = epoll_wait(epoll_fd, events, 64, -1);
+        if (count < 0) {
+            if (errno == EINTR)
+                continue;
+            perror("epoll_wait");
+            return;
+        }
+
+        std::lock_guard<std::mutex> guard(deadline_lock);
+        for (int i = 0; i < count; ++i) {
+            auto it = deadline_processes.find(events[i].data.u64);
+            if (it == deadline_processes.end())
+                continue;
+            pt_process *process = it->second;
+            // Nothing is read if the deadline was moved since it expired.
+            if (read(process->timer_fd, &expirations, sizeof expirations) != sizeof expirations)
+                continue;
+            // The rest of the process group is killed by monitor(), once the process is gone.
+            process->_timed_out = true;
+            process->send_signal(SIGKILL);
+        }
+    }
+#endif
+}
+
 int pt_process::protection_fault(int syscall, int type) {
     dispatch(type, syscall);
     dispatch(PTBOX_EVENT_EXITING, PTBOX_EXIT_PROTECTION);
@@ -94,251 +279,346 @@ int pt_process::protection_fault(int syscall, int type) {
     return PTBOX_EXIT_PROTECTION;
 }
 
+int pt_process::monitor_untraced() {
+    siginfo_t info;
+    ssize_t bytes;
+    int code, status, exit_reason = PTBOX_EXIT_NORMAL;
+
+    // execve closes the pipe, while a child that fails to get there writes why to it first.
+    do {
+        bytes = read(exec_fd, &code, sizeof code);
+    } while (bytes < 0 && errno == EINTR);
+    close(exec_fd);
+    exec_fd = -1;
+
+    clock_gettime(CLOCK_MONOTONIC, &start_time);
+    update_deadline(&start_time);
+    dispatch(PTBOX_EVENT_ATTACH, 0);
+    if (bytes == 0) {
+        initial_exec_time = start_time;
+        _initialized = true;
+        dispatch(PTBOX_EVENT_INITIAL_EXEC, 0);
+    }
+
+    // Not reaped yet, so that its process group can't be reused before the rest of it is killed.
+    memset(&info, 0, sizeof info);
+    while (waitid(P_PID, pid, &info, WEXITED | WNOWAIT) && errno == EINTR)
+        ;
+    clock_gettime(CLOCK_MONOTONIC, &end_time);
+
+    if (_initialized && (info.si_code == CLD_KILLED || info.si_code == CLD_DUMPED)) {
+        // A syscall the filter doesn't allow kills the process with SIGSYS; which one it was isn't known.
+        if (info.si_status == SIGSYS)
+            exit_reason = PTBOX_EXIT_PROTECTION;
+        dispatch(PTBOX_EVENT_SIGNAL, info.si_status);
+        dispatch(PTBOX_EVENT_EXITING, exit_reason);
+    }
+
+    // Children are not permitted to outlive parent, by any meaningful measure.
+    killpg(pid, SIGKILL);
+    while (wait4(pid, &status, 0, &_rusage) < 0 && errno == EINTR)
+        ;
+    stop_deadline();
+
+    dispatch(PTBOX_EVENT_EXITED, exit_reason);
+    return WIFEXITED(status) ? WEXITSTATUS(status) : -WTERMSIG(status);
+}
+
 int pt_process::monitor() {
-    bool in_syscall = false, first = true, spawned = false;
-    struct timespec start, end, delta;
-    int status, exit_reason = PTBOX_EXIT_NORMAL, err;
+    int status;
+    pid_t pid;
+
+    if (!_use_ptrace)
+        return monitor_untraced();
+
+    start_monitor();
+    do {
+        pid = wait4(-pgid, &status, __WALL, &_rusage);
+    } while (!handle_event(pid, status));
+    int code = finish_monitor(status);
+    reap_tracees();
+    return code;
+}
+
+void pt_process::reap_tracees() {
+    int status;
+    pid_t pid;
+
+    // Killed tracees linger until this thread, their tracer, reaps them, holding on to their seccomp filter, and
+    // with it the supervisor. One still stopped is one whose fork wasn't reported, or one stopped on its way out, and
+    // must be resumed to die.
+    while ((pid = wait4(-pgid, &status, __WALL, NULL)) > 0 || (pid < 0 && errno == EINTR)) {
+        if (pid > 0 && WIFSTOPPED(status)) {
+            kill(pid, SIGKILL);
+#if PTBOX_FREEBSD
+            ptrace(PT_KILL, pid, (caddr_t) 1, 0);
+#else
+            ptrace(PTRACE_CONT, pid, NULL, NULL);
+#endif
+        }
+    }
+}
+
+void pt_process::start_monitor() {
+    first = true;
+    spawned = false;
+    exit_reason = PTBOX_EXIT_NORMAL;
     // Set pgid to -this->pid such that -pgid becomes pid, resulting
     // in the initial wait be on the main thread. This allows it a chance
     // of creating a new process group.
-    pid_t pid, pgid = -this->pid;
-    std::set<pid_t> children;
+    pgid = -this->pid;
+    children.clear();
+    clock_gettime(CLOCK_MONOTONIC, &resumed);
+}
 
-#if PTBOX_FREEBSD
-    struct ptrace_lwpinfo lwpi;
-#endif
+bool pt_process::handle_event(pid_t pid, int status) {
+    struct timespec delta;
 
-    while (true) {
-        clock_gettime(CLOCK_MONOTONIC, &start);
+    // The process is only charged for the time it wasn't stopped for us.
+    clock_gettime(CLOCK_MONOTONIC, &last_event);
+    timespec_sub(&last_event, &resumed, &delta);
+    timespec_add(&exec_time, &delta, &exec_time);
 
-        pid = wait4(-pgid, &status, __WALL, &_rusage);
+    if (handle_stop(pid, status))
+        return true;
 
-        clock_gettime(CLOCK_MONOTONIC, &end);
-        timespec_sub(&end, &start, &delta);
-        timespec_add(&exec_time, &delta, &exec_time);
-        int signal = 0;
-        bool trap_next_syscall_event = _trace_syscalls && PTBOX_FREEBSD;
+    clock_gettime(CLOCK_MONOTONIC, &resumed);
+    update_deadline(&resumed);
+    return false;
+}
 
-        // printf("pid: %d (%d)\n", pid, this->pid);
+bool pt_process::handle_stop(pid_t pid, int status) {
+    bool in_syscall = false;
+    int signal = 0, err;
+    bool trap_next_syscall_event = _trace_syscalls && PTBOX_FREEBSD;
 
-        if (WIFEXITED(status) || WIFSIGNALED(status)) {
-            if (first || pid == pgid)
-                break;
-            else {
-                children.erase(pid);
-                // printf("Thread/Process exit: %d\n", pid);
-                continue;
-            }
+#if PTBOX_FREEBSD
+    struct ptrace_lwpinfo lwpi;
+#endif
+
+    // printf("pid: %d (%d)\n", pid, this->pid);
+
+    if (WIFEXITED(status) || WIFSIGNALED(status)) {
+        if (first || pid == pgid)
+            return true;
+        else {
+            children.erase(pid);
+            // printf("Thread/Process exit: %d\n", pid);
+            return false;
         }
+    }
 
 #if PTBOX_FREEBSD
-        ptrace(PT_LWPINFO, pid, (caddr_t) &lwpi, sizeof lwpi);
+    ptrace(PT_LWPINFO, pid, (caddr_t) &lwpi, sizeof lwpi);
 
-        // if (lwpi.pl_flags & PL_FLAG_FORKED)
-        //    printf("Created process: %d\n", lwpi.pl_child_pid);
+    // if (lwpi.pl_flags & PL_FLAG_FORKED)
+    //    printf("Created process: %d\n", lwpi.pl_child_pid);
 
-        if (lwpi.pl_flags & PL_FLAG_CHILD) {
-            ptrace(PT_FOLLOW_FORK, pid, 0, 1);
-            children.insert(pid);
-            // printf("Started process: %d\n", pid);
-        }
+    if (lwpi.pl_flags & PL_FLAG_CHILD) {
+        ptrace(PT_FOLLOW_FORK, pid, 0, 1);
+        children.insert(pid);
+        // printf("Started process: %d\n", pid);
+    }
 #endif
 
-        if (first) {
-            start_time = start;
-            dispatch(PTBOX_EVENT_ATTACH, 0);
+    if (first) {
+        start_time = resumed;
+        dispatch(PTBOX_EVENT_ATTACH, 0);
 
 #if PTBOX_FREEBSD
-            // PTRACE_O_TRACESYSGOOD can be replaced by struct ptrace_lwpinfo.pl_flags.
-            // No FreeBSD equivalent that I know of
-            // * TRACECLONE makes no sense since FreeBSD has no clone(2)
-            // * TRACEEXIT... I'm not sure about
-            ptrace(PT_FOLLOW_FORK, pid, 0, 1);
+        // PTRACE_O_TRACESYSGOOD can be replaced by struct ptrace_lwpinfo.pl_flags.
+        // No FreeBSD equivalent that I know of
+        // * TRACECLONE makes no sense since FreeBSD has no clone(2)
+        // * TRACEEXIT... I'm not sure about
+        ptrace(PT_FOLLOW_FORK, pid, 0, 1);
 #else
-            // This is right after SIGSTOP is received:
-            ptrace(PTRACE_SETOPTIONS, pid, NULL,
-                   PTRACE_O_TRACEEXIT | PTRACE_O_TRACESECCOMP | PTRACE_O_TRACESYSGOOD | PTRACE_O_EXITKILL |
-                       PTRACE_O_TRACECLONE | PTRACE_O_TRACEFORK | PTRACE_O_TRACEVFORK);
+        // This is right after SIGSTOP is received:
+        ptrace(PTRACE_SETOPTIONS, pid, NULL,
+               PTRACE_O_TRACEEXIT | PTRACE_O_TRACESECCOMP | PTRACE_O_TRACESYSGOOD | PTRACE_O_EXITKILL |
+                   PTRACE_O_TRACECLONE | PTRACE_O_TRACEFORK | PTRACE_O_TRACEVFORK);
 #endif
-            // We now set the process group to the actual pgid.
-            pgid = pid;
-        }
+        // We now set the process group to the actual pgid.
+        pgid = pid;
+    }
 
-        if (!WIFSTOPPED(status)) {
-            goto resume_process;
-        }
+    if (!WIFSTOPPED(status)) {
+        goto resume_process;
+    }
 
-        // printf("%d: WSTOPSIG(status): %d\n", pid, WSTOPSIG(status));
+    // printf("%d: WSTOPSIG(status): %d\n", pid, WSTOPSIG(status));
 #if PTBOX_FREEBSD
-        if (WSTOPSIG(status) == SIGTRAP && lwpi.pl_flags & (PL_FLAG_SCE | PL_FLAG_SCX)) {
-            debugger->setpid(pid);
-            debugger->update_syscall(&lwpi);
+    if (WSTOPSIG(status) == SIGTRAP && lwpi.pl_flags & (PL_FLAG_SCE | PL_FLAG_SCX)) {
+        debugger->setpid(pid);
+        debugger->update_syscall(&lwpi);
 #else
-        if ((status >> 8) == (SIGTRAP | PTRACE_EVENT_SECCOMP << 8) || WSTOPSIG(status) == (0x80 | SIGTRAP)) {
-            debugger->settid(pid);
+    if ((status >> 8) == (SIGTRAP | PTRACE_EVENT_SECCOMP << 8) || WSTOPSIG(status) == (0x80 | SIGTRAP)) {
+        debugger->settid(pid);
 #endif
-            if ((err = debugger->pre_syscall()) != 0) {
+        if ((err = debugger->pre_syscall()) != 0) {
 #if !PTBOX_FREEBSD
-                // When debugging a multithreaded application, the following sequence of events can happen:
-                // 1. Thread #1 does sys_exit_group
-                // 2. Thread #2 does any syscall
-                // 3. Thread #1 traps, and we handle sys_exit_group
-                // 4. sys_exit_group is allowed, all threads are killed
-                // 5. Thread #2 traps, and we attempt to read registers
-                // 6. Since thread has been killed, this results in ESRCH
-                // So we ignore ESRCH. Note that PTRACE_EVENT_EXIT triggers for the thread AFTER this ESRCH,
-                // so we can't know in advance if this will happen.
-                if (err == ESRCH) {
-                    fprintf(stderr, "thread disappeared: %d, ignoring.\n", pid);
-                    continue;
-                }
-#endif
-                dispatch(PTBOX_EVENT_PTRACE_ERROR, err);
-                exit_reason = protection_fault(-1);
-                continue;
+            // When debugging a multithreaded application, the following sequence of events can happen:
+            // 1. Thread #1 does sys_exit_group
+            // 2. Thread #2 does any syscall
+            // 3. Thread #1 traps, and we handle sys_exit_group
+            // 4. sys_exit_group is allowed, all threads are killed
+            // 5. Thread #2 traps, and we attempt to read registers
+            // 6. Since thread has been killed, this results in ESRCH
+            // So we ignore ESRCH. Note that PTRACE_EVENT_EXIT triggers for the thread AFTER this ESRCH,
+            // so we can't know in advance if this will happen.
+            if (err == ESRCH) {
+                fprintf(stderr, "thread disappeared: %d, ignoring.\n", pid);
+                return false;
             }
+#endif
+            dispatch(PTBOX_EVENT_PTRACE_ERROR, err);
+            exit_reason = protection_fault(-1);
+            return false;
+        }
 #if defined(__FreeBSD_version) && __FreeBSD_version >= 1002501
-            int syscall = lwpi.pl_syscall_code;
+        int syscall = lwpi.pl_syscall_code;
 #else
-            int syscall = debugger->syscall();
+        int syscall = debugger->syscall();
 #endif
 #if PTBOX_FREEBSD
-            in_syscall = lwpi.pl_flags & PL_FLAG_SCE;
-            debugger->_bsd_in_syscall = in_syscall;
+        in_syscall = lwpi.pl_flags & PL_FLAG_SCE;
+        debugger->_bsd_in_syscall = in_syscall;
 #else
-            in_syscall = (status >> 8) == (SIGTRAP | PTRACE_EVENT_SECCOMP << 8);
+        in_syscall = (status >> 8) == (SIGTRAP | PTRACE_EVENT_SECCOMP << 8);
 #endif
 
-            // printf("%d: %s syscall %d\n", pid, in_syscall ? "Enter" : "Exit", syscall);
-            if (!spawned) {
-                if (debugger->is_end_of_first_execve()) {
-                    spawned = this->_initialized = true;
-                    dispatch(PTBOX_EVENT_INITIAL_EXEC, 0);
-                    goto resume_process;
-                } else {
-                    // Allow any syscalls before the first execve. This allows us to do things
-                    // like provide debug messages when ptrace or seccomp initialization fails,
-                    // without being hampered by the sandbox.
-                    goto resume_process;
-                }
+        // printf("%d: %s syscall %d\n", pid, in_syscall ? "Enter" : "Exit", syscall);
+        if (!spawned) {
+            if (debugger->is_end_of_first_execve()) {
+                initial_exec_time = last_event;
+                spawned = this->_initialized = true;
+                dispatch(PTBOX_EVENT_INITIAL_EXEC, 0);
+                goto resume_process;
+            } else {
+                // Allow any syscalls before the first execve. This allows us to do things
+                // like provide debug messages when ptrace or seccomp initialization fails,
+                // without being hampered by the sandbox.
+                goto resume_process;
             }
+        }
 
-            if (in_syscall) {
-                if (syscall >= 0 && syscall < MAX_SYSCALL) {
-                    switch (handler[debugger->abi()][syscall]) {
-                        case PTBOX_HANDLER_ALLOW:
+        if (in_syscall) {
+            if (syscall >= 0 && syscall < MAX_SYSCALL) {
+                switch (handler(debugger->abi(), syscall)) {
+                    case PTBOX_HANDLER_ALLOW:
+                        break;
+                    case PTBOX_HANDLER_CALLBACK:
+                        if (callback(context, syscall))
                             break;
-                        case PTBOX_HANDLER_CALLBACK:
-                            if (callback(context, syscall))
-                                break;
-                            // printf("Killed by callback: %d\n", syscall);
-                            exit_reason = protection_fault(syscall);
-                            continue;
-                        default:
-                            // Default is to kill, safety first.
-                            // printf("Killed by DISALLOW or None: %d\n", syscall);
-                            exit_reason = protection_fault(syscall);
-                            continue;
-                    }
-                    // We pass any system call that we can't record in our fixed-size array to python.
-                    // Python will decide your fate.
-                } else if (!callback(context, syscall)) {
-                    // printf("Killed by callback: %d\n", syscall);
-                    exit_reason = protection_fault(syscall);
-                    continue;
+                        // printf("Killed by callback: %d\n", syscall);
+                        exit_reason = protection_fault(syscall);
+                        return false;
+                    default:
+                        // Default is to kill, safety first.
+                        // printf("Killed by DISALLOW or None: %d\n", syscall);
+                        exit_reason = protection_fault(syscall);
+                        return false;
                 }
+                // We pass any system call that we can't record in our fixed-size array to python.
+                // Python will decide your fate.
+            } else if (!callback(context, syscall)) {
+                // printf("Killed by callback: %d\n", syscall);
+                exit_reason = protection_fault(syscall);
+                return false;
             }
+        }
 
-            if (debugger->on_return_.count(pid)) {
-                if (in_syscall) {
-                    // When using seccomp, we'll need to specifically enable tracing after entering
-                    // to get the corresponding syscall-exit-stop, which we will use to run on_return.
-                    trap_next_syscall_event = true;
-                } else {
-                    // Fire the on_return handler if we are in a syscall-exit-stop.
-                    std::pair<pt_syscall_return_callback, void *> callback = debugger->on_return_[pid];
-                    callback.first(callback.second, pid, syscall);
-                    debugger->on_return_.erase(pid);
-                }
+        if (debugger->on_return_.count(pid)) {
+            if (in_syscall) {
+                // When using seccomp, we'll need to specifically enable tracing after entering
+                // to get the corresponding syscall-exit-stop, which we will use to run on_return.
+                trap_next_syscall_event = true;
+            } else {
+                // Fire the on_return handler if we are in a syscall-exit-stop.
+                std::pair<pt_syscall_return_callback, void *> callback = debugger->on_return_[pid];
+                callback.first(callback.second, pid, syscall);
+                debugger->on_return_.erase(pid);
             }
+        }
 
-            if ((err = debugger->post_syscall()) != 0) {
+        if ((err = debugger->post_syscall()) != 0) {
 #if !PTBOX_FREEBSD
-                // Again, it is possible for the process to be killed between pre_syscall and post_syscall.
-                // We ignore ESRCH in such a case.
-                if (err == ESRCH) {
-                    fprintf(stderr, "thread disappeared: %d, ignoring.\n", pid);
-                    continue;
-                }
-#endif
-                dispatch(PTBOX_EVENT_PTRACE_ERROR, err);
-                exit_reason = protection_fault(syscall, PTBOX_EVENT_UPDATE_FAIL);
-                continue;
+            // Again, it is possible for the process to be killed between pre_syscall and post_syscall.
+            // We ignore ESRCH in such a case.
+            if (err == ESRCH) {
+                fprintf(stderr, "thread disappeared: %d, ignoring.\n", pid);
+                return false;
             }
-        } else {
+#endif
+            dispatch(PTBOX_EVENT_PTRACE_ERROR, err);
+            exit_reason = protection_fault(syscall, PTBOX_EVENT_UPDATE_FAIL);
+            return false;
+        }
+    } else {
 #if PTBOX_FREEBSD
-            // No events aside from signal event on FreeBSD
-            // (TODO: maybe check for PL_SIGNAL instead of both PL_SIGNAL and PL_NONE?)
-            signal = WSTOPSIG(status);
-
-            // Swallow SIGSTOP. This is because no one should send it, nor should it
-            // be self-send, hence perfect for implementing shocker.
-            if (signal == SIGSTOP)
-                signal = 0;
+        // No events aside from signal event on FreeBSD
+        // (TODO: maybe check for PL_SIGNAL instead of both PL_SIGNAL and PL_NONE?)
+        signal = WSTOPSIG(status);
+
+        // Swallow SIGSTOP. This is because no one should send it, nor should it
+        // be self-send, hence perfect for implementing shocker.
+        if (signal == SIGSTOP)
+            signal = 0;
 #else
-            // We can only find whether a syscall-stop is enter or exit by toggling. However, blind toggling
-            // when we receive a syscall-stop does not work. To quote strace:
-            // > The rule is that syscall-enter-stop is always followed by syscall-exit-stop,
-            // > PTRACE_EVENT stop or tracee's death - no other kinds of ptrace-stop can occur in between.
-            // Therefore, we reset the enter/exit toggle if we get something that is not a syscall-stop.
-            debugger->tid_reset(pid);
-
-            switch (WSTOPSIG(status)) {
-                case SIGTRAP:
-                    switch (status >> 16) {
-                        case PTRACE_EVENT_EXIT:
-                            if (exit_reason != PTBOX_EXIT_NORMAL) {
-                                dispatch(PTBOX_EVENT_EXITING, PTBOX_EXIT_NORMAL);
-                            }
-                            break;
-                        case PTRACE_EVENT_CLONE: {
-                            unsigned long tid;
-                            ptrace(PTRACE_GETEVENTMSG, pid, NULL, &tid);
-                            // printf("Created thread: %d\n", tid);
-                            break;
-                        }
-                        case PTRACE_EVENT_FORK:
-                        case PTRACE_EVENT_VFORK: {
-                            unsigned long npid;
-                            ptrace(PTRACE_GETEVENTMSG, pid, NULL, &npid);
-                            children.insert(npid);
-                            // printf("Created process: %d\n", npid);
-                            break;
+        // We can only find whether a syscall-stop is enter or exit by toggling. However, blind toggling
+        // when we receive a syscall-stop does not work. To quote strace:
+        // > The rule is that syscall-enter-stop is always followed by syscall-exit-stop,
+        // > PTRACE_EVENT stop or tracee's death - no other kinds of ptrace-stop can occur in between.
+        // Therefore, we reset the enter/exit toggle if we get something that is not a syscall-stop.
+        debugger->tid_reset(pid);
+
+        switch (WSTOPSIG(status)) {
+            case SIGTRAP:
+                switch (status >> 16) {
+                    case PTRACE_EVENT_EXIT:
+                        if (exit_reason != PTBOX_EXIT_NORMAL) {
+                            dispatch(PTBOX_EVENT_EXITING, PTBOX_EXIT_NORMAL);
                         }
+                        break;
+                    case PTRACE_EVENT_CLONE: {
+                        unsigned long tid;
+                        ptrace(PTRACE_GETEVENTMSG, pid, NULL, &tid);
+                        // printf("Created thread: %d\n", tid);
+                        break;
                     }
-                    break;
-                default:
-                    signal = WSTOPSIG(status);
-            }
+                    case PTRACE_EVENT_FORK:
+                    case PTRACE_EVENT_VFORK: {
+                        unsigned long npid;
+                        ptrace(PTRACE_GETEVENTMSG, pid, NULL, &npid);
+                        children.insert(npid);
+                        // printf("Created process: %d\n", npid);
+                        break;
+                    }
+                }
+                break;
+            default:
+                signal = WSTOPSIG(status);
+        }
 #endif
 
-            // Only main process signals are meaningful.
-            if (!first && pid == pgid)  // *** Don't set _signal to SIGSTOP if this is the /first/ SIGSTOP
-                dispatch(PTBOX_EVENT_SIGNAL, WSTOPSIG(status));
-        }
-    resume_process:
-        // Pass NULL as signal in case of our first SIGSTOP because the runtime tends to resend it, making all our
-        // work for naught. Like abort(), it catches the signal, prints something (^Z?) and then resends it.
-        // Doing this prevents a second SIGSTOP from being dispatched to our event handler above. ***
+        // Only main process signals are meaningful.
+        if (!first && pid == pgid)  // *** Don't set _signal to SIGSTOP if this is the /first/ SIGSTOP
+            dispatch(PTBOX_EVENT_SIGNAL, WSTOPSIG(status));
+    }
+resume_process:
+    // Pass NULL as signal in case of our first SIGSTOP because the runtime tends to resend it, making all our
+    // work for naught. Like abort(), it catches the signal, prints something (^Z?) and then resends it.
+    // Doing this prevents a second SIGSTOP from being dispatched to our event handler above. ***
 #if PTBOX_FREEBSD
-        ptrace(trap_next_syscall_event ? PT_SYSCALL : PT_CONTINUE, pid, (caddr_t) 1, first ? 0 : signal);
+    ptrace(trap_next_syscall_event ? PT_SYSCALL : PT_CONTINUE, pid, (caddr_t) 1, first ? 0 : signal);
 #else
-        ptrace(trap_next_syscall_event ? PTRACE_SYSCALL : PTRACE_CONT, pid, NULL,
-               first ? NULL : (void *) (intptr_t) signal);
+    ptrace(trap_next_syscall_event ? PTRACE_SYSCALL : PTRACE_CONT, pid, NULL,
+           first ? NULL : (void *) (intptr_t) signal);
 #endif
-        first = false;
-    }
+    first = false;
+    return false;
+}
 
+int pt_process::finish_monitor(int status) {
     // Children are not permitted to outlive parent, by any meaningful measure.
     for (std::set<pid_t>::const_iterator it = children.begin(); it != children.end(); ++it) {
         kill(*it, SIGKILL);
@@ -346,8 +626,11 @@ int pt_process::monitor() {
         ptrace(PT_KILL, *it, (caddr_t) 1, 0);
 #endif
     }
+    // Along with any whose fork wasn't reported yet; none of them can leave the process group.
+    killpg(pgid, SIGKILL);
 
-    end_time = end;
+    stop_deadline();
+    end_time = last_event;
     dispatch(PTBOX_EVENT_EXITED, exit_reason);
     return WIFEXITED(status) ? WEXITSTATUS(status) : -WTERMSIG(status);
 }
@@ -0,0 +1,231 @@
+#define _DEFAULT_SOURCE
+#define _BSD_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+#include "ptbox.h"
+
+#if !PTBOX_FREEBSD
+#include <sys/prctl.h>
+#include <sys/syscall.h>
+#endif
+
+pt_reactor::pt_reactor() : stopping(false), doorbell(0), doorbell_fd(-1), owner(0) {}
+
+pt_reactor::~pt_reactor() {
+    // In a fork, the doorbell is someone else's.
+    if (owner == getpid())
+        stop_doorbell();
+    else if (doorbell_fd >= 0)
+        close(doorbell_fd);
+}
+
+int pt_reactor::post(pt_reactor_callback callback, void *context) {
+    std::lock_guard<std::mutex> guard(lock);
+    if (stopping) {
+        errno = ESHUTDOWN;
+        return -1;
+    }
+    posted.emplace_back(callback, context);
+    ring();
+    return 0;
+}
+
+void pt_reactor::stop() {
+    std::lock_guard<std::mutex> guard(lock);
+    stopping = true;
+    ring();
+}
+
+void pt_reactor::ring() {
+    char byte = 0;
+    // Called with the lock held. Before run() starts the doorbell, it checks what was posted anyway, and a full pipe
+    // has already rung it.
+    if (doorbell_fd >= 0) {
+        while (write(doorbell_fd, &byte, 1) < 0 && errno == EINTR)
+            ;
+    }
+}
+
+void pt_reactor::run_posted() {
+    std::vector<std::pair<pt_reactor_callback, void *>> callbacks;
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        callbacks.swap(posted);
+    }
+    for (auto &callback : callbacks)
+        callback.first(callback.second);
+}
+
+int pt_reactor::start_doorbell() {
+#if PTBOX_FREEBSD
+    errno = ENOSYS;
+    return -1;
+#else
+    int fds[2];
+    char buffer[64];
+
+    // Non-blocking, so that ringing it never waits on the reactor.
+    if (pipe2(fds, O_CLOEXEC))
+        return -1;
+    fcntl(fds[1], F_SETFL, O_NONBLOCK);
+
+    doorbell = fork();
+    if (doorbell < 0) {
+        close(fds[0]);
+        close(fds[1]);
+        return -1;
+    }
+    if (doorbell == 0) {
+        // Gone with the reactor thread, and holding on to nothing else the judge has open.
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        if (dup2(fds[0], 0) < 0)
+            _exit(1);
+#ifdef __NR_close_range
+        if (syscall(__NR_close_range, 1, ~0U, 0))
+#endif
+        {
+            long max_fd = sysconf(_SC_OPEN_MAX);
+            for (int fd = 1; fd < (max_fd < 0 ? 16384 : max_fd); ++fd)
+                close(fd);
+        }
+        while (read(0, buffer, sizeof buffer) > 0)
+            kill(getpid(), SIGSTOP);
+        _exit(0);
+    }
+
+    close(fds[0]);
+    owner = getpid();
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        doorbell_fd = fds[1];
+    }
+    return 0;
+#endif
+}
+
+void pt_reactor::stop_doorbell() {
+    int status;
+
+    {
+        std::lock_guard<std::mutex> guard(lock);
+        if (doorbell_fd >= 0)
+            close(doorbell_fd);
+        doorbell_fd = -1;
+    }
+    if (doorbell > 0) {
+        kill(doorbell, SIGKILL);
+        while (waitpid(doorbell, &status, __WALL) < 0 && errno == EINTR)
+            ;
+    }
+    doorbell = 0;
+}
+
+void pt_reactor::add(pt_process *process, pt_exit_callback callback, void *context) {
+    processes[process->getpid()] = {process, callback, context};
+    tasks[process->getpid()] = process->getpid();
+    process->start_monitor();
+}
+
+int pt_reactor::run() {
+#if PTBOX_FREEBSD
+    errno = ENOSYS;
+    return -1;
+#else
+    struct rusage usage;
+    int status;
+    pid_t pid;
+
+    if (start_doorbell())
+        return -1;
+
+    run_posted();
+    while (true) {
+        {
+            std::lock_guard<std::mutex> guard(lock);
+            if (stopping && posted.empty() && processes.empty())
+                break;
+        }
+
+        // Only children and tracees of this thread, not of the rest of the judge. The doorbell is one, so this
+        // never runs out of them.
+        pid = wait4(-1, &status, __WALL | __WNOTHREAD | WUNTRACED, &usage);
+        if (pid < 0) {
+            if (errno == EINTR)
+                continue;
+            stop_doorbell();
+            return -1;
+        }
+
+        if (pid == doorbell) {
+            if (WIFSTOPPED(status))
+                kill(doorbell, SIGCONT);
+            else {
+                // Already reaped; something killed it.
+                doorbell = 0;
+                stop_doorbell();
+                if (start_doorbell())
+                    return -1;
+            }
+            run_posted();
+            continue;
+        }
+        handle(pid, status, &usage);
+    }
+
+    stop_doorbell();
+    return 0;
+#endif
+}
+
+void pt_reactor::handle(pid_t pid, int status, const struct rusage *usage) {
+    pid_t owner;
+    auto task = tasks.find(pid);
+
+    if (task != tasks.end())
+        owner = task->second;
+    else {
+        // A thread or process started by a monitored one, whose first stop came before the event announcing it.
+        owner = getpgid(pid);
+        if (owner < 0 || !processes.count(owner)) {
+            // Left behind by a process that is already gone, and killed with it. Until it's resumed, it stays stopped,
+            // holding on to everything it has open, and is never reaped.
+            if (WIFSTOPPED(status)) {
+                kill(pid, SIGKILL);
+#if PTBOX_FREEBSD
+                ptrace(PT_KILL, pid, (caddr_t) 1, 0);
+#else
+                ptrace(PTRACE_CONT, pid, NULL, NULL);
+#endif
+            }
+            return;
+        }
+        tasks[pid] = owner;
+    }
+
+    if (WIFEXITED(status) || WIFSIGNALED(status))
+        tasks.erase(pid);
+
+    monitored entry = processes[owner];
+    entry.process->_rusage = *usage;
+    if (!entry.process->handle_event(pid, status))
+        return;
+
+    // Kills the rest of its process group, which is reaped here as it goes, like anything else left behind.
+    int code = entry.process->finish_monitor(status);
+    for (auto it = tasks.begin(); it != tasks.end();) {
+        if (it->second == owner) {
+            kill(it->first, SIGKILL);
+            it = tasks.erase(it);
+        } else
+            ++it;
+    }
+    processes.erase(owner);
+    entry.callback(entry.context, code);
+}
@@ -9,6 +9,7 @@ import threading
 from typing import Callable, List, Mapping, Optional, Tuple, Type
 
 from ._cptbox import *
+from .cgroups import Cgroup
 from .handlers import (
     ALLOW,
     DISALLOW,
@@ -33,6 +34,11 @@ STDOUT = subprocess.STDOUT
 log = logging.getLogger("")
 
 _PIPE_BUF = getattr(select, "PIPE_BUF", 512)
+# Compiled seccomp filters, by handler table. Most launches share a handful of
+# security profiles, and compiling a filter is far costlier than looking it up.
+_seccomp_filters: "dict[Tuple[bool, bool, Tuple[int, ...], Optional[Tuple[int, ...]]], SeccompFilter]"
+_seccomp_filters = {}
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
 _SYSCALL_INDICIES: List[Optional[int]] = [None] * PTBOX_ABI_COUNT
 
 _SYSCALL_INDICIES[PTBOX_ABI_X86] = 0
@@ -42,10 +48,30 @@ _SYSCALL_INDICIES[PTBOX_ABI_ARM] = 3
 _SYSCALL_INDICIES[PTBOX_ABI_FREEBSD_X64] = 4
 _SYSCALL_INDICIES[PTBOX_ABI_ARM64] = 5
 
+# The syscall of each syscall number of each supported ABI, to find the
+# handler of a traced syscall in the security profile.
+_SYSCALL_IDS: List[List[Optional[int]]] = [
+    [None] * MAX_SYSCALL_NUMBER for _ in range(PTBOX_ABI_COUNT)
+]
+# And the other way around, the ABI and number of each syscall.
+_SYSCALL_CALLS: List[List[Tuple[int, int]]] = [[] for _ in range(SYSCALL_COUNT)]
+for _abi in SUPPORTED_ABIS:
+    for _id in range(SYSCALL_COUNT):
+        for _call in translator[_id][_SYSCALL_INDICIES[_abi]]:
+            if _call is not None:
+                _SYSCALL_IDS[_abi][_call] = _id
+                _SYSCALL_CALLS[_id].append((_abi, _call))
+
 FREEBSD = sys.platform.startswith("freebsd")
-BAD_SECCOMP = sys.platform == "linux" and tuple(
+_KERNEL_VERSION = tuple(
     map(int, os.uname().release.partition("-")[0].split("."))
-) < (4, 8)
+)
+BAD_SECCOMP = sys.platform == "linux" and _KERNEL_VERSION < (4, 8)
+# SECCOMP_USER_NOTIF_FLAG_CONTINUE, without which the supervisor couldn't let
+# allowed syscalls through, is new in 5.5.
+SECCOMP_NOTIFY_SUPPORTED = sys.platform == "linux" and _KERNEL_VERSION >= (5, 5)
+# Landlock is new in 5.13, but may also be left out of the kernel, or disabled.
+LANDLOCK_SUPPORTED = sys.platform == "linux" and landlock_abi() > 0
 
 _address_bits = {
     PTBOX_ABI_X86: 32,
@@ -102,6 +128,122 @@ class AdvancedDebugger(Debugger):
         return utf8text(read)
 
 
+def _notify_arg(index: int, signed: bool) -> property:
+    def get(self) -> int:
+        value = self._args[index]
+        if signed and value >= 1 << 63:
+            value -= 1 << 64
+        return value
+
+    return property(get)
+
+
+class NotifyDebugger:
+    # Stands in for the debugger in handlers run by the seccomp supervisor,
+    # while the kernel holds the syscall until it is answered. Only native
+    # syscalls are ever notified about.
+    abi = NATIVE_ABI
+
+    syscall_name = AdvancedDebugger.syscall_name
+    address_bits = AdvancedDebugger.address_bits
+    noop_syscall_id = AdvancedDebugger.noop_syscall_id
+    get_syscall_name = AdvancedDebugger.get_syscall_name
+
+    arg0 = _notify_arg(0, True)
+    arg1 = _notify_arg(1, True)
+    arg2 = _notify_arg(2, True)
+    arg3 = _notify_arg(3, True)
+    arg4 = _notify_arg(4, True)
+    arg5 = _notify_arg(5, True)
+    uarg0 = _notify_arg(0, False)
+    uarg1 = _notify_arg(1, False)
+    uarg2 = _notify_arg(2, False)
+    uarg3 = _notify_arg(3, False)
+    uarg4 = _notify_arg(4, False)
+    uarg5 = _notify_arg(5, False)
+
+    def __init__(self, listener: SeccompListener) -> None:
+        self.tid = listener.pid
+        self.syscall = listener.syscall
+        self.errno = 0
+        self._args = listener.args
+        self._pid: Optional[int] = None
+        self._on_return: Optional[Callable[[], None]] = None
+
+    @property
+    def pid(self) -> int:
+        if self._pid is None:
+            with open("/proc/%d/status" % self.tid) as status:
+                for line in status:
+                    if line.startswith("Tgid:"):
+                        self._pid = int(line.split()[1])
+                        break
+                else:
+                    self._pid = self.tid
+        return self._pid
+
+    def on_return(self, callback: Callable[[], None]) -> None:
+        self._on_return = callback
+
+    def readstr(self, address: int, max_size: int = 4096) -> Optional[str]:
+        # Read a page at a time, as the string may end right before a page
+        # that isn't mapped.
+        try:
+            fd = os.open("/proc/%d/mem" % self.tid, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return None
+        data = b""
+        try:
+            while True:
+                offset = address + len(data)
+                try:
+                    chunk = os.pread(
+                        fd, _PAGE_SIZE - offset % _PAGE_SIZE, offset
+                    )
+                except OSError:
+                    return None
+                if not chunk:
+                    return None
+                end = chunk.find(b"\0")
+                data += chunk if end < 0 else chunk[:end]
+                if len(data) > max_size:
+                    raise MaxLengthExceeded(data[: max_size + 1])
+                if end >= 0:
+                    return utf8text(data)
+        finally:
+            os.close(fd)
+
+    def response(self, syscall: int) -> int:
+        # The errno to fail the syscall with, or 0 to let it go through.
+        if self._on_return is not None:
+            self._on_return()
+        if self.errno:
+            return self.errno
+        # The syscall can't be swapped out for another; failing it is the
+        # closest.
+        return errno.EPERM if self.syscall != syscall else 0
+
+
+# The reactor of this process, started on first use. The judge runs each
+# worker in a process of its own, so there is one per worker.
+_reactor: Optional[Reactor] = None
+_reactor_pid = 0
+_reactor_lock = threading.Lock()
+
+
+def get_reactor() -> Reactor:
+    global _reactor, _reactor_pid
+    with _reactor_lock:
+        # Its thread doesn't survive a fork.
+        if _reactor is None or _reactor_pid != os.getpid():
+            _reactor = Reactor()
+            _reactor_pid = os.getpid()
+            threading.Thread(
+                target=_reactor.run, name="cptbox-reactor", daemon=True
+            ).start()
+        return _reactor
+
+
 class TracedPopen(Process):
     _executable: bytes
     _last_ptrace_errno: Optional[int]
@@ -130,6 +272,11 @@ class TracedPopen(Process):
         cwd: bytes = b"",
         wall_time: Optional[float] = None,
         cpu_affinity: Optional[List[int]] = None,
+        ptrace: Optional[bool] = None,
+        notify: bool = False,
+        reactor: bool = False,
+        cgroup: Optional[str] = None,
+        landlock: bool = False,
     ) -> None:
         self._executable = executable
 
@@ -168,39 +315,78 @@ class TracedPopen(Process):
         self.protection_fault = None
 
         self._security = security
-        self._callbacks = [
-            [None] * MAX_SYSCALL_NUMBER for _ in range(PTBOX_ABI_COUNT)
-        ]
-        if security is None:
+        # Without support, the checks fall back to ptrace.
+        self._notify_syscalls: frozenset = (
+            getattr(security, "notify_syscalls", frozenset())
+            if notify and SECCOMP_NOTIFY_SUPPORTED
+            else frozenset()
+        )
+        # Only checked with Landlock, and allowed otherwise.
+        self._listing_syscalls: frozenset = getattr(
+            security, "listing_syscalls", frozenset()
+        )
+        if ptrace is None:
+            ptrace = FREEBSD or not self._is_static()
+        if not ptrace:
+            # Nothing needs to call back into Python, so seccomp and rlimits
+            # enforce the whole policy, and the process is never stopped.
+            if FREEBSD or not self._is_static():
+                raise ValueError(
+                    "security policy can't be enforced without ptrace"
+                )
+            self._use_ptrace = False
+        elif security is None:
             self._trace_syscalls = False
         else:
-            for abi in SUPPORTED_ABIS:
-                index = _SYSCALL_INDICIES[abi]
-                assert index is not None
-                for i in range(SYSCALL_COUNT):
-                    for call in translator[i][index]:
-                        if call is None:
-                            continue
-                        handler = security.get(i, DISALLOW)
-                        if not isinstance(handler, int):
-                            if not callable(handler):
-                                raise ValueError(
-                                    "Handler not callable: " + handler
-                                )
-                            self._callbacks[abi][call] = handler
-                            handler = _CALLBACK
-                        self._handler(abi, call, handler)
+            self._set_handlers(self._get_handler_table())
+            fs_fast_path = self._get_fs_fast_path()
+            if fs_fast_path is not None:
+                self._set_fs_fast_path(fs_fast_path)
+
+        # The register of the open flags of every native syscall number whose
+        # plain reads are left to Landlock, or -1; None without it.
+        self._landlock_opens: Optional[Tuple[int, ...]] = None
+        self._landlock_ruleset: Optional[LandlockRuleset] = None
+        if landlock and LANDLOCK_SUPPORTED and security is not None:
+            self._setup_landlock()
 
         self._died = threading.Event()
         self._spawned_or_errored = threading.Event()
         self._spawn_error = None
 
-        if time:
+        if time and FREEBSD:
             # Spawn thread to kill process after it times out
             self._shocker = threading.Thread(target=self._shocker_thread)
             self._shocker.start()
-        self._worker = threading.Thread(target=self._run_process)
-        self._worker.start()
+        elif time:
+            # Enforced natively, as soon as either runs out.
+            self._set_time_limits(time, self._wall_time)
+        self._supervisor: Optional[threading.Thread] = None
+        # Whether the supervisor let the first execve through.
+        self._executed = False
+        # Usage of the process and everything it started, from its cgroup.
+        self._cgroup: Optional[Cgroup] = None
+        self._cgroup_memory: Optional[int] = None
+        self._cgroup_oom_killed = False
+        self._cgroup_cpu_time: Optional[float] = None
+        if cgroup and not FREEBSD:
+            # With the same headroom over the limit as the address space, so
+            # that going over it is seen, rather than being killed at it.
+            self._cgroup = Cgroup.create(
+                cgroup, self._child_address, nproc, len(cpu_affinity or ())
+            )
+            if self._cgroup is not None:
+                self._cgroup_fd = self._cgroup.procs_fd
+
+        if reactor and self._use_ptrace and not FREEBSD:
+            # Spawned from the reactor's thread, so that it traces the process,
+            # along with every other one of this worker, without a thread of
+            # its own.
+            shared = get_reactor()
+            shared.post(lambda: self._run_on_reactor(shared))
+        else:
+            self._worker = threading.Thread(target=self._run_process)
+            self._worker.start()
 
         self._spawned_or_errored.wait()
         if self._spawn_error:
@@ -209,20 +395,350 @@ class TracedPopen(Process):
     def create_debugger(self) -> AdvancedDebugger:
         return AdvancedDebugger(self)
 
+    def _is_static(self) -> bool:
+        # Whether seccomp alone can enforce the policy: every handler is
+        # static, or left to the supervisor, and the first execve is allowed,
+        # as nothing traps it, unless the supervisor lets it through.
+        if self._security is None:
+            return True
+        attr = "notify_static" if self._notify_syscalls else "static"
+        static = getattr(self._security, attr, None)
+        if static is not None:
+            return static
+
+        static = (
+            self._security.get(sys_execve) == ALLOW
+            or bool(self._notify_syscalls)
+        ) and all(
+            isinstance(handler, (int, ErrnoHandlerCallback))
+            or syscall in self._notify_syscalls
+            or syscall in self._listing_syscalls
+            for syscall, handler in self._security.items()
+        )
+        try:
+            setattr(self._security, attr, static)
+        except AttributeError:
+            pass
+        return static
+
+    def _get_handler_table(self) -> HandlerTable:
+        handler_table = getattr(self._security, "handler_table", None)
+        if handler_table is not None:
+            return handler_table
+
+        handlers = [DISALLOW] * (PTBOX_ABI_COUNT * MAX_SYSCALL_NUMBER)
+        for abi in SUPPORTED_ABIS:
+            for call, i in enumerate(_SYSCALL_IDS[abi]):
+                if i is None:
+                    continue
+                handler = self._security.get(i, DISALLOW)
+                if not isinstance(handler, int):
+                    if not callable(handler):
+                        raise ValueError("Handler not callable: " + handler)
+                    handler = _CALLBACK
+                handlers[abi * MAX_SYSCALL_NUMBER + call] = handler
+
+        handler_table = HandlerTable(handlers)
+        try:
+            # Profiles cache their table, and every process launched with
+            # them shares it.
+            self._security.handler_table = handler_table
+        except AttributeError:
+            pass
+        return handler_table
+
+    def _get_fs_fast_path(self) -> Optional[FilesystemFastPath]:
+        return self._fs_fast_path_of(self._security)
+
+    @classmethod
+    def _fs_fast_path_of(cls, security) -> Optional[FilesystemFastPath]:
+        fs_fast_path = getattr(security, "fs_fast_path", None)
+        if fs_fast_path is not None:
+            return fs_fast_path
+
+        registers = getattr(security, "fs_registers", None)
+        if not registers:
+            return None
+        base = getattr(security, "base", None)
+        if base is not None and base.derived is security.derived:
+            # With the same handlers, the syscalls are the base's, whose fast
+            # path is only built once; only the layer's policies are added.
+            fs_fast_path = FilesystemFastPath(
+                security.read_fs_jail.layer.native_policies,
+                security.write_fs_jail.layer.native_policies,
+                (),
+                cls._fs_fast_path_of(base),
+            )
+        else:
+            fs_fast_path = FilesystemFastPath(
+                security.read_fs_jail.native_policies,
+                security.write_fs_jail.native_policies,
+                [
+                    (abi, call, *registers[i])
+                    for i in registers
+                    for abi, call in _SYSCALL_CALLS[i]
+                ],
+            )
+        try:
+            security.fs_fast_path = fs_fast_path
+        except AttributeError:
+            pass
+        return fs_fast_path
+
+    def _setup_landlock(self) -> None:
+        # Only if the executable can run, which needs it to be readable, and
+        # the listings of directories, which Landlock leaves alone, can still
+        # be checked. Every other path check is still made as before.
+        index = _SYSCALL_INDICIES[NATIVE_ABI]
+        assert index is not None
+        opens = [-1] * MAX_SYSCALL_NUMBER
+        registers = getattr(self._security, "fs_registers", None) or {}
+        for syscall, (_, _, flag_reg) in registers.items():
+            if flag_reg < 0:
+                continue
+            for call in translator[syscall][index]:
+                if call is not None:
+                    opens[call] = flag_reg
+        if all(reg < 0 for reg in opens):
+            return
+        if not self._use_ptrace and not (
+            self._listing_syscalls <= self._notify_syscalls
+        ):
+            return
+
+        executable = os.path.realpath(
+            os.path.join(utf8text(self._chdir), utf8text(self._executable))
+        )
+        if not self._security.read_fs_jail.check(executable):
+            return
+        self._landlock_ruleset = self._load_landlock_ruleset(self._security)
+        if self._landlock_ruleset is not None:
+            self._landlock_opens = tuple(opens)
+
+    @classmethod
+    def _load_landlock_ruleset(cls, security) -> Optional[LandlockRuleset]:
+        # Profiles cache their ruleset, and every process launched with them
+        # shares it. Landlock can only ever narrow what a process may read,
+        # so a layer's can't be stacked on its base's, but is built from the
+        # rules its base already checked and its own, unless it adds none.
+        landlock = getattr(security, "landlock", None)
+        if landlock is not None:
+            return security.landlock_ruleset if landlock else None
+
+        ruleset = None
+        base = getattr(security, "base", None)
+        rules = cls._get_landlock_rules(security)
+        if rules is not None:
+            if base is not None and rules is cls._get_landlock_rules(base):
+                ruleset = cls._load_landlock_ruleset(base)
+            else:
+                try:
+                    ruleset = LandlockRuleset([path for path, _ in rules])
+                except OSError:
+                    log.warning(
+                        "Failed to build Landlock ruleset", exc_info=True
+                    )
+        try:
+            security.landlock = ruleset is not None
+            security.landlock_ruleset = ruleset
+        except AttributeError:
+            pass
+        return ruleset
+
+    @classmethod
+    def _get_landlock_rules(cls, security) -> Optional[List[Tuple[str, bool]]]:
+        # Checked once per profile, or None if Landlock can't enforce them.
+        rules = getattr(security, "landlock_rules", None)
+        if rules is not None or getattr(security, "landlock", None) is False:
+            return rules
+
+        read = security.read_fs_jail
+        write = security.write_fs_jail
+        base = getattr(security, "base", None)
+        if base is None:
+            rules = read.landlock_rules
+            writes = write.landlock_rules
+        else:
+            rules = cls._get_landlock_rules(base)
+            writes = write.layer.landlock_rules
+            if rules is not None and read.layer.landlock_rules is None:
+                rules = None
+            elif rules is not None:
+                # Files the base already grants need no rules of their own.
+                own = [
+                    (path, recursive)
+                    for path, recursive in read.layer.landlock_rules
+                    if not cls._landlock_grants(
+                        base.read_fs_jail, path, recursive
+                    )
+                ]
+                if own:
+                    rules = own + rules
+        # Opens for writing are still only checked against the write policy,
+        # but Landlock also checks that those which read can be read.
+        if rules is not None and (
+            writes is None
+            or not all(
+                cls._landlock_grants(read, path, recursive)
+                for path, recursive in writes
+            )
+            or cls._has_unchecked_links(read, rules)
+        ):
+            rules = None
+        try:
+            security.landlock_rules = rules
+            if rules is None:
+                security.landlock = False
+        except AttributeError:
+            pass
+        return rules
+
+    @staticmethod
+    def _landlock_grants(policy, path: str, recursive: bool) -> bool:
+        return policy.check_recursive(path) if recursive else policy.check(path)
+
+    @staticmethod
+    def _has_unchecked_links(policy, rules: List[Tuple[str, bool]]) -> bool:
+        # Landlock only sees where a path leads, while the tracer also checks
+        # the path of a symlink, as with /bin into /usr/bin. Any the policy
+        # denies beside the granted paths, in the directories above them,
+        # must lead nowhere Landlock grants.
+        parents = set()
+        for path, _ in rules:
+            while path != "/":
+                path = os.path.dirname(path)
+                parents.add(path)
+
+        def leads_to_rule(real: str) -> bool:
+            prefix = real.rstrip("/") + "/"
+            return any(
+                path == real
+                or path.startswith(prefix)
+                or recursive
+                and (path == "/" or real.startswith(path + "/"))
+                for path, recursive in rules
+            )
+
+        for parent in parents:
+            try:
+                entries = list(os.scandir(parent))
+            except OSError:
+                continue
+            for entry in entries:
+                if (
+                    entry.is_symlink()
+                    and not policy.check(entry.path)
+                    and leads_to_rule(os.path.realpath(entry.path))
+                ):
+                    return True
+        return False
+
+    def _get_landlock_ruleset(self) -> Optional[LandlockRuleset]:
+        return self._landlock_ruleset
+
+    def _get_seccomp_filter(self) -> Optional[SeccompFilter]:
+        if self._security is None:
+            return None
+        if self._notify_syscalls:
+            return self._get_seccomp_notify_filters()[0]
+        trace = self._use_ptrace
+        landlock = self._landlock_opens is not None
+        seccomp_filter = getattr(self._security, "seccomp_filter", None)
+        if (
+            seccomp_filter is not None
+            and seccomp_filter.trace == trace
+            and seccomp_filter.landlock == landlock
+        ):
+            return seccomp_filter
+
+        seccomp_filter = self._compile_seccomp_filter(
+            tuple(self._get_seccomp_handlers()),
+            trace,
+            False,
+            self._landlock_opens,
+        )
+        try:
+            # Profiles cache their filter, saving the lookup.
+            self._security.seccomp_filter = seccomp_filter
+        except AttributeError:
+            pass
+        return seccomp_filter
+
+    def _get_seccomp_notify_filter(self) -> Optional[SeccompFilter]:
+        if not self._notify_syscalls:
+            return None
+        return self._get_seccomp_notify_filters()[1]
+
+    def _get_seccomp_notify_filters(
+        self,
+    ) -> Tuple[SeccompFilter, SeccompFilter]:
+        trace = self._use_ptrace
+        landlock = self._landlock_opens is not None
+        filters = getattr(self._security, "seccomp_notify_filters", None)
+        if (
+            filters is not None
+            and filters[0].trace == trace
+            and filters[1].landlock == landlock
+        ):
+            return filters
+
+        handlers = tuple(self._get_seccomp_handlers())
+        filters = (
+            self._compile_seccomp_filter(
+                handlers, trace, False, self._landlock_opens
+            ),
+            self._compile_seccomp_filter(
+                handlers, True, True, self._landlock_opens
+            ),
+        )
+        try:
+            self._security.seccomp_notify_filters = filters
+        except AttributeError:
+            pass
+        return filters
+
+    @staticmethod
+    def _compile_seccomp_filter(
+        handlers: Tuple[int, ...],
+        trace: bool,
+        notify: bool,
+        read_opens: Optional[Tuple[int, ...]],
+    ) -> SeccompFilter:
+        key = (trace, notify, handlers, read_opens)
+        seccomp_filter = _seccomp_filters.get(key)
+        if seccomp_filter is None:
+            seccomp_filter = _seccomp_filters[key] = SeccompFilter(
+                handlers, trace, notify, read_opens
+            )
+        return seccomp_filter
+
     def _get_seccomp_handlers(self) -> List[int]:
         handlers = [-1] * MAX_SYSCALL_NUMBER
         index = _SYSCALL_INDICIES[NATIVE_ABI]
         assert index is not None
         for i in range(SYSCALL_COUNT):
-            # Ensure at least one syscall traps, including the execve so we know the process started.
-            # Otherwise, a simple assembly program could terminate without ever trapping.
-            if i in (sys_execve, sys_exit, sys_exit_group):
-                continue
-            handler = self._security.get(i, DISALLOW)
+            if i in self._listing_syscalls and self._landlock_opens is None:
+                # The directories were checked when opened.
+                handler = ALLOW
+                notify = False
+            elif i in (sys_execve, sys_exit, sys_exit_group):
+                # Ensure at least one syscall traps, including the execve so we know the process started.
+                # Otherwise, a simple assembly program could terminate without ever trapping.
+                if self._use_ptrace:
+                    continue
+                # Without ptrace, there is nothing to trap to. The execve was checked to be allowed, or is left to
+                # the supervisor, and the process must be able to exit.
+                handler = ALLOW
+                notify = i == sys_execve and self._security.get(i) != ALLOW
+            else:
+                handler = self._security.get(i, DISALLOW)
+                notify = i in self._notify_syscalls
             for call in translator[i][index]:
                 if call is None:
                     continue
-                if isinstance(handler, int) and handler == ALLOW:
+                if notify:
+                    handlers[call] = PTBOX_SECCOMP_NOTIFY
+                elif isinstance(handler, int) and handler == ALLOW:
                     handlers[call] = 0
                 elif isinstance(handler, ErrnoHandlerCallback):
                     handlers[call] = handler.errno
@@ -246,6 +762,10 @@ class TracedPopen(Process):
                 raise RuntimeError("failed to spawn child")
             elif self.returncode == PTBOX_SPAWN_FAIL_SETAFFINITY:
                 raise RuntimeError("failed to set child affinity")
+            elif self.returncode == PTBOX_SPAWN_FAIL_CGROUP:
+                raise RuntimeError("failed to move child into its cgroup")
+            elif self.returncode == PTBOX_SPAWN_FAIL_LANDLOCK:
+                raise RuntimeError("failed to restrict child with Landlock")
             elif self.returncode >= 0:
                 raise RuntimeError(
                     "process failed to initialize with unknown exit code: %d"
@@ -264,8 +784,23 @@ class TracedPopen(Process):
         assert self.returncode is not None
         return self.returncode > 0
 
+    @property
+    def max_memory(self) -> int:
+        if self._cgroup_memory is not None:
+            return self._cgroup_memory
+        return super().max_memory
+
+    @property
+    def cpu_time(self) -> float:
+        if self._cgroup_cpu_time is not None:
+            return self._cgroup_cpu_time
+        return super().cpu_time
+
     @property
     def is_mle(self) -> bool:
+        # Killed by the kernel once it couldn't reclaim enough in the cgroup.
+        if self._cgroup_oom_killed:
+            return True
         return self._memory != 0 and self.max_memory > self._memory
 
     @property
@@ -283,13 +818,18 @@ class TracedPopen(Process):
         return self._is_tle
 
     def kill(self) -> None:
-        # FIXME(quantum): this is actually a race. The process may exit before we kill it.
-        # Under very unlikely circumstances, the pid could be reused and we will end up
-        # killing the wrong process.
+        # FIXME(quantum): on FreeBSD, and Linux before 5.3, this is actually a race. The
+        # process may exit before we kill it. Under very unlikely circumstances, the pid
+        # could be reused and we will end up killing the wrong process. Elsewhere, the
+        # signal goes through a pidfd, and the rest of the group is killed once it's gone.
         if self.returncode is None:
             log.warning("Request the killing of process: %s", self.pid)
+            cgroup = self._cgroup
             try:
-                os.killpg(self.pid, signal.SIGKILL)
+                if FREEBSD:
+                    os.killpg(self.pid, signal.SIGKILL)
+                elif cgroup is None or not cgroup.kill():
+                    self._send_signal(signal.SIGKILL)
             except OSError:
                 import traceback
 
@@ -308,14 +848,17 @@ class TracedPopen(Process):
             return False
 
         try:
-            callback = self._callbacks[self.debugger.abi][syscall]
+            i = _SYSCALL_IDS[self.debugger.abi][syscall]
         except IndexError:
             if self.debugger.abi == PTBOX_ABI_ARM:
                 # ARM-specific
                 return 0xF0000 < syscall < 0xF0006
             return False
 
-        if callback is not None:
+        if i is None:
+            return False
+        callback = self._security.get(i)
+        if callable(callback):
             return callback(self.debugger)
         return False
 
@@ -358,14 +901,36 @@ class TracedPopen(Process):
         log.warning("SIGXCPU in process %d", self.pid)
         self._is_tle = True
 
-    def _run_process(self) -> Optional[int]:
+    def _run_process(self) -> None:
+        if self._start():
+            self._monitor()
+            self._finish()
+
+    def _run_on_reactor(self, reactor: Reactor) -> None:
+        if self._start():
+            reactor.add(self)
+
+    def _monitor_exited(self, exitcode: int) -> None:
+        # Waiting on the supervisor, or for the cgroup to empty, would hold up
+        # the reactor, which must reap what is left of the process for either
+        # to finish, and every other process on it.
+        if self._supervisor is None and self._cgroup is None:
+            self._finish()
+        else:
+            threading.Thread(target=self._finish).start()
+
+    def _start(self) -> bool:
         try:
             self._spawn(self._executable, self._args, self._env, self._chdir)
         except:  # noqa: E722, need to catch absolutely everything
             self._spawn_error = sys.exc_info()[0]
+            self._release_cgroup()
             self._died.set()
-            return None
+            return False
         finally:
+            if self._cgroup is not None:
+                self._cgroup.close_procs()
+                self._cgroup_fd = -1
             if self.stdin_needs_close:
                 os.close(self._child_stdin)
             if self.stdout_needs_close:
@@ -375,6 +940,13 @@ class TracedPopen(Process):
 
             self._spawned_or_errored.set()
 
+        if self._notify_socket >= 0:
+            self._supervisor = threading.Thread(
+                target=self._supervisor_thread, args=(self._notify_socket,)
+            )
+            self._notify_socket = -1
+            self._supervisor.start()
+
         if not FREEBSD:
             # Adjust OOM score on the child process, sacrificing it before the judge process.
             # This is not possible on FreeBSD.
@@ -384,24 +956,100 @@ class TracedPopen(Process):
                 import traceback
 
                 traceback.print_exc()
+        return True
 
+    def _finish(self) -> None:
         # TODO(tbrindus): this code should be the same as [self.returncode], so it shouldn't be duplicated
-        code = self._monitor()
+        if not self._use_ptrace and self.signal == signal.SIGSYS:
+            # Killed by the seccomp filter; which syscall it made is unknown.
+            log.warning("Process %d killed by its seccomp filter", self.pid)
+            self.protection_fault = (-1, "unknown", [0] * 6, None)
 
+        # Whatever is left of the process was killed and reaped by the
+        # monitor; the cgroup catches anything else.
+        self._release_cgroup()
+        if self._supervisor is not None:
+            # It's done once every process under the filter is gone.
+            self._supervisor.join()
+
+        if self._timed_out:
+            log.warning("Time limit exceeded, killed %d", self.pid)
+            self._is_tle = True
         if self._time and self.execution_time > self._time:
             self._is_tle = True
         self._died.set()
 
-        return code
+    def _release_cgroup(self) -> None:
+        # Keeps its usage, and kills anything left in it.
+        cgroup, self._cgroup = self._cgroup, None
+        if cgroup is None:
+            return
+        try:
+            self._cgroup_memory = cgroup.peak_memory
+            self._cgroup_cpu_time = cgroup.cpu_time
+            self._cgroup_oom_killed = cgroup.oom_killed
+        except (OSError, ValueError):
+            log.exception("Failed to read the usage of cgroup %s", cgroup.path)
+        cgroup.remove()
+
+    def _supervisor_thread(self, sock: int) -> None:
+        # Runs the checks of the syscalls the notify filter holds, until
+        # every process under it is gone. A denied syscall is a protection
+        # fault, as under ptrace.
+        try:
+            listener = SeccompListener(sock)
+        except OSError:
+            log.exception("Failed to receive seccomp listener of %d", self.pid)
+            self.kill()
+            return
+
+        try:
+            while listener.receive():
+                debugger = NotifyDebugger(listener)
+                i = _SYSCALL_IDS[NATIVE_ABI][listener.syscall]
+                if (
+                    i == sys_execve
+                    and not self._executed
+                    and debugger.tid == self.pid
+                ):
+                    # The execve starting the submission, which the profile
+                    # needn't allow; it only checks later ones.
+                    self._executed = True
+                    listener.respond(0)
+                    continue
+                handler = self._security.get(i) if i is not None else None
+                try:
+                    allowed = callable(handler) and handler(debugger)
+                except Exception:
+                    log.exception("Error checking syscall %d", listener.syscall)
+                    allowed = False
+
+                if not listener.valid():
+                    # The thread is gone, and its tid may already be reused;
+                    # what was read from it can't be trusted.
+                    continue
+                if not allowed:
+                    self.protection_fault = (
+                        listener.syscall,
+                        debugger.get_syscall_name(listener.syscall),
+                        list(listener.args),
+                        None,
+                    )
+                    self.kill()
+                    listener.respond(errno.EPERM)
+                    continue
+                listener.respond(debugger.response(listener.syscall))
+        except OSError:
+            log.exception("seccomp supervisor of %d failed", self.pid)
+            self.kill()
+        finally:
+            listener.close()
 
     def _shocker_thread(self) -> None:
-        # On Linux, ignored signals still cause a notification under ptrace.
-        # Hence, we use SIGWINCH, harmless and ignored signal to make wait4 return
-        # pt_process::monitor, causing time to be updated.
-        # On FreeBSD, a signal must not be ignored in order for wait4 to return.
-        # Hence, we swallow SIGSTOP, which should never be used anyway, and use it
-        # force an update.
-        wake_signal = signal.SIGSTOP if FREEBSD else signal.SIGWINCH
+        # Only used on FreeBSD, which lacks timerfd and pidfd to enforce the time
+        # limits natively. There, a signal must not be ignored in order for wait4
+        # to return. Hence, we swallow SIGSTOP, which should never be used anyway,
+        # and use it force an update.
         self._spawned_or_errored.wait()
 
         while not self._died.wait(1):
@@ -414,7 +1062,7 @@ class TracedPopen(Process):
                 self._is_tle = True
                 break
             try:
-                os.killpg(self.pid, wake_signal)
+                os.killpg(self.pid, signal.SIGSTOP)
             except OSError:
                 pass
 
@@ -39,3 +39,7 @@ class InvalidExecutorNameError(JudgeException):
 
 class InternalError(JudgeException):
     pass
+
+
+class CompileError(JudgeException):
+    pass
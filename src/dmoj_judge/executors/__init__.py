@@ -1,2 +1,4 @@
-from .manager import ExecutorManager
+from .manager import ExecutorManager, ProbeResult
 from .base import BaseExecutor
+from .compiled import CompiledExecutor
+from .cache import CompiledBinaryCache
@@ -2,22 +2,33 @@ from ..config import ExecutorConfig
 from ..cptbox import IsolateTracer, TracedPopen, syscalls
 from ..cptbox.filesystem_policies import FilesystemAccessRule, RecursiveDir
 from ..cptbox.handlers import ALLOW
-from ..errors import InternalError
-from ..types import Result
+from ..errors import CompileError, InternalError
+from ..types import Result, ResultKind
 from .filesystem import Filesystem
 from typing import Any, Callable
 from abc import ABCMeta, abstractmethod, abstractproperty
 from subprocess import PIPE
+import subprocess
+import tempfile
+import logging
 import shutil
+import time
 import os
+import re
 
+log = logging.getLogger(__name__)
 
-SETBUFSIZE_PATH: str = None
+# Built alongside the sandbox; sets the buffering of the standard streams of
+# submissions from CPTBOX_STD{OUT,ERR}_BUFFER_SIZE.
+SETBUFSIZE_PATH: str = os.path.join(os.path.dirname(__file__), "setbufsize.so")
+_VERSION_RE = re.compile(r"(\d+(?:\.\d+)+)")
+# See `BaseExecutor.get_security_profile`.
+_security_profiles: dict[type, IsolateTracer] = {}
 
 
 # TODO: Is this really necessary?
 # FIXME: Rewrite with correct typing
-class ExecutorMeta(type):
+class ExecutorMeta(ABCMeta):
     def __new__(mcs, name, bases, attrs) -> Any:
         if "__module__" in attrs:
             attrs["name"] = attrs["__module__"].split(".")[-1]
@@ -26,7 +37,7 @@ class ExecutorMeta(type):
 
 # TODO: Document
 # TODO: Properties vs Get_*
-class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
+class BaseExecutor(metaclass=ExecutorMeta):
     # Used for caching purposes
     problem_id: str
     source_code: bytes
@@ -56,6 +67,9 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
     name: str
     test_program: str
     test_name: str = "self_test"
+    test_message: bytes = b"echo: Hello, World!\n"
+    # How long `--version` and the like may take, in seconds.
+    version_timeout: float = 10
 
     config: ExecutorConfig
     filesystem: Filesystem
@@ -65,6 +79,17 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
     _hints: list[str]
     _temp_dir: str
     working_dir: str | None = None
+    # The profile of launches that don't extend the filesystem, layered on
+    # the shared one; see `get_security`.
+    _security: IsolateTracer | None = None
+    # The shared assets placed in the working directory, by name, and what
+    # identifies each: its device, inode and change time, which can't be set
+    # and tells apart files that reuse an inode. None until the working
+    # directory is prepared.
+    _assets: dict[str, tuple[int, int, int]] | None = None
+    # Time spent preparing launches, not counting the sandbox itself.
+    launch_setup_time: float = 0
+    launches: int = 0
 
     def __init__(
         self,
@@ -82,10 +107,29 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
 
         self._temp_dir = dest_dir or config.temp_directory
         self._hints = hints or []
-        self.working_dir = None
+        self.working_dir = tempfile.mkdtemp(prefix="dmoj-", dir=self._temp_dir)
 
     def cleanup(self) -> None:
-        raise NotImplementedError("Executor.cleanup")
+        if self.launches:
+            log.debug(
+                "%d launches of %s, %.3f ms of setup each",
+                self.launches,
+                self.problem_id,
+                self.launch_setup_time / self.launches * 1000,
+            )
+            profile = _security_profiles.get(type(self))
+            if profile is not None:
+                log.debug(
+                    "Path cache hit rates of %s: %.1f%% of checks, "
+                    "%.1f%% of resolutions",
+                    self.get_name(),
+                    profile.path_decisions.hit_rate * 100,
+                    profile.path_resolutions.hit_rate * 100,
+                )
+        if self.working_dir is not None:
+            shutil.rmtree(self.working_dir, ignore_errors=True)
+            self.working_dir = None
+        self._security = None
 
     def __del__(self) -> None:
         self.cleanup()
@@ -99,7 +143,22 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
     def populate_result(
         self, stderr: bytes, result: Result, process: TracedPopen
     ) -> None:
-        raise NotImplementedError("Executor.populate_result")
+        # How the process ended, as the case's verdicts; the checker only
+        # runs if there are none.
+        result.max_memory = process.max_memory or 0
+        result.execution_time = process.execution_time or 0.0
+        result.wall_clock_time = process.wall_clock_time or 0.0
+        result.context_switches = process.context_switches or (0, 0)
+        for kind, failed in (
+            (ResultKind.IR, process.is_ir),
+            (ResultKind.RTE, process.is_rte),
+            (ResultKind.OLE, process.is_ole),
+            (ResultKind.TLE, process.is_tle),
+            (ResultKind.MLE, process.is_mle),
+        ):
+            if failed:
+                result.result_flag |= kind.value[0]
+        result._feedback = self.parse_feedback_from_stderr(stderr, process)
 
     # TODO: Find a better name
     def parse_feedback_from_stderr(
@@ -107,38 +166,136 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
     ) -> str:
         return ""
 
-    def get_security(
-        self, extend_filesystem: Filesystem | None
-    ) -> IsolateTracer:
-        sec = IsolateTracer(
-            read_fs=self.get_filesystem_access_rules(readable=True)
-            + (extend_filesystem.read if extend_filesystem else []),
-            write_fs=self.get_filesystem_access_rules(writeable=True)
-            + (extend_filesystem.read if extend_filesystem else []),
+    def get_security_profile(self) -> IsolateTracer:
+        # The part of the policy that doesn't depend on the submission, built
+        # once per executor class and shared by all of its launches. The
+        # filesystem rules and allowed syscalls of an executor must therefore
+        # not depend on the instance.
+        profile = _security_profiles.get(type(self))
+        if profile is not None:
+            return profile
+
+        profile = IsolateTracer(
+            read_fs=self.get_filesystem_access_rules(readable=True),
+            write_fs=self.get_filesystem_access_rules(writeable=True),
         )
-
         for item in self.get_allowed_syscalls():
             if isinstance(item, tuple):
                 name, handler = item
             else:
                 name = item
                 handler = ALLOW
-            sec[getattr(syscalls, "sys_" + name)] = handler
-        return sec
+            profile[getattr(syscalls, "sys_" + name)] = handler
+        _security_profiles[type(self)] = profile
+        return profile
 
-    def get_filesystem_access_rules(
-        self, readable: bool = False, writeable: bool = False
-    ) -> list[FilesystemAccessRule]:
+    def get_security(
+        self, extend_filesystem: Filesystem | None
+    ) -> IsolateTracer:
+        # Only the working directory and `extend_filesystem` are layered on
+        # top of the shared profile. Every case runs in the same working
+        # directory, so launches without `extend_filesystem` share a layer.
         assert self.working_dir
-        access_rules: list[FilesystemAccessRule] = [
+        if extend_filesystem is None and self._security is not None:
+            return self._security
+
+        working_dir: list[FilesystemAccessRule] = [
             RecursiveDir(self.working_dir)
         ]
+        security = IsolateTracer(
+            read_fs=working_dir
+            + (extend_filesystem.read if extend_filesystem else []),
+            write_fs=working_dir
+            + (extend_filesystem.write if extend_filesystem else []),
+            base=self.get_security_profile(),
+        )
+        if extend_filesystem is None:
+            self._security = security
+        return security
+
+    def get_filesystem_access_rules(
+        self, readable: bool = False, writeable: bool = False
+    ) -> list[FilesystemAccessRule]:
+        # Rules shared by every submission; see `get_security_profile`.
+        access_rules: list[FilesystemAccessRule] = []
         if readable:
             access_rules.extend(self.filesystem.read)
         if writeable:
             access_rules.extend(self.filesystem.write)
         return access_rules
 
+    def get_shared_assets(self) -> dict[str, str]:
+        # Read-only files every launch needs, by their name in the working
+        # directory.
+        return {"setbufsize.so": SETBUFSIZE_PATH}
+
+    def prepare_working_dir(self) -> None:
+        # Done once per submission rather than once per launch: every case
+        # runs in the same working directory.
+        self._assets = {}
+        for name, path in self.get_shared_assets().items():
+            if not os.path.exists(path):
+                log.warning("Shared asset `%s` is missing", path)
+                continue
+            self._place_asset(name, path)
+
+    def _place_asset(self, name: str, path: str) -> None:
+        # The working directory is writable, so an asset is only hardlinked
+        # when the judge itself can't write to it, and is copied read-only
+        # otherwise, or across filesystems.
+        assert self.working_dir is not None and self._assets is not None
+        dest = os.path.join(self.working_dir, name)
+        if os.path.lexists(dest):
+            os.unlink(dest)
+        linked = False
+        if not os.access(path, os.W_OK):
+            try:
+                os.link(path, dest)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            shutil.copyfile(path, dest)
+            os.chmod(dest, 0o444)
+        self._assets[name] = self._identify(dest)
+
+    @staticmethod
+    def _identify(path: str) -> tuple[int, int, int]:
+        stat = os.lstat(path)
+        return stat.st_dev, stat.st_ino, stat.st_ctime_ns
+
+    def _check_assets(self) -> None:
+        # The submission may have replaced an asset since the last launch.
+        assert self.working_dir is not None and self._assets is not None
+        for name, placed in self._assets.items():
+            dest = os.path.join(self.working_dir, name)
+            try:
+                if self._identify(dest) == placed:
+                    continue
+            except FileNotFoundError:
+                pass
+            self._place_asset(name, self.get_shared_assets()[name])
+
+    def _link(self, symlinks: dict[str, str]) -> None:
+        assert self.working_dir is not None
+        for src, dst in symlinks.items():
+            src = os.path.abspath(os.path.join(self.working_dir, src))
+            if (
+                os.path.commonprefix([src, self.working_dir])
+                != self.working_dir
+            ):
+                raise InternalError(
+                    "Cannot symlink outside of submission directory"
+                )
+
+            if os.path.islink(src):
+                # Left over from an earlier launch; the submission may have
+                # replaced it since, so it is checked rather than trusted.
+                if os.readlink(src) == dst:
+                    continue
+                os.unlink(src)
+            os.symlink(dst, src)
+
     def get_allowed_syscalls(self) -> list[str | tuple[str, Any]]:
         return self.allowed_syscalls
 
@@ -160,46 +317,46 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
         stdin: int | None = PIPE,
         stdout: int | None = PIPE,
         stderr: int | None = None,
-        stdout_buffer_size: int = 0,
-        stderr_buffer_size: int = 0,
+        stdout_buffer_size: int | None = None,
+        stderr_buffer_size: int | None = None,
         extend_filesystem: Filesystem | None = None,
         symlinks: dict[str, str] | None = None,
     ) -> Any:
         assert self.working_dir is not None
+        start = time.perf_counter()
+        if self._assets is None:
+            self.prepare_working_dir()
+        else:
+            self._check_assets()
         if symlinks:
-            for src, dst in symlinks.items():
-                src = os.path.abspath(os.path.join(self.working_dir, src))
-                if (
-                    os.path.commonprefix([src, self.working_dir])
-                    != self.working_dir
-                ):
-                    raise InternalError(
-                        "Cannot symlink outside of submission directory"
-                    )
-
-                if os.path.islink(src):
-                    os.unlink(src)
-                os.symlink(dst, src)
-
-        # TODO: setbufsize.so
-        agent: str = os.path.join(self.working_dir, "setbufsize.so")
-        shutil.copyfile(SETBUFSIZE_PATH, agent)
+            self._link(symlinks)
+
         child_env: dict[str, str] = {
             "LD_LIBRARY_PATH": os.environ.get("LD_LIBRARY_PATH", ""),
-            "LD_PRELOAD": agent,
-            "CPTBOX_STDOUT_BUFFER_SIZE": str(stdout_buffer_size),
-            "CPTBOX_STDERR_BUFFER_SIZE": str(stderr_buffer_size),
         }
+        # Left as the C library has them unless asked otherwise.
+        if stdout_buffer_size is not None:
+            child_env["CPTBOX_STDOUT_BUFFER_SIZE"] = str(stdout_buffer_size)
+        if stderr_buffer_size is not None:
+            child_env["CPTBOX_STDERR_BUFFER_SIZE"] = str(stderr_buffer_size)
+        assert self._assets is not None
+        if "setbufsize.so" in self._assets:
+            child_env["LD_PRELOAD"] = os.path.join(
+                self.working_dir, "setbufsize.so"
+            )
 
         child_env.update(self.get_env())
         executable = self.get_executable()
         assert executable is not None
+        security = self.get_security(extend_filesystem=extend_filesystem)
+        self.launch_setup_time += time.perf_counter() - start
+        self.launches += 1
 
         return TracedPopen(
             # TODO: Which parameters does it need?
             [a.encode("utf-8") for a in self.get_cmdline() + list(args)],
             executable=executable.encode("utf-8"),
-            security=self.get_security(extend_filesystem=extend_filesystem),
+            security=security,
             time=time_limit,  # TODO: Why int?
             memory=memory_limit,
             stdin=stdin,
@@ -214,6 +371,10 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
             cwd=self.working_dir.encode("utf-8"),
             wall_time=wall_time,
             cpu_affinity=self.config.submission_cpu_affinity,
+            notify=self.config.seccomp_notify,
+            reactor=self.config.reactor,
+            cgroup=self.config.cgroup_root,
+            landlock=self.config.landlock,
         )
 
     @classmethod
@@ -224,30 +385,92 @@ class BaseExecutor(ABCMeta, metaclass=ExecutorMeta):
     def get_command(cls) -> str | None:
         return cls.runtime_dict.get(cls.command or "", None)
 
-    # TODO: What's this?
+    # Whether the executor can be used on this host, i.e. its runtime is
+    # installed.
     @classmethod
     def initialize(cls) -> bool:
-        raise NotImplementedError("Executor.initialize")
+        if cls.command is None:
+            return True
+        command = cls.get_command()
+        return command is not None and os.access(command, os.X_OK)
 
     @classmethod
     def self_test(
         cls,
-        output: bool = True,
+        config: ExecutorConfig,
+        output: bool = False,
         error_callback: Callable[[Any], Any] | None = None,
     ) -> bool:
-        raise NotImplementedError("Executor.self_test")
+        # Runs `test_program`, which must echo its input back.
+        def fail(message: str) -> bool:
+            if error_callback is not None:
+                error_callback(message)
+            return False
+
+        if not getattr(cls, "test_program", None):
+            return fail("no test program")
+
+        try:
+            executor = cls(config, cls.test_name, cls.test_program.encode())
+        except CompileError as e:
+            return fail("compile error: %s" % e)
+
+        try:
+            process = executor.launch(
+                time_limit=config.selftest_time_limit,
+                memory_limit=config.selftest_memory_limit,
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=PIPE,
+            )
+            stdout, stderr = process.communicate(cls.test_message)
+        finally:
+            executor.cleanup()
+
+        if output:
+            log.info("%s self-test output: %r", cls.get_name(), stdout)
+        if process.returncode or stdout.strip() != cls.test_message.strip():
+            return fail(
+                "exit code %s, output %r, errors %r"
+                % (process.returncode, stdout, stderr)
+            )
+        return True
 
     @classmethod
     def get_versionable_commands(cls) -> list[tuple[str, str]]:
-        raise NotImplementedError("Executor.get_versionable_commands")
+        command = cls.get_command()
+        if cls.command is None or command is None:
+            return []
+        return [(cls.command, command)]
 
     @classmethod
-    def get_runtime_versions(cls) -> Any:
-        raise NotImplementedError("Executor.get_runtime_versions")
+    def get_runtime_versions(cls) -> list[tuple[str, tuple[int, ...]]]:
+        versions: list[tuple[str, tuple[int, ...]]] = []
+        for name, path in cls.get_versionable_commands():
+            try:
+                process = subprocess.run(
+                    [path, *cls.get_version_flags(name)],
+                    stdin=subprocess.DEVNULL,
+                    stdout=PIPE,
+                    stderr=subprocess.STDOUT,
+                    timeout=cls.version_timeout,
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                log.warning("Cannot get the version of `%s`: %s", path, e)
+                continue
+            version = cls.parse_version(
+                name, process.stdout.decode("utf-8", "replace")
+            )
+            if version is not None:
+                versions.append((name, version))
+        return versions
 
     @classmethod
-    def parse_version(cls, command: str, output: str) -> Any:
-        raise NotImplementedError("Executor.parse_version")
+    def parse_version(cls, command: str, output: str) -> tuple[int, ...] | None:
+        match = _VERSION_RE.search(output)
+        if match is None:
+            return None
+        return tuple(map(int, match.group(1).split(".")))
 
     @classmethod
     def get_version_flags(cls, command: str) -> Any:
@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+from typing import Iterator
+import tempfile
+import hashlib
+import logging
+import shutil
+import fcntl
+import os
+
+log = logging.getLogger(__name__)
+
+
+# Compiled executables, keyed by everything that affects the compiler's
+# output. Entries are shared by every worker process and every judge instance
+# on the host:
+#
+#  * entries are written to a temporary file and renamed into place, so they
+#    are either complete or absent;
+#  * readers take no lock; an entry evicted while being fetched is a miss;
+#  * inserts, evictions and the hit/miss counters are serialized with an
+#    flock on `.lock`.
+#
+# Recently used entries have their mtime bumped, and the oldest ones are
+# evicted once there are more than `size` of them.
+class CompiledBinaryCache:
+    root: str
+    size: int
+
+    _instances: dict[tuple[str, int], "CompiledBinaryCache"] = {}
+
+    def __init__(self, root: str, size: int = 100) -> None:
+        self.root = root
+        self.size = size
+        os.makedirs(os.path.join(self.root, "entries"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+
+    @classmethod
+    def get(cls, root: str | None, size: int) -> "CompiledBinaryCache | None":
+        # Caching is disabled unless a directory is configured.
+        if not root:
+            return None
+        cache = cls._instances.get((root, size))
+        if cache is None:
+            cache = cls._instances[(root, size)] = cls(root, size)
+        return cache
+
+    @staticmethod
+    def make_key(
+        executor: str, compiler: str, flags: list[str], source: bytes
+    ) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (executor, compiler, "\0".join(flags)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, "entries", key)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def fetch(self, key: str, dest: str) -> bool:
+        # Places the cached executable at `dest`, returning whether there was
+        # one.
+        path = self._path(key)
+        try:
+            # Copied rather than linked: submissions can write to their
+            # working directory, and must not be able to alter the entry.
+            shutil.copy2(path, dest)
+            os.utime(path)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return False
+
+        self._count(hit=True)
+        return True
+
+    def store(self, key: str, source: str) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            shutil.copymode(source, temp_path)
+            with self._locked():
+                os.replace(temp_path, self._path(key))
+                self._trim()
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _trim(self) -> None:
+        entries: list[tuple[float, str]] = []
+        with os.scandir(os.path.join(self.root, "entries")) as it:
+            for entry in it:
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+
+        if len(entries) <= self.size:
+            return
+        entries.sort()
+        for _, path in entries[: len(entries) - self.size]:
+            log.debug("Evicting `%s` from the compiled binary cache", path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _count(self, hit: bool) -> None:
+        try:
+            with self._locked():
+                hits, misses = self.stats()
+                if hit:
+                    hits += 1
+                else:
+                    misses += 1
+                with open(os.path.join(self.root, ".stats"), "w") as f:
+                    f.write("%d %d\n" % (hits, misses))
+        except OSError as e:
+            log.warning("Failed to update compiled binary cache stats: %s", e)
+
+    def stats(self) -> tuple[int, int]:
+        # Hits and misses since the cache was created.
+        try:
+            with open(os.path.join(self.root, ".stats")) as f:
+                hits, misses = map(int, f.read().split())
+        except (OSError, ValueError):
+            return 0, 0
+        return hits, misses
+
+    @property
+    def hit_rate(self) -> float:
+        hits, misses = self.stats()
+        if not hits + misses:
+            return 0
+        return hits / (hits + misses)
@@ -0,0 +1,170 @@
+from .base import BaseExecutor
+from .cache import CompiledBinaryCache
+from ..config import ExecutorConfig
+from ..cptbox import TracedPopen
+from ..cptbox.compiler_isolate import CompilerIsolateTracer
+from ..cptbox.filesystem_policies import FilesystemAccessRule, RecursiveDir
+from ..errors import CompileError
+from subprocess import PIPE, STDOUT
+from abc import abstractmethod
+import logging
+import os
+
+log = logging.getLogger(__name__)
+# See `CompiledExecutor.get_compiler_security_profile`.
+_compiler_security_profiles: dict[type, CompilerIsolateTracer] = {}
+
+
+class CompiledExecutor(BaseExecutor):
+    compiler_time_limit: float | None = None
+    compiler_read_fs: list = []
+    compiler_write_fs: list = []
+
+    # Compiler warnings of the last compilation, if any.
+    warning: bytes | None = None
+    _executable: str | None = None
+
+    def __init__(
+        self,
+        config: ExecutorConfig,
+        problem_id: str,
+        source_code: bytes,
+        *args,
+        **kwargs,
+    ) -> None:
+        super().__init__(config, problem_id, source_code, *args, **kwargs)
+        self.create_files()
+        self._executable = self.compile()
+
+    def get_compiler(self) -> str | None:
+        return self.get_command()
+
+    @abstractmethod
+    def get_compile_args(self) -> list[str]:
+        pass
+
+    def get_compiled_file(self) -> str:
+        assert self.working_dir is not None
+        return os.path.join(self.working_dir, self.problem_id)
+
+    def get_compiler_identity(self) -> str:
+        # Stands in for the compiler version: upgrading the compiler replaces
+        # its binary, which changes this.
+        compiler = self.get_compiler()
+        if compiler is None:
+            return ""
+        stat = os.stat(compiler)
+        return "%s:%d:%d" % (
+            os.path.realpath(compiler),
+            stat.st_size,
+            stat.st_mtime_ns,
+        )
+
+    def get_compiler_env(self) -> dict[str, str] | None:
+        return None
+
+    def _get_compiler_env(self) -> dict[str, str]:
+        assert self.working_dir is not None
+        env = self.get_compiler_env()
+        env = dict(os.environ if env is None else env)
+        # Compilers keep their intermediate files in the temporary directory,
+        # and may only write in the working directory.
+        env["TMPDIR"] = self.working_dir
+        return env
+
+    def create_compile_process(self, args: list[str]) -> TracedPopen:
+        assert self.working_dir is not None
+        compiler = self.get_compiler()
+        assert compiler is not None
+
+        return TracedPopen(
+            [arg.encode("utf-8") for arg in args],
+            executable=compiler.encode("utf-8"),
+            security=self.get_compiler_security(),
+            time=self.compiler_time_limit or self.config.compiler_time_limit,
+            memory=0,
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=STDOUT,
+            env=self._get_compiler_env(),
+            nproc=-1,
+            fsize=self.config.compiler_size_limit,
+            cwd=self.working_dir.encode("utf-8"),
+        )
+
+    def get_compiler_security_profile(self) -> CompilerIsolateTracer:
+        # As `get_security_profile`, shared by every compile of the executor
+        # class.
+        profile = _compiler_security_profiles.get(type(self))
+        if profile is None:
+            profile = _compiler_security_profiles[type(self)] = (
+                CompilerIsolateTracer(
+                    read_fs=self.get_filesystem_access_rules(readable=True)
+                    + self.compiler_read_fs,
+                    write_fs=self.get_filesystem_access_rules(writeable=True)
+                    + self.compiler_write_fs,
+                )
+            )
+        return profile
+
+    def get_compiler_security(self) -> CompilerIsolateTracer:
+        assert self.working_dir is not None
+        working_dir: list[FilesystemAccessRule] = [
+            RecursiveDir(self.working_dir)
+        ]
+        return CompilerIsolateTracer(
+            read_fs=working_dir,
+            write_fs=working_dir,
+            base=self.get_compiler_security_profile(),
+        )
+
+    def _cache(self) -> CompiledBinaryCache | None:
+        return CompiledBinaryCache.get(
+            self.config.compiled_binary_cache_dir,
+            self.config.compiled_binary_cache_size,
+        )
+
+    def compile(self) -> str:
+        args = self.get_compile_args()
+        executable = self.get_compiled_file()
+
+        cache = self._cache()
+        key = None
+        if cache is not None:
+            assert self.working_dir is not None
+            # The working directory is different for every submission, and
+            # mustn't keep them from sharing entries.
+            key = cache.make_key(
+                self.get_name(),
+                self.get_compiler_identity(),
+                [arg.replace(self.working_dir, ".") for arg in args],
+                self.source_code,
+            )
+            if cache.fetch(key, executable):
+                log.debug(
+                    "Using cached binary for %s (cache hit rate: %.1f%%)",
+                    self.problem_id,
+                    cache.hit_rate * 100,
+                )
+                return executable
+
+        process = self.create_compile_process(args)
+        output, _ = process.communicate()
+        if process.is_tle:
+            raise CompileError("Compiler timed out")
+        if process.returncode != 0:
+            raise CompileError(
+                output[: self.config.compiler_output_character_limit].decode(
+                    "utf-8", "replace"
+                )
+            )
+
+        self.warning = output or None
+        if cache is not None and key is not None and not self.warning:
+            # Warnings aren't cached, so only clean compiles are stored; the
+            # warning would be lost on a later hit.
+            cache.store(key, executable)
+        return executable
+
+    def get_executable(self) -> str | None:
+        return self._executable
@@ -1,21 +1,110 @@
 from .base import BaseExecutor
 from ..errors import InvalidConfigurationError, InvalidExecutorNameError
-from ..config import ExecutorManagerConfig
+from ..config import ExecutorConfig, ExecutorManagerConfig
+from ..types import Executors
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, NamedTuple
+import multiprocessing
 import importlib.util
+import threading
+import tempfile
 import logging
+import json
+import time
 import os
 
 log = logging.getLogger(__name__)
 BUILTIN_EXECUTORS: dict[str, type[BaseExecutor]] = {}
 
+RuntimeVersions = list[tuple[str, tuple[int, ...]]]
+# Path, inode, size and mtime of each versionable command of an executor.
+Fingerprint = list[tuple[str, int, int, int]]
+
+SNAPSHOT_VERSION = 1
+
+# Executors being probed, by id. Probes run in forked processes, which find
+# the executor here instead of unpickling it: external executors are loaded
+# from files and can't be imported by name.
+_probing: dict[str, type[BaseExecutor]] = {}
+
+
+class ProbeResult(NamedTuple):
+    executor_id: str
+    passed: bool
+    runtime_versions: RuntimeVersions
+    elapsed: float
+    error: str | None
+
+
+def _fingerprint(executor: type[BaseExecutor]) -> Fingerprint | None:
+    # None if there is nothing to fingerprint, or a command is missing.
+    fingerprint: Fingerprint = []
+    for _, path in executor.get_versionable_commands():
+        try:
+            path = os.path.realpath(path)
+            stat = os.stat(path)
+        except OSError:
+            return None
+        fingerprint.append((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    return fingerprint or None
+
+
+def _probe(
+    executor_id: str, config: ExecutorConfig, self_test: bool
+) -> ProbeResult:
+    executor = _probing[executor_id]
+    start = time.monotonic()
+    errors: list[str] = []
+
+    try:
+        passed = executor.initialize()
+        if not passed:
+            errors.append("not installed")
+        elif self_test:
+            passed = executor.self_test(config, error_callback=errors.append)
+        versions = executor.get_runtime_versions() if passed else []
+    except Exception as e:
+        passed = False
+        versions = []
+        errors.append("%s: %s" % (type(e).__name__, e))
+
+    return ProbeResult(
+        executor_id,
+        passed,
+        versions,
+        time.monotonic() - start,
+        "; ".join(map(str, errors)) or None,
+    )
+
 
 class ExecutorManager:
-    graders: dict[str, type[BaseExecutor]]
+    executors: dict[str, type[BaseExecutor]]
     config: ExecutorManagerConfig
+    # Executors that passed their probes and their runtime versions; only
+    # these are served once probing has started.
+    ready: dict[str, RuntimeVersions]
+    timings: dict[str, float]
+    # Probe results of previous runs, reused for executors whose commands
+    # haven't changed since; see `_load_snapshot`.
+    snapshot_path: str
+
+    _probed: bool
+    _lock: threading.Lock
+    # Set once every probe is done and the snapshot is saved.
+    _finished: threading.Event
 
     def __init__(self, config: ExecutorManagerConfig):
         self.config = config
-        self.graders = {}
+        self.executors = {}
+        self.ready = {}
+        self.timings = {}
+        self._probed = False
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._finished.set()
+        self.snapshot_path = self.config.snapshot_path or os.path.join(
+            tempfile.gettempdir(), "dmoj-executors.json"
+        )
 
         if self.config.include_builtin:
             self._load_builtin()
@@ -23,19 +112,215 @@ class ExecutorManager:
         for executor_id, executor_path in self.config.external.items():
             self._load_external_executor_module(executor_id, executor_path)
 
-    def __setitem__(self, key: str, executor: BaseExecutor) -> None:
-        assert issubclass(grader, BaseExecutor)
+    def __setitem__(self, key: str, executor: type[BaseExecutor]) -> None:
+        assert issubclass(executor, BaseExecutor)
         assert key not in self.executors
         log.debug(f"Loaded `{key}` executor")
-        self.executors[key] = grader
+        self.executors[key] = executor
 
-    def __getitem__(self, key: str) -> BaseExecutor:
+    def __getitem__(self, key: str) -> type[BaseExecutor]:
+        if self._probed and key not in self.ready:
+            raise InvalidExecutorNameError(key)
         try:
-            return self.graders[key]
+            return self.executors[key]
 
         except KeyError:
             raise InvalidExecutorNameError(key)
 
+    def probe(
+        self,
+        self_test: bool = True,
+        callback: Callable[[ProbeResult], None] | None = None,
+    ) -> None:
+        # Initializes, self-tests and finds the runtime versions of every
+        # executor in a pool of processes, in the background. Executors are
+        # served as soon as they pass; `callback` is called after each one is
+        # done, passed or not.
+        self._probed = True
+        snapshot = self._load_snapshot()
+        fingerprints = {
+            executor_id: _fingerprint(executor)
+            for executor_id, executor in self.executors.items()
+        }
+
+        stale: list[str] = []
+        for executor_id, fingerprint in fingerprints.items():
+            entry = snapshot.get(executor_id)
+            if (
+                fingerprint is None
+                or entry is None
+                or entry["fingerprint"] != fingerprint
+                or (self_test and not entry["self_tested"])
+            ):
+                stale.append(executor_id)
+                continue
+
+            versions = entry["runtime_versions"]
+            log.debug("Executor `%s` is unchanged", executor_id)
+            self.ready[executor_id] = versions
+            self.timings[executor_id] = 0
+            if callback is not None:
+                callback(ProbeResult(executor_id, True, versions, 0, None))
+
+        log.info(
+            "%d executors unchanged since the last probe, %d to probe",
+            len(self.executors) - len(stale),
+            len(stale),
+        )
+        if not stale:
+            return
+
+        _probing.update(self.executors)
+        self._finished.clear()
+        pool = ProcessPoolExecutor(
+            max_workers=min(
+                self.config.probe_processes or os.cpu_count() or 1, len(stale)
+            ),
+            mp_context=multiprocessing.get_context("fork"),
+        )
+        futures = {
+            pool.submit(
+                _probe, executor_id, self.config.executor, self_test
+            ): executor_id
+            for executor_id in stale
+        }
+        threading.Thread(
+            target=self._collect,
+            args=(pool, futures, callback, fingerprints, self_test),
+            daemon=True,
+        ).start()
+
+    def _load_snapshot(self) -> dict[str, dict]:
+        try:
+            with open(self.snapshot_path) as f:
+                data = json.load(f)
+            if data.get("version") != SNAPSHOT_VERSION:
+                return {}
+            return {
+                executor_id: {
+                    "fingerprint": [tuple(item) for item in entry[0]],
+                    "self_tested": entry[1],
+                    "runtime_versions": [
+                        (name, tuple(version)) for name, version in entry[2]
+                    ],
+                }
+                for executor_id, entry in data["executors"].items()
+            }
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, KeyError, IndexError) as e:
+            log.warning("Ignoring executor snapshot: %s", e)
+            return {}
+
+    def _save_snapshot(
+        self, fingerprints: dict[str, Fingerprint | None], self_test: bool
+    ) -> None:
+        # Only executors that passed, and have something to fingerprint, are
+        # kept; everything else is probed again on the next start.
+        snapshot = self._load_snapshot()
+        for executor_id, versions in self.ready.items():
+            fingerprint = fingerprints.get(executor_id)
+            if fingerprint is None:
+                continue
+            entry = snapshot.get(executor_id)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                self_tested = self_test or entry["self_tested"]
+            else:
+                self_tested = self_test
+            snapshot[executor_id] = {
+                "fingerprint": fingerprint,
+                "self_tested": self_tested,
+                "runtime_versions": versions,
+            }
+
+        directory = os.path.dirname(self.snapshot_path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {
+                        "version": SNAPSHOT_VERSION,
+                        "executors": {
+                            executor_id: [
+                                entry["fingerprint"],
+                                entry["self_tested"],
+                                entry["runtime_versions"],
+                            ]
+                            for executor_id, entry in snapshot.items()
+                        },
+                    },
+                    f,
+                )
+            os.replace(temp_path, self.snapshot_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _collect(
+        self, pool, futures, callback, fingerprints, self_test
+    ) -> None:
+        start = time.monotonic()
+        for future in as_completed(futures):
+            try:
+                result: ProbeResult = future.result()
+            except Exception as e:
+                # The probe's process died.
+                result = ProbeResult(
+                    futures[future], False, [], time.monotonic() - start, str(e)
+                )
+
+            self.timings[result.executor_id] = result.elapsed
+            if result.passed:
+                log.info(
+                    "Executor `%s` is ready (%.2fs): %s",
+                    result.executor_id,
+                    result.elapsed,
+                    ", ".join(
+                        "%s %s" % (name, ".".join(map(str, version)))
+                        for name, version in result.runtime_versions
+                    ),
+                )
+            else:
+                log.warning(
+                    "Executor `%s` failed (%.2fs): %s",
+                    result.executor_id,
+                    result.elapsed,
+                    result.error,
+                )
+
+            if result.passed:
+                with self._lock:
+                    self.ready[result.executor_id] = result.runtime_versions
+
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception:
+                    log.exception("Executor probe callback failed")
+
+        pool.shutdown()
+        log.info(
+            "Probed %d executors in %.2fs, %d ready",
+            len(futures),
+            time.monotonic() - start,
+            len(self.ready),
+        )
+        try:
+            self._save_snapshot(fingerprints, self_test)
+        except OSError as e:
+            log.warning("Cannot save executor snapshot: %s", e)
+        self._finished.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        # Waits for every probe to finish, returning whether they did.
+        return self._finished.wait(timeout)
+
+    def runtime_versions(self) -> Executors:
+        with self._lock:
+            if not self._probed:
+                return {executor_id: [] for executor_id in self.executors}
+            return dict(self.ready)
+
     def _load_builtin(self) -> None:
         if self.config.builtin_whitelist and self.config.builtin_blacklist:
             raise InvalidConfigurationError(
@@ -53,8 +338,8 @@ class ExecutorManager:
 
         log.debug("Loading builtin executors")
         blacklisted: list[str] = self.config.builtin_blacklist or []
-        for executor_id, executor in BUILTIN_EXECUTORS:
-            if executor_id in blacklisted:
+        for exec_id, executor in BUILTIN_EXECUTORS.items():
+            if exec_id in blacklisted:
                 continue
             self[exec_id] = executor
         log.debug("Loaded builtin executors")
@@ -0,0 +1,25 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+// Preloaded into submissions. Sizes the buffer of a standard stream from its
+// variable; 0 leaves it unbuffered, and an unset variable leaves it as is.
+static void setbufsize(FILE *stream, const char *name) {
+    const char *value = getenv(name);
+    char *end;
+    long size;
+
+    if (value == NULL || *value == '\0')
+        return;
+    size = strtol(value, &end, 10);
+    if (*end != '\0' || size < 0)
+        return;
+    if (size == 0)
+        setvbuf(stream, NULL, _IONBF, 0);
+    else
+        setvbuf(stream, NULL, _IOFBF, (size_t) size);
+}
+
+__attribute__((constructor)) static void init(void) {
+    setbufsize(stdout, "CPTBOX_STDOUT_BUFFER_SIZE");
+    setbufsize(stderr, "CPTBOX_STDERR_BUFFER_SIZE");
+}
@@ -4,9 +4,10 @@ from ..cptbox import TracedPopen
 from abc import ABCMeta, abstractmethod
 
 
-class BaseGrader(ABCMeta):
+class BaseGrader(metaclass=ABCMeta):
     source: bytes
     problem: Problem
+    execm: ExecutorManager
     executor_type: type[BaseExecutor]
     executor: BaseExecutor
     _current_process: TracedPopen | None
@@ -21,7 +22,9 @@ class BaseGrader(ABCMeta):
         self.source = source
         self.language = language
         self.problem = problem
-        self.binary = self._create_executor()
+        self.execm = execm
+        self.executor_type = execm[language]
+        self.executor = self._create_executor()
         self._abort_requested = False
         self._current_process = None
 
@@ -1,23 +1,74 @@
+from .. import checkers
+from ..cptbox.errors import OutputLimitExceeded
 from ..executors import BaseExecutor
-from ..types import TestCase, Result
+from ..types import TestCase, Result, ResultKind
 from .base import BaseGrader
+from subprocess import PIPE
+import importlib
 
 
 class StandardGrader(BaseGrader):
     def grade(self, case: TestCase) -> Result:
-        result = Result(case)
+        result = Result.for_case(case)
 
-        error = None
+        self._launch_process()
+        error = self._interact_with_process(case, result)
 
         assert self._current_process is not None
         self.executor.populate_result(error, result, self._current_process)
+        self._current_process = None
 
-        check = self.check_result(case, result)
+        if self.check_result(case, result):
+            result.points = case.points
+        else:
+            result.result_flag |= ResultKind.WA.value[0]
+        return result
 
-        # if not isinstance(check, CheckerResult):
+    def _launch_process(self) -> None:
+        time_limit = self.problem.time_limit
+        self._current_process = self.executor.launch(
+            time_limit=time_limit,
+            memory_limit=self.problem.memory_limit,
+            wall_time=time_limit * self.problem.config.wall_time_factor,
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=PIPE,
+            symlinks=self.problem.config.symlinks,
+        )
+
+    def _interact_with_process(self, case: TestCase, result: Result) -> bytes:
+        process = self._current_process
+        assert process is not None
+        data = self.problem.data_manager
+        try:
+            result.proc_output, error = process.communicate(
+                data[case.config._in] if case.config._in else b"",
+                outlimit=self.problem.config.output_limit_length,
+                errlimit=1048576,
+            )
+        except OutputLimitExceeded:
+            error = b""
+            process.kill()
+        finally:
+            process.wait()
+        return error
+
+    def check_result(self, case: TestCase, result: Result) -> bool:
+        # Checkers may be expensive, so output that can't pass isn't checked.
+        if result.result_flag:
+            return False
+        checker = importlib.import_module(
+            f"{checkers.__name__}.{self.problem.config.checker}"
+        )
+        data = self.problem.data_manager
+        return checker.check(
+            result.proc_output,
+            data[case.config.out] if case.config.out else b"",
+        )
 
     def _create_executor(self) -> BaseExecutor:
         return self.executor_type(
+            self.execm.config.executor,
             self.problem.id,
             self.source,
             hints=self.problem.config.hints or [],
@@ -1,14 +1,21 @@
 from ..pm import PacketManager, Packet
-from ..types import Submission
+from ..types import Submission, Problem
 from ..problems import ProblemManager
+from ..executors import ExecutorManager
+from ..graders import GraderManager
 from typing import Callable, Any
-from threading import Thread, Lock, Event
+from threading import Thread, Lock, Event, Condition
+from collections import deque
 from ..config import Config
-from ..types import Result
+from ..errors import InvalidInitError
+from ..storage import Prefetcher, PrefetchPlan
+from ..types import Result, GradingStats
 from ..rc import load_fair, cpu_count
 from .worker import JudgeWorker, IPCMessage
+from .ordering import CaseStatistics
 import logging
 import time
+import sys
 
 
 log = logging.getLogger(__name__)
@@ -17,32 +24,72 @@ log = logging.getLogger(__name__)
 class Judge:
     pm: PacketManager
     probm: ProblemManager
+    graderm: GraderManager
+    execm: ExecutorManager
 
     config: Config
     report_callbacks: list[Callable[[], tuple[str, Any]]]
 
     worker: JudgeWorker | None
+    prefetcher: Prefetcher | None
+    case_stats: CaseStatistics | None
+
+    # Submissions waiting for the current one to finish grading.
+    _queue: deque[Submission]
+    _queue_cond: Condition
 
     _grading_lock: Lock
     _grading_handle: Thread | None
     _receiver_handle: Thread | None
+    _dispatcher_handle: Thread | None
 
     def __init__(
-        self, config: Config, pm: PacketManager, probm: ProblemManager
+        self,
+        config: Config,
+        pm: PacketManager,
+        probm: ProblemManager,
+        graderm: GraderManager,
+        execm: ExecutorManager,
     ) -> None:
         self.pm = pm
         self.probm = probm
+        self.graderm = graderm
+        self.execm = execm
 
         self.config = config
         self.report_callbacks = [load_fair, cpu_count]
 
         self.worker = None
+        self.prefetcher = (
+            Prefetcher(config.prefetch_budget)
+            if config.prefetch_budget > 0
+            else None
+        )
+
+        self.case_stats = (
+            CaseStatistics(config.case_stats_dir)
+            if config.adaptive_case_order
+            else None
+        )
+
+        self._queue = deque()
+        self._queue_cond = Condition()
 
         self._grading_handle = None
         self._receiver_handle = None
+        self._dispatcher_handle = None
         self._grading_lock = Lock()
 
     def start(self) -> None:
+        self.probm.start_indexing()
+        if self.prefetcher is not None:
+            self.prefetcher.start()
+
+        self._dispatcher_handle = Thread(
+            target=self._dispatcher_thread, daemon=True
+        )
+        self._dispatcher_handle.start()
+
         self._receiver_handle = Thread(target=self._receiver_thread)
         self._receiver_handle.start()
 
@@ -87,14 +134,14 @@ class Judge:
                         meta=packet["meta"],
                     )
 
-                    self.begin_grading(submission)
-
                     log.info(
                         "Accepted submission: %d, executor: %s, code: %s",
                         submission.id,
                         submission.language,
                         submission.problem_id,
                     )
+
+                    self.queue_submission(submission)
                 case "terminate-submission":
                     raise NotImplementedError("terminate-submission packet")
                 case "disconnect":
@@ -107,6 +154,46 @@ class Judge:
                         packet,
                     )
 
+    def queue_submission(self, submission: Submission) -> None:
+        with self._queue_cond:
+            self._queue.append(submission)
+            self._queue_cond.notify()
+
+        # Scheduled in queue order, so the data of the submission that is
+        # graded next is always warmed first.
+        if self.prefetcher is not None:
+            self.prefetcher.schedule(
+                submission.id, lambda: self._prefetch_plan(submission)
+            )
+
+    def _prefetch_plan(self, submission: Submission) -> PrefetchPlan:
+        # On the prefetcher's thread, rather than the receiver's. The problem
+        # is loaded again once it is graded, in case it is updated meanwhile.
+        try:
+            problem = self._load_problem(submission)
+        except (InvalidInitError, KeyError):
+            # Reported once it is graded.
+            return None
+        return problem.data_manager.prefetch, problem.data_files()
+
+    def _dispatcher_thread(self) -> None:
+        while True:
+            with self._queue_cond:
+                while not self._queue:
+                    self._queue_cond.wait()
+                submission = self._queue.popleft()
+
+            # Blocks until the previous submission finishes grading.
+            self.begin_grading(submission)
+
+    def _load_problem(self, submission: Submission) -> Problem:
+        return self.probm.load_problem(
+            submission.problem_id,
+            time_limit=submission.time_limit,
+            memory_limit=submission.memory_limit,
+            meta=submission.meta,
+        )
+
     def _grading_thread(self, ipc_ready_signal: Event) -> None:
         assert self.worker is not None
         submission_id: int = self.worker.submission.id
@@ -147,6 +234,15 @@ class Judge:
                             }
                         )
                     case IPCMessage.GRADING_END:
+                        stats: GradingStats = msg_data[0]
+                        log.info(
+                            "Submission %d ran %d cases, skipped %d, reused %d (~%.3fs of CPU time saved)",
+                            submission_id,
+                            stats.cases_run,
+                            stats.cases_skipped,
+                            stats.cases_reused,
+                            stats.saved_cpu_time,
+                        )
                         self.pm.lazy_send_packet(
                             {
                                 "name": "grading-end",
@@ -206,6 +302,9 @@ class Judge:
                 % (type(e).__name__, str(e))
             )
         finally:
+            if self.prefetcher is not None:
+                self.prefetcher.release(submission_id)
+
             # TODO: wait_with_timeout
             self.worker = None
             ipc_ready_signal.set()
@@ -247,6 +346,22 @@ class Judge:
         self._grading_lock.acquire()
         assert self.worker is None
 
+        try:
+            problem = self._load_problem(submission)
+        except (InvalidInitError, KeyError) as e:
+            log.exception("Failed loading problem `%s`", submission.problem_id)
+            self.pm.lazy_send_packet(
+                {
+                    "name": "internal-error",
+                    "submission-id": submission.id,
+                    "message": "%s: %s" % (type(e).__name__, e),
+                }
+            )
+            if self.prefetcher is not None:
+                self.prefetcher.release(submission.id)
+            self._grading_lock.release()
+            return
+
         log.info(
             "Started grading [%s]:%d in %s...",
             submission.problem_id,
@@ -255,13 +370,7 @@ class Judge:
         )
 
         self.worker = JudgeWorker(
-            submission,
-            self.probm.load_problem(
-                submission.problem_id,
-                time_limit=submission.time_limit,
-                memory_limit=submission.memory_limit,
-                meta=submission.meta,
-            ),
+            submission, problem, self.graderm, self.execm, self.case_stats
         )
         self.worker.start()
 
@@ -277,6 +386,7 @@ class Judge:
         raise NotImplementedError("abort-grading")
 
     def shutdown(self):
+        self.probm.stop_indexing()
         self.pm.close()
         self.abort_grading()
         # TODO: Find a way to remove this
@@ -0,0 +1,175 @@
+from ..types import BaseTestCase, BatchedTestCase, ExecutionPlan, TestCase
+from typing import NamedTuple
+import tempfile
+import logging
+import random
+import heapq
+import fcntl
+import json
+import os
+
+log = logging.getLogger(__name__)
+
+# Cases that ran fewer times than this are ranked mostly by the prior.
+_PRIOR_RUNS = 2
+# Floor for the expected CPU time of a case, so that trivially fast cases
+# don't get infinite priority.
+_MIN_CPU_TIME = 0.01
+# Short-circuited grading only records the cases that ran before the first
+# failure, so some cases are never learned about in the usual order. This
+# fraction of submissions runs in a random order instead, to sample them too.
+EXPLORE_RATE = 0.1
+
+
+class CaseRecord(NamedTuple):
+    runs: int
+    failures: int
+    cpu_time: float
+
+    @property
+    def failure_rate(self) -> float:
+        # Smoothed towards 1/2, so unseen cases are neither first nor last.
+        return (self.failures + _PRIOR_RUNS / 2) / (self.runs + _PRIOR_RUNS)
+
+    @property
+    def mean_cpu_time(self) -> float:
+        if not self.runs:
+            return _MIN_CPU_TIME
+        return max(self.cpu_time / self.runs, _MIN_CPU_TIME)
+
+
+_UNSEEN = CaseRecord(0, 0, 0)
+
+
+def case_key(case: TestCase) -> str:
+    # Positions shift when cases are added or removed; the data files don't.
+    # Cases without any, e.g. generated ones, have only their position.
+    if not case.config._in and not case.config.out:
+        return "#%d" % case.position
+    return "%s:%s" % (case.config._in, case.config.out)
+
+
+# Per-problem statistics of how often each case rejects a submission, and how
+# much CPU time it takes. They are shared by every worker (and judge on the
+# host), so they are kept on disk and updated under a lock.
+class CaseStatistics:
+    root: str
+
+    def __init__(self, root: str | None = None) -> None:
+        self.root = root or os.path.join(
+            tempfile.gettempdir(), "dmoj-case-stats"
+        )
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, problem_id: str) -> str:
+        return os.path.join(self.root, problem_id + ".json")
+
+    def load(self, problem_id: str) -> dict[str, CaseRecord]:
+        try:
+            with open(self._path(problem_id)) as f:
+                return {
+                    key: CaseRecord(*record)
+                    for key, record in json.load(f).items()
+                }
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("Ignoring case statistics of %s: %s", problem_id, e)
+            return {}
+
+    def record(
+        self, problem_id: str, outcomes: list[tuple[TestCase, int, float]]
+    ) -> None:
+        # `outcomes` holds the result flag and CPU time of every case that
+        # ran.
+        if not outcomes:
+            return
+
+        path = self._path(problem_id)
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            records = self.load(problem_id)
+            for case, result_flag, cpu_time in outcomes:
+                key = case_key(case)
+                runs, failures, total_cpu_time = records.get(key, _UNSEEN)
+                records[key] = CaseRecord(
+                    runs + 1,
+                    failures + bool(result_flag),
+                    total_cpu_time + cpu_time,
+                )
+
+            temp_path = path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(records, f)
+            os.replace(temp_path, path)
+
+
+def _priority(cases: tuple[TestCase, ...], records: dict[str, CaseRecord]):
+    # Expected rejections per second of CPU time; the higher, the sooner a
+    # wrong submission is rejected.
+    passing = 1.0
+    cost = 0.0
+    for case in cases:
+        record = records.get(case_key(case), _UNSEEN)
+        passing *= 1 - record.failure_rate
+        cost += record.mean_cpu_time
+    return (1 - passing) / cost
+
+
+def order_cases(
+    plan: ExecutionPlan,
+    phase: tuple[BaseTestCase, ...],
+    records: dict[str, CaseRecord],
+    explore: bool = False,
+) -> list[BaseTestCase]:
+    # Reorders the top level of a phase of the plan (and the cases inside
+    # each batch) so that the cases most likely to reject a submission, per
+    # CPU second, run first; with `explore`, at random. Batches still run
+    # after the batches they depend on, which are always in the same phase.
+    def priority(cases: tuple[TestCase, ...]) -> float:
+        return random.random() if explore else _priority(cases, records)
+
+    def sort_key(case: TestCase) -> float:
+        return -priority((case,))
+
+    def prepare(case: BaseTestCase) -> BaseTestCase:
+        if not isinstance(case, BatchedTestCase):
+            return case
+        return BatchedTestCase(
+            case.config,
+            case.points,
+            case.batch_no,
+            tuple(sorted(case.cases, key=sort_key)),
+            case.dependencies,
+        )
+
+    waiting: dict[int, int] = {}
+    ready: list[tuple[float, int, BaseTestCase]] = []
+    for index, case in enumerate(phase):
+        if isinstance(case, BatchedTestCase) and case.dependencies:
+            waiting[case.batch_no] = len(case.dependencies)
+            continue
+        cases = case.cases if isinstance(case, BatchedTestCase) else (case,)
+        heapq.heappush(ready, (-priority(cases), index, case))
+
+    by_batch = {
+        case.batch_no: (index, case)
+        for index, case in enumerate(phase)
+        if isinstance(case, BatchedTestCase)
+    }
+
+    ordered: list[BaseTestCase] = []
+    while ready:
+        _, _, case = heapq.heappop(ready)
+        ordered.append(prepare(case))
+        if not isinstance(case, BatchedTestCase):
+            continue
+
+        for dependent in plan.dependents.get(case.batch_no, ()):
+            waiting[dependent] -= 1
+            if not waiting[dependent]:
+                index, batch = by_batch[dependent]
+                heapq.heappush(ready, (-priority(batch.cases), index, batch))
+
+    assert len(ordered) == len(phase)
+    return ordered
@@ -1,10 +1,24 @@
-from ..types import Submission, Problem
+from ..types import (
+    Submission,
+    Problem,
+    Result,
+    ResultKind,
+    GradingStats,
+    TestCase,
+    BatchedTestCase,
+    ExecutionPlan,
+)
+from ..executors import ExecutorManager
+from ..graders import GraderManager, BaseGrader
+from ..errors import CompileError
+from .ordering import CaseStatistics, order_cases, EXPLORE_RATE
 from multiprocessing.connection import Connection
 from multiprocessing import Process, Pipe
 from typing import Generator, Any
 from threading import Thread
 from enum import Enum, auto
 import traceback
+import random
 import logging
 import sys
 
@@ -34,18 +48,37 @@ class IPCMessage(Enum):
 class JudgeWorker:
     submission: Submission
     problem: Problem
+    graders: GraderManager
+    executors: ExecutorManager
+    case_stats: CaseStatistics | None
     process: Process | None
     _conn: Connection | None
 
-    def __init__(self, submission: Submission, problem: Problem) -> None:
+    def __init__(
+        self,
+        submission: Submission,
+        problem: Problem,
+        graders: GraderManager,
+        executors: ExecutorManager,
+        case_stats: CaseStatistics | None = None,
+    ) -> None:
         self.submission = submission
         self.problem = problem
+        self.graders = graders
+        self.executors = executors
+        self.case_stats = case_stats
         self.process = None
         self._conn = None
 
     def start(self) -> None:
         assert self.process is None
-        handler = WorkerHandler(self.submission, self.problem)
+        handler = WorkerHandler(
+            self.submission,
+            self.problem,
+            self.graders,
+            self.executors,
+            self.case_stats,
+        )
         self._conn, child_conn = Pipe()
         self.process = Process(
             name="DMOJ Judge Handler for %s/%d"
@@ -100,12 +133,32 @@ class JudgeWorker:
 class WorkerHandler:
     submission: Submission
     problem: Problem
+    graders: GraderManager
+    executors: ExecutorManager
+    # Set when adaptive case ordering is enabled.
+    case_stats: CaseStatistics | None
     _aborted: bool
+    # Main test positions to the positions of identical pretests, and the
+    # results of those pretests once they ran.
+    _reused_from: dict[int, int]
+    _pretest_results: dict[int, Result | None]
 
-    def __init__(self, submission: Submission, problem: Problem):
+    def __init__(
+        self,
+        submission: Submission,
+        problem: Problem,
+        graders: GraderManager,
+        executors: ExecutorManager,
+        case_stats: CaseStatistics | None = None,
+    ):
         self.submission = submission
         self.problem = problem
+        self.graders = graders
+        self.executors = executors
+        self.case_stats = case_stats
         self._aborted = False
+        self._reused_from = {}
+        self._pretest_results = {}
 
     @staticmethod
     def _report_unhandled_exception(conn: Connection) -> None:
@@ -163,8 +216,163 @@ class WorkerHandler:
             pass
 
     def grade_cases(self) -> Generator[tuple[IPCMessage, tuple], None, None]:
-        # TODO: Get grader
-        yield IPCMessage.GRADING_BEGIN, (False,)
-        # yield IPCMessage.GRADING_BEGIN, (self.problem.pretests_only)
+        try:
+            grader: BaseGrader = self.graders[self.problem.config.grader](
+                self.executors,
+                self.problem,
+                self.submission.language,
+                self.submission.source.encode("utf-8"),
+            )
+        except CompileError as e:
+            yield IPCMessage.COMPILE_ERROR, (str(e),)
+            return
+
+        plan = self.problem.plan
+        records = (
+            self.case_stats.load(self.problem.id)
+            if self.case_stats is not None and self.submission.short_circuit
+            else None
+        )
+        explore = records is not None and random.random() < EXPLORE_RATE
+        pretests = len(plan.phases) > 1
+        self._reused_from = self._identical_pretests(plan) if pretests else {}
+        self._pretest_results = dict.fromkeys(self._reused_from.values())
+
+        stats = GradingStats()
+        outcomes: list[tuple[TestCase, int, float]] = []
+        # Batches that failed, or were skipped, so far; batches depending on
+        # any of them can't be awarded points and are skipped.
+        failed_batches: set[int] = set()
+        short_circuited = False
+
+        yield IPCMessage.GRADING_BEGIN, (self.problem.pretests_only,)
+        for phase_no, phase in enumerate(plan.phases):
+            # Only the verdict matters when short-circuiting, so the cases
+            # most likely to reject the submission can run first. Results
+            # are still reported at their canonical positions.
+            if records is not None:
+                phase = order_cases(plan, phase, records, explore)
+
+            phase_failed = False
+            for case in phase:
+                if self._aborted:
+                    yield IPCMessage.GRADING_ABORTED, ()
+                    return
+
+                if isinstance(case, BatchedTestCase):
+                    yield IPCMessage.BATCH_BEGIN, (case.batch_no,)
+                    skip = short_circuited or any(
+                        dep in failed_batches for dep in case.dependencies
+                    )
+                    for sub_case in case.cases:
+                        if self._aborted:
+                            yield IPCMessage.GRADING_ABORTED, ()
+                            return
+
+                        # A batch is all-or-nothing, so the rest of it is
+                        # skipped after its first failure.
+                        result = self._grade_case(
+                            grader, sub_case, skip, stats, outcomes
+                        )
+                        if result.result_flag:
+                            skip = True
+                            failed_batches.add(case.batch_no)
+                        yield IPCMessage.RESULT, (
+                            case.batch_no,
+                            sub_case.position,
+                            result,
+                        )
+                    yield IPCMessage.BATCH_END, (case.batch_no,)
+                    failed = case.batch_no in failed_batches
+                else:
+                    assert isinstance(case, TestCase)
+                    result = self._grade_case(
+                        grader, case, short_circuited, stats, outcomes
+                    )
+                    yield IPCMessage.RESULT, (None, case.position, result)
+                    failed = bool(result.result_flag)
+
+                if failed:
+                    phase_failed = True
+                    if self.submission.short_circuit:
+                        short_circuited = True
+
+            # Failing a pretest stops grading before the main tests, unless
+            # the problem asks for them to run regardless.
+            if (
+                pretests
+                and phase_no == 0
+                and phase_failed
+                and self.problem.config.short_circuit
+            ):
+                short_circuited = True
+
+        if self.case_stats is not None:
+            try:
+                self.case_stats.record(self.problem.id, outcomes)
+            except OSError:
+                log.exception("Failed to record case statistics")
+
+        yield IPCMessage.GRADING_END, (stats,)
+
+    def _identical_pretests(self, plan: ExecutionPlan) -> dict[int, int]:
+        # Maps the position of every main test whose data is byte-identical
+        # to a pretest's to the position of that pretest.
+        data_manager = self.problem.data_manager
+
+        def key(case: TestCase) -> tuple | None:
+            try:
+                return (
+                    case.config._in and data_manager.identity(case.config._in),
+                    case.config.out and data_manager.identity(case.config.out),
+                    case.has_binary_data,
+                )
+            except KeyError:
+                return None
+
+        pretest_count = sum(
+            len(case.cases) if isinstance(case, BatchedTestCase) else 1
+            for case in plan.phases[0]
+        )
+        pretests: dict[tuple, int] = {}
+        for case in plan.cases[:pretest_count]:
+            case_key = key(case)
+            if case_key is not None:
+                pretests.setdefault(case_key, case.position)
+
+        reused_from: dict[int, int] = {}
+        for case in plan.cases[pretest_count:]:
+            case_key = key(case)
+            if case_key is not None and case_key in pretests:
+                reused_from[case.position] = pretests[case_key]
+        return reused_from
+
+    def _grade_case(
+        self,
+        grader: BaseGrader,
+        case: TestCase,
+        skip: bool,
+        stats: GradingStats,
+        outcomes: list[tuple[TestCase, int, float]],
+    ) -> Result:
+        if skip:
+            stats.cases_skipped += 1
+            result = Result.for_case(case)
+            result.result_flag = ResultKind.SC.value[0]
+            return result
+
+        pretest = self._reused_from.get(case.position)
+        reused = (
+            self._pretest_results.get(pretest) if pretest is not None else None
+        )
+        if reused is not None:
+            stats.cases_reused += 1
+            return reused.reused_for(case)
 
-        yield IPCMessage.GRADING_END, ()
+        result = grader.grade(case)
+        stats.cases_run += 1
+        stats.cpu_time += result.execution_time
+        outcomes.append((case, result.result_flag, result.execution_time))
+        if case.position in self._pretest_results:
+            self._pretest_results[case.position] = result
+        return result
@@ -1,9 +1,18 @@
-from .types import Problems, Problem, ProblemDataManager
+from .types import Problems, Problem, ProblemDataManager, ExecutionPlan
 from .config import Config, ProblemConfig
 from .errors import InvalidInitError
+from .storage import (
+    ContentStore,
+    DataCache,
+    ZipArchive,
+    ProblemPack,
+    InvalidPackError,
+    PACK_SUFFIX,
+)
 
 from yaml.parser import ParserError
 from yaml.scanner import ScannerError
+from threading import Event, Thread
 from typing import Any
 import zipfile
 import logging
@@ -11,7 +20,6 @@ import yaml
 import glob
 import os
 
-
 log = logging.getLogger(__name__)
 
 
@@ -22,11 +30,53 @@ class ProblemManager:
     #         this method)
     problems: Problems
     problems_dirs: dict[str, str]
+    data_cache: DataCache
+    store: ContentStore
+    # Parsed `init.yml` and compiled execution plans (keyed by whether only
+    # pretests run) of every problem, along with the version of `init.yml`
+    # they were built from.
+    _parsed: dict[str, tuple[tuple, ProblemConfig, dict[bool, ExecutionPlan]]]
+    # Archive and pack readers, keyed by path; see `_get_indexed`.
+    _indexed: dict[str, tuple[tuple[int, int, int], ZipArchive | ProblemPack]]
+    # See `start_indexing`.
+    _indexer: Thread | None
+    _stop_indexing: Event
 
     def __init__(self, config: Config):
         self.config = config
+        self.data_cache = DataCache(
+            config.problem_data_cache_dir, config.problem_data_cache_size
+        )
+        self.store = ContentStore(
+            config.problem_store_dir,
+            config.problem_store_dedupe,
+            config.problem_hash_threads,
+        )
+        self._parsed = {}
+        self._indexed = {}
+        self._indexer = None
+        self._stop_indexing = Event()
         self.load_problems()
 
+    def start_indexing(self) -> None:
+        # Indexes problems in the background, once the judge starts rather
+        # than whenever a manager is built.
+        if self._indexer is not None:
+            return
+        self._stop_indexing.clear()
+        self._indexer = Thread(
+            target=self.index_problems, name="problem-indexer", daemon=True
+        )
+        self._indexer.start()
+
+    def stop_indexing(self) -> None:
+        # Takes effect between problems.
+        if self._indexer is None:
+            return
+        self._stop_indexing.set()
+        self._indexer.join()
+        self._indexer = None
+
     def get_problem_root(self, id: str) -> str:
         return self.problems_dirs[id]
 
@@ -56,6 +106,55 @@ class ProblemManager:
                 self.problems_dirs[problem] = problem_dir
                 self.problems.append((problem, os.path.getmtime(problem_dir)))
 
+            # Problem packs are accepted wherever a problem directory is.
+            for problem_pack in glob.iglob(
+                dir_glob.rstrip("/") + PACK_SUFFIX, recursive=True
+            ):
+                if not os.access(problem_pack, os.R_OK):
+                    continue
+                problem = os.path.basename(problem_pack)[: -len(PACK_SUFFIX)]
+
+                if problem in self.problems_dirs:
+                    log.warning(
+                        "Duplicate problem %s found at %s, ignoring in favour of %s",
+                        problem,
+                        problem_pack,
+                        self.problems_dirs[problem],
+                    )
+                    continue
+
+                self.problems_dirs[problem] = problem_pack
+                self.problems.append((problem, os.path.getmtime(problem_pack)))
+
+    def index_problems(self) -> None:
+        # Builds content manifests of every problem directory in the
+        # background; packs carry their own digests.
+        for problem, root in list(self.problems_dirs.items()):
+            if self._stop_indexing.is_set():
+                return
+            if root.endswith(PACK_SUFFIX):
+                continue
+            try:
+                self.store.index(problem, root)
+            except OSError as e:
+                log.warning("Failed to index problem %s: %s", problem, e)
+
+    def _get_indexed(self, path: str, pack: bool) -> ZipArchive | ProblemPack:
+        stat = os.stat(path)
+        identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        cached = self._indexed.get(path)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+
+        # Replaced files are simply dropped; slices handed out from the old
+        # mapping stay valid until their last reference goes away.
+        indexed = (
+            ProblemPack(path) if pack else ZipArchive(path, self.data_cache)
+        )
+        self._indexed[path] = (identity, indexed)
+        return indexed
+
     def load_problem(
         self,
         id: str,
@@ -66,25 +165,40 @@ class ProblemManager:
         if not meta:
             meta = {}
 
-        dmanager = ProblemDataManager(self.get_problem_root(id))
+        root: str = self.get_problem_root(id)
         try:
-            init: dict[str, Any] | Any = yaml.safe_load(dmanager["init.yml"])
-            if not init:
-                raise InvalidInitError(
-                    "`init.yml` file of problem `%s` is empty" % (id,)
-                )
-            assert isinstance(init, dict)
-        except (
-            IOError,
-            KeyError,
-            ParserError,
-            ScannerError,
-            AssertionError,
-        ) as e:
+            dmanager = ProblemDataManager(
+                root,
+                (
+                    self._get_indexed(root, pack=True)
+                    if root.endswith(PACK_SUFFIX)
+                    else None
+                ),
+                self.data_cache,
+                self.store.manifest(id),
+            )
+        except (IOError, InvalidPackError) as e:
+            raise InvalidInitError.from_exception(e)
+
+        try:
+            version = dmanager.identity("init.yml")
+        except KeyError as e:
             raise InvalidInitError.from_exception(e)
 
-        config = ProblemConfig(**init)
+        parsed = self._parsed.get(id)
+        if parsed is None or parsed[0] != version:
+            parsed = self._parsed[id] = (
+                version,
+                self._parse_init(id, dmanager),
+                {},
+            )
+        _, config, plans = parsed
+
         if config.archive:
+            if dmanager.pack is not None:
+                raise InvalidInitError(
+                    "archives inside problem packs are not supported"
+                )
             archive_path: str = os.path.join(dmanager.root_path, config.archive)
             if not os.path.exists(archive_path):
                 raise InvalidInitError(
@@ -92,10 +206,17 @@ class ProblemManager:
                 )
 
             try:
-                dmanager.archive = zipfile.ZipFile(archive_path)
+                dmanager.archive = self._get_indexed(archive_path, pack=False)
             except zipfile.BadZipFile as e:
                 raise InvalidInitError.from_exception(e)
 
+        pretests_only = bool(meta.get("pretests_only", False))
+        plan = plans.get(pretests_only)
+        if plan is None:
+            plan = plans[pretests_only] = Problem.compile_plan(
+                config, pretests_only
+            )
+
         return Problem(
             id=id,
             time_limit=time_limit,
@@ -103,4 +224,26 @@ class ProblemManager:
             meta=meta,
             config=config,
             data_manager=dmanager,
+            plan=plan,
         )
+
+    def _parse_init(
+        self, id: str, dmanager: ProblemDataManager
+    ) -> ProblemConfig:
+        try:
+            init: dict[str, Any] | Any = yaml.safe_load(dmanager["init.yml"])
+            if not init:
+                raise InvalidInitError(
+                    "`init.yml` file of problem `%s` is empty" % (id,)
+                )
+            assert isinstance(init, dict)
+        except (
+            IOError,
+            KeyError,
+            ParserError,
+            ScannerError,
+            AssertionError,
+        ) as e:
+            raise InvalidInitError.from_exception(e)
+
+        return ProblemConfig(**init)
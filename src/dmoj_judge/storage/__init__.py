@@ -0,0 +1,7 @@
+from .cache import DataCache
+from .archive import ZipArchive
+from .pack import ProblemPack, InvalidPackError, write_pack, PACK_SUFFIX
+from .normalize import normalize_chunks, read_chunks, NORMALIZE_CHUNK_SIZE
+from .prefetch import Prefetcher, PrefetchPlan, willneed
+from .manifest import Manifest, ManifestEntry, hash_file
+from .store import ContentStore
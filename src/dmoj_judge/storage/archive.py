@@ -0,0 +1,163 @@
+from .cache import DataCache
+from .prefetch import willneed
+from threading import Lock
+from typing import NamedTuple
+import zipfile
+import struct
+import mmap
+import zlib
+import io
+import os
+
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_MAGIC = b"PK\003\004"
+
+
+class ZipMember(NamedTuple):
+    compress_type: int
+    compress_size: int
+    file_size: int
+    header_offset: int
+    crc: int
+
+
+class ZipArchive:
+    # Without a data cache, inflated members are kept in memory, least
+    # recently used first, up to this many.
+    max_inflated = 8
+
+    path: str
+    members: dict[str, ZipMember]
+    cache: DataCache | None
+    _map: mmap.mmap | None
+    _offsets: dict[str, int]
+    _inflated: dict[str, memoryview]
+    _lock: Lock
+
+    def __init__(self, path: str, cache: DataCache | None = None) -> None:
+        self.path = path
+        self.cache = cache
+        self._offsets = {}
+        self._inflated = {}
+        self._lock = Lock()
+
+        # The central directory is parsed exactly once, here; member reads
+        # never go through `zipfile` again.
+        with zipfile.ZipFile(path) as archive:
+            self.members = {
+                info.filename: ZipMember(
+                    info.compress_type,
+                    info.compress_size,
+                    info.file_size,
+                    info.header_offset,
+                    info.CRC,
+                )
+                for info in archive.infolist()
+                if not info.is_dir()
+            }
+            if any(info.flag_bits & 0x1 for info in archive.infolist()):
+                raise zipfile.BadZipFile("encrypted archives are not supported")
+
+        stat = os.stat(path)
+        self._identity = (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with open(path, "rb") as f:
+            self._map = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if stat.st_size
+                else None
+            )
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def identity(self, name: str) -> tuple:
+        return ("zip", *self._identity, name)
+
+    def _data_offset(self, name: str, member: ZipMember) -> int:
+        offset = self._offsets.get(name)
+        if offset is not None:
+            return offset
+
+        assert self._map is not None
+        header = LOCAL_HEADER.unpack_from(self._map, member.header_offset)
+        if header[0] != LOCAL_HEADER_MAGIC:
+            raise zipfile.BadZipFile("bad local file header for `%s`" % name)
+
+        name_length, extra_length = header[-2:]
+        offset = self._offsets[name] = (
+            member.header_offset
+            + LOCAL_HEADER.size
+            + name_length
+            + extra_length
+        )
+        return offset
+
+    def _raw(self, name: str, member: ZipMember) -> memoryview:
+        if not member.compress_size:
+            return memoryview(b"")
+        assert self._map is not None
+        offset = self._data_offset(name, member)
+        return memoryview(self._map)[offset : offset + member.compress_size]
+
+    def _inflate(self, name: str, member: ZipMember) -> bytes:
+        if member.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(self._raw(name, member), -zlib.MAX_WBITS)
+        else:
+            # bzip2/lzma members are rare enough that it isn't worth decoding
+            # them by hand.
+            with zipfile.ZipFile(self.path) as archive:
+                return archive.read(name)
+
+        if zlib.crc32(data) != member.crc:
+            raise zipfile.BadZipFile("bad CRC-32 for `%s`" % name)
+        return data
+
+    def view(self, name: str) -> memoryview:
+        try:
+            member = self.members[name]
+        except KeyError:
+            raise KeyError(
+                'File "%s" could not be found in "%s"' % (name, self.path)
+            )
+
+        # Stored members are zero-copy slices of the mapped archive.
+        if member.compress_type == zipfile.ZIP_STORED:
+            return self._raw(name, member)
+
+        with self._lock:
+            # The data cache bounds the mappings it keeps open itself.
+            if self.cache is not None:
+                key = DataCache.make_key(*self.identity(name))
+                view = self.cache.view(key)
+                if view is None:
+                    view = self.cache.put(key, self._inflate(name, member))
+                return view
+
+            view = self._inflated.pop(name, None)
+            if view is None:
+                view = memoryview(self._inflate(name, member))
+                if len(self._inflated) >= self.max_inflated:
+                    del self._inflated[next(iter(self._inflated))]
+            self._inflated[name] = view
+            return view
+
+    def open(self, name: str) -> io.BytesIO:
+        return io.BytesIO(self.view(name))
+
+    def prefetch(self, name: str) -> int:
+        member = self.members[name]
+        if member.compress_type == zipfile.ZIP_STORED:
+            if not member.file_size:
+                return 0
+            return willneed(
+                self.path, self._data_offset(name, member), member.file_size
+            )
+
+        # Compressed members are warmed by inflating them into the data cache.
+        if self.cache is not None:
+            key = DataCache.make_key(*self.identity(name))
+            if self.cache.view(key) is not None:
+                return 0
+        elif name in self._inflated:
+            return 0
+        return len(self.view(name))
@@ -0,0 +1,141 @@
+from threading import Lock
+import contextlib
+import tempfile
+import hashlib
+import logging
+import mmap
+import os
+
+log = logging.getLogger(__name__)
+
+
+# Derived problem data (inflated archive members, normalized test files, ...)
+# is kept on disk rather than in memory: every submission is graded in a
+# freshly forked worker, so anything cached in the worker's memory is lost as
+# soon as the submission finishes. Files in this directory are shared by every
+# worker (and every judge instance on the host), and stay in the page cache
+# while they are hot.
+class DataCache:
+    # Entries are evicted least recently used first, down to this fraction
+    # of the limit, so that the directory is only walked now and then.
+    trim_ratio = 0.9
+    # Mappings kept open, least recently used first.
+    max_views = 64
+    # Entries being written have this prefix until renamed into place.
+    temp_prefix = ".tmp-"
+
+    root: str
+    size_limit: int
+    _views: dict[str, memoryview]
+    # Our estimate of the entries' total size; other processes add to it too,
+    # so it is only exact right after walking the directory. None until then.
+    _size: int | None
+    _lock: Lock
+
+    def __init__(self, root: str | None = None, size_limit: int = 1024):
+        self.root = root or os.path.join(
+            tempfile.gettempdir(), "dmoj-data-cache"
+        )
+        # Configured in MiB.
+        self.size_limit = size_limit * 1024 * 1024
+        self._views = {}
+        self._size = None
+        self._lock = Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: object) -> str:
+        return hashlib.blake2b(
+            "\0".join(map(str, parts)).encode("utf-8"), digest_size=20
+        ).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def view(self, key: str) -> memoryview | None:
+        path = self._path(key)
+        with self._lock:
+            view = self._views.pop(key, None)
+            if view is not None:
+                self._views[key] = view
+                self._touch(path)
+                return view
+
+            try:
+                with open(path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size:
+                        view = memoryview(
+                            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                        )
+                    else:
+                        view = memoryview(b"")
+            except FileNotFoundError:
+                return None
+
+            self._touch(path)
+            if len(self._views) >= self.max_views:
+                # Slices handed out keep their mapping alive.
+                del self._views[next(iter(self._views))]
+            self._views[key] = view
+            return view
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        # Eviction goes by mtime, so reads count as uses.
+        with contextlib.suppress(OSError):
+            os.utime(path)
+
+    def put(self, key: str, data: bytes | memoryview) -> memoryview:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file and rename it into place, so concurrent
+        # readers never observe a partially written entry.
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=self.temp_prefix
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            if self._size is None or self._size > self.size_limit:
+                self._trim()
+        view = self.view(key)
+        assert view is not None
+        return view
+
+    def _trim(self) -> None:
+        entries: list[tuple[float, int, str]] = []
+        total: int = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith(self.temp_prefix):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total > self.size_limit:
+            entries.sort()
+            target = self.size_limit * self.trim_ratio
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                log.debug("Evicting `%s` from the data cache", path)
+                # Mappings that are already open stay valid after unlinking.
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                total -= size
+        self._size = total
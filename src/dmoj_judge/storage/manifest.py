@@ -0,0 +1,92 @@
+from .pack import PACK_DIGEST_SIZE
+from typing import NamedTuple
+import tempfile
+import hashlib
+import logging
+import json
+import os
+
+log = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1 << 20
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    # Same digest as problem packs use, so both can share cache keys.
+    # `hashlib` drops the GIL while hashing large buffers, which lets several
+    # files be hashed in parallel from a thread pool.
+    digest = hashlib.blake2b(digest_size=PACK_DIGEST_SIZE)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while size := f.readinto(buffer):
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+class ManifestEntry(NamedTuple):
+    size: int
+    mtime_ns: int
+    ino: int
+    digest: str
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return (
+            self.size == stat.st_size
+            and self.mtime_ns == stat.st_mtime_ns
+            and self.ino == stat.st_ino
+        )
+
+
+# Content digests of the files of one problem, keyed by their path relative to
+# the problem root. An entry is only trusted while the file's stat still
+# matches, so a stale manifest costs a rehash and is never wrong.
+class Manifest:
+    path: str
+    entries: dict[str, ManifestEntry]
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = {}
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable manifest `%s`: %s", path, e)
+            return
+
+        if data.get("version") == MANIFEST_VERSION:
+            self.entries = {
+                name: ManifestEntry(*entry)
+                for name, entry in data["entries"].items()
+            }
+
+    def lookup(self, name: str, stat: os.stat_result) -> str | None:
+        entry = self.entries.get(os.path.normpath(name))
+        if entry is None or not entry.matches(stat):
+            return None
+        return entry.digest
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {
+                        "version": MANIFEST_VERSION,
+                        "entries": {
+                            name: list(entry)
+                            for name, entry in self.entries.items()
+                        },
+                    },
+                    f,
+                )
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
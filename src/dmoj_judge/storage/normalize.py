@@ -0,0 +1,43 @@
+from typing import Iterable, Iterator
+import re
+
+NORMALIZE_CHUNK_SIZE = 1 << 20
+
+# Also matches at the very end of a chunk: chunks never end in whitespace
+# that could continue into the next one (see `normalize_chunks`).
+_TRAILING_WHITESPACE = re.compile(rb"[ \t]+(?=\n|\Z)")
+
+
+def _normalize(data: bytes, strip_trailing_whitespace: bool) -> bytes:
+    data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if strip_trailing_whitespace:
+        data = _TRAILING_WHITESPACE.sub(b"", data)
+    return data
+
+
+def normalize_chunks(
+    chunks: Iterable[bytes], strip_trailing_whitespace: bool = False
+) -> Iterator[bytes]:
+    # Converts CRLF and stray CR line endings to LF in a single pass. All the
+    # per-byte work happens inside `bytes.replace`/`re.sub`, so the Python
+    # loop only runs once per chunk.
+    tail_chars = b" \t\r" if strip_trailing_whitespace else b"\r"
+    carry = b""
+    for chunk in chunks:
+        data = carry + chunk if carry else chunk
+        # A trailing CR might be the first half of a CRLF, and trailing
+        # whitespace might continue into the next chunk; hold both back.
+        cut = len(data.rstrip(tail_chars))
+        carry = data[cut:]
+        if cut:
+            yield _normalize(data[:cut], strip_trailing_whitespace)
+
+    if carry:
+        yield _normalize(carry, strip_trailing_whitespace)
+
+
+def read_chunks(
+    file, chunk_size: int = NORMALIZE_CHUNK_SIZE
+) -> Iterator[bytes]:
+    while chunk := file.read(chunk_size):
+        yield chunk
@@ -0,0 +1,218 @@
+from .prefetch import willneed
+from typing import Any, Iterator, NamedTuple
+import contextlib
+import tempfile
+import hashlib
+import struct
+import mmap
+import yaml
+import io
+import os
+
+PACK_SUFFIX = ".dmojpack"
+PACK_MAGIC = b"DMOJPACK"
+PACK_VERSION = 1
+
+# magic, version, flags, entry count, offset of the first content byte
+PACK_HEADER = struct.Struct("<8sHHIQ")
+# name length, content offset, content length, blake2b-128 digest; followed by
+# the UTF-8 encoded name.
+PACK_ENTRY = struct.Struct("<HQQ16s")
+PACK_DIGEST_SIZE = 16
+
+
+class PackEntry(NamedTuple):
+    offset: int
+    length: int
+    digest: bytes
+
+
+class InvalidPackError(ValueError):
+    pass
+
+
+class ProblemPack:
+    path: str
+    entries: dict[str, PackEntry]
+    _map: mmap.mmap | None
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < PACK_HEADER.size:
+                raise InvalidPackError("`%s` is too small to be a pack" % path)
+
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Test files are stored in case order, so let the kernel read
+            # ahead aggressively.
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+
+        magic, version, _, count, data_offset = PACK_HEADER.unpack_from(
+            self._map
+        )
+        if magic != PACK_MAGIC:
+            raise InvalidPackError("`%s` is not a problem pack" % path)
+        if version != PACK_VERSION:
+            raise InvalidPackError(
+                "unsupported pack version %d in `%s`" % (version, path)
+            )
+
+        self.entries = {}
+        position = PACK_HEADER.size
+        for _ in range(count):
+            # A truncated or corrupt entry table is as invalid as a bad header.
+            try:
+                name_length, offset, length, digest = PACK_ENTRY.unpack_from(
+                    self._map, position
+                )
+                position += PACK_ENTRY.size
+                if position + name_length > data_offset:
+                    raise ValueError("name out of bounds")
+                name = self._map[position : position + name_length].decode(
+                    "utf-8"
+                )
+            except (struct.error, ValueError) as e:
+                raise InvalidPackError(
+                    "corrupt entry table in `%s`: %s" % (path, e)
+                ) from e
+            position += name_length
+
+            if offset < data_offset or offset + length > size:
+                raise InvalidPackError(
+                    "entry `%s` is out of bounds in `%s`" % (name, path)
+                )
+            self.entries[name] = PackEntry(offset, length, digest)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def _entry(self, name: str) -> PackEntry:
+        try:
+            return self.entries[name]
+        except KeyError:
+            raise KeyError(
+                'File "%s" could not be found in "%s"' % (name, self.path)
+            )
+
+    def digest(self, name: str) -> str:
+        return self._entry(name).digest.hex()
+
+    def identity(self, name: str) -> tuple:
+        # Packs are content-addressed already.
+        return ("blake2b", self.digest(name))
+
+    def view(self, name: str) -> memoryview:
+        entry = self._entry(name)
+        if not entry.length:
+            return memoryview(b"")
+        assert self._map is not None
+        return memoryview(self._map)[entry.offset : entry.offset + entry.length]
+
+    def open(self, name: str) -> io.BytesIO:
+        return io.BytesIO(self.view(name))
+
+    def prefetch(self, name: str) -> int:
+        entry = self._entry(name)
+        if not entry.length:
+            return 0
+        return willneed(self.path, entry.offset, entry.length)
+
+
+def _case_files(cases: Any) -> Iterator[str]:
+    if isinstance(cases, list):
+        for case in cases:
+            yield from _case_files(case)
+    elif isinstance(cases, dict):
+        for key in ("in", "out"):
+            if isinstance(cases.get(key), str):
+                yield cases[key]
+        yield from _case_files(cases.get("batched"))
+
+
+def _pack_order(root: str) -> list[str]:
+    files: list[str] = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            files.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    files.sort()
+
+    # init.yml goes first, then test data in the order the cases run, so that
+    # grading reads the pack front to back.
+    ordered: list[str] = []
+    if "init.yml" in files:
+        ordered.append("init.yml")
+        with open(os.path.join(root, "init.yml"), "rb") as f:
+            init = yaml.safe_load(f)
+        if isinstance(init, dict):
+            for key in ("pretest_test_cases", "test_cases"):
+                for name in _case_files(init.get(key)):
+                    if name in files and name not in ordered:
+                        ordered.append(name)
+
+    seen = set(ordered)
+    ordered.extend(name for name in files if name not in seen)
+    return ordered
+
+
+def write_pack(root: str, dest: str) -> int:
+    names = _pack_order(root)
+    encoded = [name.encode("utf-8") for name in names]
+
+    data_offset = PACK_HEADER.size + sum(
+        PACK_ENTRY.size + len(name) for name in encoded
+    )
+
+    # A temporary file of its own, so that concurrent packers of the same
+    # problem don't write over each other; renamed into place once complete.
+    fd, temp_dest = tempfile.mkstemp(
+        dir=os.path.dirname(dest) or ".",
+        prefix="." + os.path.basename(dest) + "-",
+        suffix=".tmp",
+    )
+    try:
+        # mkstemp only lets the owner read it.
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as out:
+            out.write(
+                PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(names), 0)
+            )
+            # The table is rewritten once digests are known.
+            out.write(b"\0" * (data_offset - PACK_HEADER.size))
+
+            table: list[bytes] = []
+            offset = data_offset
+            for name, encoded_name in zip(names, encoded):
+                digest = hashlib.blake2b(digest_size=PACK_DIGEST_SIZE)
+                size = 0
+                with open(os.path.join(root, name), "rb") as f:
+                    while chunk := f.read(1 << 20):
+                        digest.update(chunk)
+                        size += out.write(chunk)
+                table.append(
+                    PACK_ENTRY.pack(
+                        len(encoded_name), offset, size, digest.digest()
+                    )
+                    + encoded_name
+                )
+                offset += size
+
+            out.seek(0)
+            out.write(
+                PACK_HEADER.pack(
+                    PACK_MAGIC, PACK_VERSION, 0, len(names), data_offset
+                )
+            )
+            out.write(b"".join(table))
+        os.replace(temp_dest, dest)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_dest)
+        raise
+    return len(names)
@@ -0,0 +1,141 @@
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable, Hashable, Iterator
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+
+def _resident(fd: int, offset: int, length: int) -> bool:
+    # Reads with RWF_NOWAIT fail instead of blocking on I/O when the data is
+    # not in the page cache, which makes for a cheap residency probe. Only the
+    # first, middle and last pages are checked.
+    if not hasattr(os, "RWF_NOWAIT"):
+        return False
+
+    probe = bytearray(1)
+    for position in (offset, offset + length // 2, offset + length - 1):
+        try:
+            if not os.preadv(fd, [probe], position, os.RWF_NOWAIT):
+                return False
+        except OSError:
+            # EAGAIN when not resident, EOPNOTSUPP on filesystems without
+            # RWF_NOWAIT support.
+            return False
+    return True
+
+
+def willneed(path: str, offset: int = 0, length: int | None = None) -> int:
+    # Asks the kernel to start reading `length` bytes of `path` at `offset`
+    # into the page cache. Returns the number of bytes scheduled, which is 0
+    # if they are already resident.
+    if not hasattr(os, "posix_fadvise"):
+        return 0
+
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        if length is None:
+            length = os.fstat(fd).st_size - offset
+        if length <= 0 or _resident(fd, offset, length):
+            return 0
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+        return length
+    finally:
+        os.close(fd)
+
+
+# How to warm a submission's data: what reads a file into the page cache, and
+# the files in the order they are read; or None if there's nothing to warm.
+PrefetchPlan = tuple[Callable[[str], int], list[str]] | None
+
+
+class _Scheduled:
+    __slots__ = ("key", "plan", "prefetch", "paths")
+
+    def __init__(self, key: Hashable, plan: Callable[[], PrefetchPlan]):
+        self.key = key
+        self.plan = plan
+        self.prefetch: Callable[[str], int] | None = None
+        # None until the plan is made.
+        self.paths: Iterator[str] | None = None
+
+
+# Warms the test data of queued submissions, in queue and then case order, so
+# that their first cases don't wait on cold storage. Readahead is charged to
+# the submission that scheduled it until `release` is called for it; nothing
+# more is scheduled while the budget is used up.
+class Prefetcher:
+    budget: int
+    _pending: deque[_Scheduled]
+    _charged: dict[Hashable, int]
+    _used: int
+    _cond: Condition
+    _thread: Thread | None
+
+    def __init__(self, budget: int = 256) -> None:
+        # Configured in MiB.
+        self.budget = budget * 1024 * 1024
+        self._pending = deque()
+        self._charged = {}
+        self._used = 0
+        self._cond = Condition()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = Thread(target=self._run, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def schedule(self, key: Hashable, plan: Callable[[], PrefetchPlan]) -> None:
+        # `plan` is called on the prefetcher's thread once the submission is
+        # first in line, so that whoever schedules it doesn't wait on it.
+        with self._cond:
+            self._pending.append(_Scheduled(key, plan))
+            self._charged.setdefault(key, 0)
+            self._cond.notify()
+
+    def release(self, key: Hashable) -> None:
+        with self._cond:
+            self._used -= self._charged.pop(key, 0)
+            self._pending = deque(
+                entry for entry in self._pending if entry.key != key
+            )
+            self._cond.notify()
+
+    def _next(self) -> tuple[_Scheduled, str | None]:
+        # The next file to warm, or no file if the plan is to be made first.
+        with self._cond:
+            while True:
+                while not self._pending or self._used >= self.budget:
+                    self._cond.wait()
+
+                entry = self._pending[0]
+                if entry.paths is None:
+                    return entry, None
+                path = next(entry.paths, None)
+                if path is not None:
+                    return entry, path
+                self._pending.popleft()
+
+    def _run(self) -> None:
+        while True:
+            entry, path = self._next()
+            if path is None:
+                plan = entry.plan()
+                with self._cond:
+                    entry.prefetch, paths = plan or (None, [])
+                    entry.paths = iter(paths)
+                continue
+
+            assert entry.prefetch is not None
+            try:
+                size = entry.prefetch(path)
+            except (KeyError, OSError) as e:
+                log.debug("Failed to prefetch `%s`: %s", path, e)
+                continue
+
+            with self._cond:
+                # The submission may have been released in the meantime.
+                if entry.key in self._charged:
+                    self._charged[entry.key] += size
+                    self._used += size
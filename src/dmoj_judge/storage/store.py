@@ -0,0 +1,152 @@
+from .manifest import Manifest, ManifestEntry, hash_file
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import tempfile
+import logging
+import stat as stat_module
+import os
+
+log = logging.getLogger(__name__)
+
+
+# Content-addressed store of problem files. Per-problem manifests are always
+# kept; with `dedupe` enabled, every indexed file is also hardlinked into
+# `objects/` under its digest, and files whose content is already stored are
+# replaced by a hardlink to the stored object, so identical test data shared by
+# several problems (or problem versions) only takes disk and page cache space
+# once.
+#
+# Hardlinks can't cross filesystems, so a deduplicating store should live on
+# the same filesystem as the problem storage.
+class ContentStore:
+    root: str
+    dedupe: bool
+    _manifests: dict[str, Manifest]
+    _pool: ThreadPoolExecutor
+    _lock: Lock
+
+    def __init__(
+        self, root: str | None = None, dedupe: bool = False, threads: int = 4
+    ) -> None:
+        self.root = root or os.path.join(
+            tempfile.gettempdir(), "dmoj-problem-store"
+        )
+        self.dedupe = dedupe
+        self._manifests = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="hasher"
+        )
+        self._lock = Lock()
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def manifest(self, problem_id: str) -> Manifest:
+        with self._lock:
+            manifest = self._manifests.get(problem_id)
+            if manifest is None:
+                manifest = self._manifests[problem_id] = Manifest(
+                    os.path.join(self.root, "manifests", problem_id + ".json")
+                )
+            return manifest
+
+    def index(self, problem_id: str, root: str) -> Manifest:
+        # Hashes every file of the problem whose manifest entry is missing or
+        # stale, then links the problem's files into the store.
+        manifest = self.manifest(problem_id)
+
+        files: dict[str, os.stat_result] = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat_module.S_ISREG(stat.st_mode):
+                    files[os.path.relpath(path, root)] = stat
+
+        entries: dict[str, ManifestEntry] = {}
+        stale: list[str] = []
+        for name, stat in files.items():
+            digest = manifest.lookup(name, stat)
+            if digest is None:
+                stale.append(name)
+            else:
+                entries[name] = ManifestEntry(
+                    stat.st_size, stat.st_mtime_ns, stat.st_ino, digest
+                )
+
+        paths = [os.path.join(root, name) for name in stale]
+        for name, path, digest in zip(
+            stale, paths, self._pool.map(hash_file, paths)
+        ):
+            stat = os.stat(path)
+            # Modified while it was being hashed; picked up next time.
+            if stat.st_mtime_ns != files[name].st_mtime_ns:
+                continue
+            entries[name] = ManifestEntry(
+                stat.st_size, stat.st_mtime_ns, stat.st_ino, digest
+            )
+
+        if self.dedupe:
+            for name, entry in entries.items():
+                stat = self._link(os.path.join(root, name), entry.digest)
+                if stat is not None and not entry.matches(stat):
+                    entries[name] = ManifestEntry(
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                        stat.st_ino,
+                        entry.digest,
+                    )
+
+        log.debug(
+            "Indexed problem %s: %d files, %d hashed",
+            problem_id,
+            len(entries),
+            len(stale),
+        )
+        manifest.entries = entries
+        manifest.save()
+        return manifest
+
+    def _link(self, path: str, digest: str) -> os.stat_result | None:
+        # Returns the new stat of `path` if linking changed it.
+        object_path = self.object_path(digest)
+        try:
+            object_stat = os.stat(object_path)
+        except FileNotFoundError:
+            object_stat = None
+
+        try:
+            if object_stat is None:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.link(path, object_path)
+                # Objects are shared between problems, so they must not be
+                # modified in place. This applies to every link.
+                os.chmod(object_path, 0o444)
+                return os.stat(path)
+
+            stat = os.stat(path)
+            if (stat.st_dev, stat.st_ino) == (
+                object_stat.st_dev,
+                object_stat.st_ino,
+            ):
+                return None
+            if (
+                stat.st_dev != object_stat.st_dev
+                or stat.st_size != object_stat.st_size
+            ):
+                return None
+
+            temp_path = path + ".dmoj-link"
+            os.link(object_path, temp_path)
+            os.replace(temp_path, path)
+            return os.stat(path)
+        except FileExistsError:
+            return None
+        except OSError as e:
+            # Most likely EXDEV: the store is on another filesystem.
+            log.debug("Failed to link `%s` into the store: %s", path, e)
+            return None
@@ -1,11 +1,18 @@
 from typing import NamedTuple, TypeAlias, Any
-from .result import ResultKind, Result, CheckerResult
-from .problem import (
-    Problem,
-    ProblemDataManager,
+from .result import (
+    ResultKind,
+    Result,
+    ResultTable,
+    GradingStats,
+    CheckerResult,
+)
+from .problem import Problem, ProblemDataManager
+from .cases import (
     BaseTestCase,
     TestCase,
     BatchedTestCase,
+    BatchRange,
+    ExecutionPlan,
 )
 
 
@@ -0,0 +1,159 @@
+from ..config import BaseConfig, TestCaseConfig, BatchedTestCaseConfig
+from ..errors import InvalidInitError
+from dataclasses import dataclass
+from typing import Any
+
+
+# Test cases are compiled once per problem version and shared by every
+# submission to it, so they are immutable and must not refer back to a
+# `Problem`.
+@dataclass(frozen=True, slots=True)
+class BaseTestCase:
+    # FIXME: What type does this take?
+    config: dict[str, Any] | BaseConfig
+    points: int
+
+
+@dataclass(frozen=True, slots=True)
+class BatchedTestCase(BaseTestCase):
+    batch_no: int
+    cases: tuple["TestCase", ...]
+    dependencies: tuple[int, ...]
+
+    def __repr__(self) -> str:
+        return f"BatchedTestCase(cases={self.cases})"
+
+
+@dataclass(frozen=True, slots=True)
+class TestCase(BaseTestCase):
+    position: int
+    batch: int
+    output_prefix_length: int
+    has_binary_data: bool
+
+    def __repr__(self) -> str:
+        return (
+            "TestCase("
+            + f'in="{self.config._in}", '
+            + f'out="{self.config.out}", '
+            + f"points={self.config.points})"
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class BatchRange:
+    batch_no: int
+    # Slice of `ExecutionPlan.cases` holding the batch's cases.
+    start: int
+    stop: int
+    points: int
+    dependencies: tuple[int, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class ExecutionPlan:
+    # Cases as declared, with batches nested.
+    tree: tuple[BaseTestCase, ...]
+    # Every case in grading order; `TestCase.position` indexes into this.
+    cases: tuple[TestCase, ...]
+    batches: tuple[BatchRange, ...]
+    # Batch number to the batches that directly depend on it.
+    dependents: dict[int, tuple[int, ...]]
+    # `tree`, split by the case list each case was declared in (e.g.
+    # pretests, then the main tests).
+    phases: tuple[tuple[BaseTestCase, ...], ...]
+
+    def batch(self, batch_no: int) -> BatchRange:
+        # Batch numbers are contiguous, starting at 1.
+        return self.batches[batch_no - 1]
+
+    @classmethod
+    def compile(cls, *case_lists: list[dict[str, Any]]) -> "ExecutionPlan":
+        # Lists are laid out one after another (e.g. pretests, then the main
+        # tests), with positions and batch numbers continuing across them.
+        # Dependencies are relative to the list they are declared in.
+        tree: list[BaseTestCase] = []
+        cases: list[TestCase] = []
+        batches: list[BatchRange] = []
+        phases: list[tuple[BaseTestCase, ...]] = []
+        for case_configs in case_lists:
+            phase_start = len(tree)
+            batch_offset = len(batches)
+            for case_config in case_configs:
+                if "batched" not in case_config:
+                    case = cls._compile_case(case_config, len(cases), 0)
+                    tree.append(case)
+                    cases.append(case)
+                    continue
+
+                config = BatchedTestCaseConfig(**case_config)
+                batch_no = len(batches) + 1
+                if any("batched" in sub for sub in config.batched):
+                    raise InvalidInitError("Batches can't be nested")
+                if any(
+                    dep >= batch_no - batch_offset
+                    for dep in config.dependencies
+                ):
+                    raise InvalidInitError(
+                        "Dependencies depends on non-earlier batch"
+                    )
+                if any(dep < 1 for dep in config.dependencies):
+                    raise InvalidInitError(
+                        "Dependencies must be positive integers"
+                    )
+
+                start = len(cases)
+                for sub_config in config.batched:
+                    cases.append(
+                        cls._compile_case(sub_config, len(cases), batch_no)
+                    )
+
+                dependencies = tuple(
+                    dep + batch_offset for dep in config.dependencies
+                )
+                tree.append(
+                    BatchedTestCase(
+                        config,
+                        config.points,
+                        batch_no,
+                        tuple(cases[start:]),
+                        dependencies,
+                    )
+                )
+                batches.append(
+                    BatchRange(
+                        batch_no, start, len(cases), config.points, dependencies
+                    )
+                )
+            phases.append(tuple(tree[phase_start:]))
+
+        dependents: dict[int, list[int]] = {}
+        for batch in batches:
+            for dep in batch.dependencies:
+                dependents.setdefault(dep, []).append(batch.batch_no)
+
+        return cls(
+            tuple(tree),
+            tuple(cases),
+            tuple(batches),
+            {dep: tuple(batch_nos) for dep, batch_nos in dependents.items()},
+            tuple(phases),
+        )
+
+    @staticmethod
+    def _compile_case(
+        case_config: dict[str, Any], position: int, batch: int
+    ) -> TestCase:
+        # `in` is a keyword; the YAML dict itself is shared and left alone.
+        kwargs = dict(case_config)
+        if "in" in kwargs:
+            kwargs["_in"] = kwargs.pop("in")
+        config = TestCaseConfig(**kwargs)
+        return TestCase(
+            config,
+            config.points,
+            position,
+            batch,
+            config.output_prefix_length,
+            config.has_binary_data,
+        )
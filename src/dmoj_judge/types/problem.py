@@ -1,54 +1,184 @@
-from ..config import (
-    BaseConfig,
-    ProblemConfig,
-    TestCaseConfig,
-    BatchedTestCaseConfig,
-)
+from .cases import BaseTestCase, ExecutionPlan
+from ..config import ProblemConfig
 from ..cptbox.utils import MmapableIO, MemoryIO
 from ..errors import InvalidInitError
-from dataclasses import dataclass
-from io import BufferedReader
-from typing import Any
-import zipfile
+from ..storage import (
+    DataCache,
+    Manifest,
+    ZipArchive,
+    ProblemPack,
+    normalize_chunks,
+    read_chunks,
+    willneed,
+    NORMALIZE_CHUNK_SIZE,
+)
+from typing import Any, BinaryIO, Iterator
 import shutil
 import os
 
 
 class ProblemDataManager:
+    # Either the problem directory, or the pack file when `pack` is set.
     root_path: str
-    archive: zipfile.ZipFile | None
+    # Both are shared between every submission of the problem and owned by
+    # the `ProblemManager`, so they must not be closed here.
+    archive: ZipArchive | None
+    pack: ProblemPack | None
+    cache: DataCache | None
+    manifest: Manifest | None
 
-    def __init__(self, root_path: str) -> None:
+    def __init__(
+        self,
+        root_path: str,
+        pack: ProblemPack | None = None,
+        cache: DataCache | None = None,
+        manifest: Manifest | None = None,
+    ) -> None:
         self.root_path = root_path
         self.archive = None
+        self.pack = pack
+        self.cache = cache
+        self.manifest = manifest
+
+    def _source(self, path: str) -> ZipArchive | ProblemPack | None:
+        # Returns the indexed container holding `path`, or None if it should
+        # be read straight from the problem directory. Files in the problem
+        # itself take precedence over archive members.
+        if self.pack is not None:
+            if path in self.pack:
+                return self.pack
+        elif os.path.exists(os.path.join(self.root_path, path)):
+            return None
+
+        if self.archive is not None and path in self.archive:
+            return self.archive
+        return None
+
+    def open(self, path: str) -> BinaryIO:
+        source = self._source(path)
+        if source is not None:
+            return source.open(path)
+
+        if self.pack is None:
+            try:
+                return open(os.path.join(self.root_path, path), "rb")
+            except IOError:
+                pass
+        raise KeyError(
+            'File "%s" could not be found in "%s"' % (path, self.root_path)
+        )
+
+    def view(self, path: str) -> memoryview:
+        # Zero-copy for packed files and stored archive members; a plain read
+        # otherwise.
+        source = self._source(path)
+        if source is not None:
+            return source.view(path)
+        return memoryview(self[path])
+
+    def digest(self, path: str) -> str | None:
+        # Content digest of `path`, if known: packs store one per file, and
+        # problem directories are hashed in the background by the
+        # `ContentStore`. Archive members are never hashed.
+        source = self._source(path)
+        if isinstance(source, ProblemPack):
+            return source.digest(path)
+        if source is not None or self.manifest is None:
+            return None
 
-    def open(self, path: str) -> BufferedReader:
         try:
-            return open(os.path.join(self.root_path, path), "rb")
-        except IOError:
+            stat = os.stat(os.path.join(self.root_path, path))
+        except OSError:
+            return None
+        return self.manifest.lookup(path, stat)
+
+    def identity(self, path: str) -> tuple:
+        # Changes whenever the contents of `path` may have changed; used to key
+        # derived data in the shared data cache. Identical files share their
+        # identity once their digest is known.
+        source = self._source(path)
+        if source is not None:
+            return source.identity(path)
+
+        digest = self.digest(path)
+        if digest is not None:
+            return ("blake2b", digest)
+
+        real_path = os.path.realpath(os.path.join(self.root_path, path))
+        try:
+            stat = os.stat(real_path)
+        except OSError:
             raise KeyError(
                 'File "%s" could not be found in "%s"' % (path, self.root_path)
             )
+        return ("file", real_path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
 
-    def open_fd(self, path: str, normalize: bool = False) -> MmapableIO:
+    def prefetch(self, path: str) -> int:
+        source = self._source(path)
+        if source is not None:
+            return source.prefetch(path)
+        if self.pack is not None:
+            raise KeyError(
+                'File "%s" could not be found in "%s"' % (path, self.root_path)
+            )
+        return willneed(os.path.join(self.root_path, path))
+
+    def _chunks(self, path: str) -> Iterator[bytes]:
+        source = self._source(path)
+        if source is None:
+            with self.open(path) as f:
+                yield from read_chunks(f)
+            return
+
+        view = source.view(path)
+        for offset in range(0, len(view), NORMALIZE_CHUNK_SIZE):
+            yield bytes(view[offset : offset + NORMALIZE_CHUNK_SIZE])
+
+    def open_fd(
+        self,
+        path: str,
+        normalize: bool = False,
+        strip_trailing_whitespace: bool = False,
+    ) -> MmapableIO:
         memory = MemoryIO()
-        with self.open(path) as f:
-            if normalize:
-                raise NotImplementedError("open_fd(..., normalize = True)")
-            else:
+        source = self._source(path)
+        if normalize:
+            self._write_normalized(path, memory, strip_trailing_whitespace)
+        elif source is not None:
+            memory.write(source.view(path))
+        else:
+            with self.open(path) as f:
                 shutil.copyfileobj(f, memory)
         memory.seal()
         return memory
 
+    def _write_normalized(
+        self, path: str, memory: MmapableIO, strip_trailing_whitespace: bool
+    ) -> None:
+        # Normalized files are cached next to the raw data, so a file is only
+        # normalized once rather than once per test case.
+        key: str | None = None
+        if self.cache is not None:
+            key = DataCache.make_key(
+                "normalized", strip_trailing_whitespace, *self.identity(path)
+            )
+            cached = self.cache.view(key)
+            if cached is not None:
+                memory.write(cached)
+                return
+
+        for chunk in normalize_chunks(
+            self._chunks(path), strip_trailing_whitespace
+        ):
+            memory.write(chunk)
+
+        if self.cache is not None and key is not None:
+            self.cache.put(key, memory.to_bytes())
+
     def __getitem__(self, key: str) -> bytes:
         with self.open(key) as f:
             return f.read()
 
-    def __del__(self):
-        # FIXME: Doesn't this happen implicitly?
-        if self.archive:
-            self.archive.close()
-
 
 class Problem:
     id: str
@@ -61,8 +191,7 @@ class Problem:
     data_manager: ProblemDataManager
 
     pretests_only: bool
-    _batch_counter: int
-    _testcase_counter: int
+    plan: ExecutionPlan
 
     def __init__(
         self,
@@ -72,19 +201,21 @@ class Problem:
         meta: dict[str, Any],
         config: ProblemConfig,
         data_manager: ProblemDataManager,
+        plan: ExecutionPlan | None = None,
     ) -> None:
         self.id = id
         self.time_limit = time_limit
         self.memory_limit = memory_limit
         self.meta = meta
         self.config = config
-
-        self._batch_counter = 0
-        self._testcase_counter = 0
+        self.data_manager = data_manager
 
         self.pretests_only = self.meta.get("pretests_only", False)
         if not self._resolve_testcases():
             raise InvalidInitError("Problem `%s` has no testcases" % (id,))
+        # Plans are normally compiled once per problem version and handed in
+        # by the `ProblemManager`.
+        self.plan = plan or self.compile_plan(config, self.pretests_only)
 
     # TODO: typing
     def _resolve_testcases(self) -> list[dict[str, Any]]:
@@ -95,79 +226,30 @@ class Problem:
         # FIXME
         raise NotImplementedError("Can't guess the testcase name format, yet!")
 
-    def _load_testcases(
-        self, case_configs: list[dict[str, Any]], batch_number: int = 0
-    ) -> list["BaseTestCase"]:
-        cases: list[BaseTestCase] = []
-        for case_config in case_configs:
-            if "batched" in case_config:
-                config: BatchedTestCaseConfig = BatchedTestCaseConfig(
-                    **case_config
-                )
-                self._batch_counter += 1
-
-                sub_cases: list[BaseTestCase] = self._load_testcases(
-                    config.batched
-                )
-                # TODO: Consider moving to __post_init__
-                if any(
-                    isinstance(sub_case, BatchedTestCase)
-                    for sub_case in sub_cases
-                ):
-                    raise InvalidInitError("Batches can't be nested")
-
-                if any(
-                    dep >= self._batch_counter for dep in config.dependencies
-                ):
-                    raise InvalidInitError(
-                        "Dependencies depends on non-earlier batch"
-                    )
-
-                if any(dep < 1 for dep in config.dependencies):
-                    raise InvalidInitError(
-                        "Dependencies must be positive integers"
-                    )
-
-                cases.append(
-                    BatchedTestCase(
-                        config,
-                        config.points,
-                        self,
-                        self._batch_counter,
-                        sub_cases,
-                        config.dependencies,
-                    )
-                )
-            else:
-                if "in" in case_config:
-                    case_config["_in"] = case_config.pop("in")
-                config: TestCaseConfig = TestCaseConfig(**case_config)
-                cases.append(
-                    TestCase(
-                        config,
-                        config.points,
-                        self,
-                        self._testcase_counter,
-                        batch_number,
-                        config.output_prefix_length,
-                        config.has_binary_data,
-                    )
-                )
-
-                self._testcase_counter += 1
-        return cases
-
-    def cases(self) -> list["BaseTestCase"]:
-        pretest_test_cases = self.config.pretest_test_cases
-        if self.pretests_only and pretest_test_cases:
-            return self._load_testcases(pretest_test_cases)
-
-        test_cases = self._load_testcases(self.config.test_cases)
+    @staticmethod
+    def compile_plan(
+        config: ProblemConfig, pretests_only: bool
+    ) -> ExecutionPlan:
+        pretest_test_cases = config.pretest_test_cases
+        if pretests_only and pretest_test_cases:
+            return ExecutionPlan.compile(pretest_test_cases)
+
+        # Pretests run as their own phase, before the main tests.
         if pretest_test_cases:
-            pretest_test_cases = self._load_testcases(pretest_test_cases)
-            # FIXME: Didn't implemented pretest short-circuit. Left for later.
-            test_cases = pretest_test_cases + test_cases
-        return test_cases
+            return ExecutionPlan.compile(pretest_test_cases, config.test_cases)
+        return ExecutionPlan.compile(config.test_cases)
+
+    def cases(self) -> list[BaseTestCase]:
+        return list(self.plan.tree)
+
+    def data_files(self) -> list[str]:
+        # Test data in the order it is read while grading.
+        files: dict[str, None] = {}
+        for case in self.plan.cases:
+            for name in (case.config._in, case.config.out):
+                if name:
+                    files.setdefault(name)
+        return list(files)
 
     @property
     def grader_class(self) -> Any:
@@ -181,40 +263,3 @@ class Problem:
             + f"memory_limit={self.memory_limit}, "
             + f"pretests_only={self.pretests_only}, ...)"
         )
-
-
-@dataclass
-class BaseTestCase:
-    # FIXME: What type does this take?
-    config: dict[str, Any] | BaseConfig
-    points: int
-    # TODO: Maybe there's a way to remove this circular dependency without
-    #         hurting performance?
-    problem: Problem
-
-
-@dataclass
-class BatchedTestCase(BaseTestCase):
-    batch_no: int
-    cases: list[BaseTestCase]
-    # TODO: typing
-    dependencies: list[int]
-
-    def __repr__(self) -> str:
-        return f"BatchedTestCase(cases={self.cases})"
-
-
-@dataclass
-class TestCase(BaseTestCase):
-    position: int
-    batch: int
-    output_prefix_length: int
-    has_binary_data: bool
-
-    def __repr__(self) -> str:
-        return (
-            "TestCase("
-            + f'in="{self.config._in}", '
-            + f'out="{self.config.out}", '
-            + f"points={self.config.points})"
-        )
@@ -1,6 +1,7 @@
+from .cases import TestCase
+from dataclasses import dataclass, replace
+from array import array
 from enum import Enum
-from dataclasses import dataclass
-import dmoj_judge
 
 
 class ResultKind(Enum):
@@ -15,9 +16,50 @@ class ResultKind(Enum):
     AC = (0, "green")
 
 
-@dataclass
+# Every verdict but IE fits in the low bits, so the main code and readable
+# codes of every combination of them are precomputed; IE always wins.
+_LOW_MASK = (1 << 7) - 1
+_IE_CODE: int = ResultKind.IE.value[0]
+
+
+def _build_verdict_tables() -> (
+    tuple[tuple[int, ...], tuple[tuple[str, ...], ...]]
+):
+    main_codes: list[int] = []
+    readable_codes: list[tuple[str, ...]] = []
+    for flag in range(_LOW_MASK + 1):
+        kinds = [kind for kind in ResultKind if flag & kind.value[0]]
+        main_codes.append(
+            kinds[0].value[0] if kinds else ResultKind.AC.value[0]
+        )
+        readable_codes.append(tuple(kind.name for kind in kinds))
+    return tuple(main_codes), tuple(readable_codes)
+
+
+_MAIN_CODES, _READABLE_CODES = _build_verdict_tables()
+
+
+def main_code(result_flag: int) -> int:
+    if result_flag & _IE_CODE:
+        return _IE_CODE
+    return _MAIN_CODES[result_flag & _LOW_MASK]
+
+
+def readable_codes(result_flag: int) -> tuple[str, ...]:
+    codes = _READABLE_CODES[result_flag & _LOW_MASK]
+    if result_flag & _IE_CODE:
+        return ("IE",) + codes
+    return codes
+
+
+# Results only carry the few scalars they need from their case, so they stay
+# small and cheap to pickle across the worker pipe.
+@dataclass(slots=True)
 class Result:
-    case: "dmoj_judge.problem.TestCase"
+    position: int
+    batch: int = 0
+    total_points: float = 0
+    output_prefix_length: int = 0
     result_flag: int = 0
     execution_time: float = 0
     wall_clock_time: float = 0
@@ -29,36 +71,115 @@ class Result:
     extended_feedback: str = ""
     points: float = 0
 
+    @classmethod
+    def for_case(cls, case: TestCase) -> "Result":
+        return cls(
+            case.position,
+            case.batch,
+            case.points,
+            case.output_prefix_length,
+        )
+
+    def reused_for(self, case: TestCase) -> "Result":
+        # The result of an identical case, moved to `case` and scaled to its
+        # points.
+        if self.total_points:
+            points = self.points * case.points / self.total_points
+        else:
+            points = 0 if self.result_flag else case.points
+        return replace(
+            self,
+            position=case.position,
+            batch=case.batch,
+            total_points=case.points,
+            output_prefix_length=case.output_prefix_length,
+            points=points,
+        )
+
     @property
     def main_code(self) -> int:
-        for kind in ResultKind:
-            code: int = kind.value[0]
-            if self.result_flag & code:
-                return code
-        return ResultKind.AC.value[0]
+        return main_code(self.result_flag)
 
     @property
     def readable_codes(self) -> list[str]:
-        execution_verdict: list[str] = []
-        for kind in ResultKind:
-            if self.result_flag & kind.value[0]:
-                execution_verdict.append(kind.name)
-        return execution_verdict
-
-    @property
-    def total_points(self) -> float:
-        return self.case.points
+        return list(readable_codes(self.result_flag))
 
     @property
     def output(self) -> str:
-        return self.proc_output[: self.case.output_prefix_length].decode(
+        return self.proc_output[: self.output_prefix_length].decode(
             "utf-8", "replace"
         )
 
     @property
     def feedback(self) -> str:
-        # FIXME: Uninmplemented; dummy.
-        return self.feedback
+        return self._feedback
+
+
+# Per-submission verdicts, time, memory and points of every case, as flat
+# arrays indexed by case position rather than one `Result` per case.
+class ResultTable:
+    __slots__ = ("flags", "times", "memory", "points", "graded")
+
+    flags: array
+    times: array
+    memory: array
+    points: array
+    graded: bytearray
+
+    def __init__(self, size: int) -> None:
+        self.flags = array("i", [0]) * size
+        self.times = array("d", [0]) * size
+        self.memory = array("q", [0]) * size
+        self.points = array("d", [0]) * size
+        self.graded = bytearray(size)
+
+    def __len__(self) -> int:
+        return len(self.graded)
+
+    def record(self, result: Result) -> None:
+        position = result.position
+        self.flags[position] = result.result_flag
+        self.times[position] = result.execution_time
+        self.memory[position] = result.max_memory
+        self.points[position] = result.points
+        self.graded[position] = 1
+
+    def is_graded(self, position: int) -> bool:
+        return bool(self.graded[position])
+
+    def main_code(self, position: int) -> int:
+        return main_code(self.flags[position])
+
+    def failed(self, start: int, stop: int) -> bool:
+        return any(self.flags[start:stop])
+
+    def total_points(self) -> float:
+        return sum(self.points)
+
+    def total_time(self) -> float:
+        return sum(self.times)
+
+
+@dataclass(slots=True)
+class GradingStats:
+    cases_run: int = 0
+    cases_skipped: int = 0
+    # Cases whose result was taken from an identical pretest.
+    cases_reused: int = 0
+    # CPU time spent by the cases that ran.
+    cpu_time: float = 0
+
+    @property
+    def saved_cpu_time(self) -> float:
+        # Estimated: skipped and reused cases are assumed to cost as much as
+        # the average case that ran.
+        if not self.cases_run:
+            return 0
+        return (
+            self.cpu_time
+            / self.cases_run
+            * (self.cases_skipped + self.cases_reused)
+        )
 
 
 class CheckerResult:
@@ -0,0 +1,145 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+try:
+    from dmoj_judge.cptbox import TracedPopen
+    from dmoj_judge.cptbox.filesystem_policies import RecursiveDir
+    from dmoj_judge.cptbox.isolate import IsolateTracer
+    from dmoj_judge.cptbox.tracer import LANDLOCK_SUPPORTED, PIPE
+    from dmoj_judge.executors.filesystem import Filesystem
+except ImportError:
+    LANDLOCK_SUPPORTED = False
+
+# Opens every path it is given, or the directory after a "d:", and prints the
+# errno of each, or 0.
+OPENER = r"""
+#include <errno.h>
+#include <fcntl.h>
+#include <stdio.h>
+#include <string.h>
+
+int main(int argc, char **argv) {
+    for (int i = 1; i < argc; i++) {
+        int flags = O_RDONLY;
+        const char *path = argv[i];
+        if (!strncmp(path, "d:", 2)) {
+            flags |= O_DIRECTORY;
+            path += 2;
+        }
+        printf("%d\n", open(path, flags) < 0 ? errno : 0);
+    }
+    return 0;
+}
+"""
+
+
+@unittest.skipUnless(LANDLOCK_SUPPORTED, "needs Landlock")
+@unittest.skipUnless(shutil.which("cc"), "needs a C compiler")
+class LandlockTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.working_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.working_dir)
+        self.granted = os.path.join(self.working_dir, "granted")
+        self.secret = os.path.join(self.working_dir, "secret")
+        os.mkdir(self.granted)
+        os.mkdir(self.secret)
+        for directory in (self.granted, self.secret):
+            with open(os.path.join(directory, "file"), "w") as f:
+                f.write("data")
+        os.symlink("file", os.path.join(self.granted, "inside"))
+        os.symlink(
+            os.path.join(self.secret, "file"),
+            os.path.join(self.granted, "outside"),
+        )
+
+        source = os.path.join(self.working_dir, "opener.c")
+        with open(source, "w") as f:
+            f.write(OPENER)
+        self.opener = os.path.join(self.granted, "opener")
+        subprocess.run(["cc", "-o", self.opener, source], check=True)
+
+    def profile(self, read_fs: list) -> IsolateTracer:
+        return IsolateTracer(
+            read_fs=[
+                RecursiveDir(path)
+                for path in (
+                    "/usr",
+                    "/bin",
+                    "/sbin",
+                    "/lib",
+                    "/lib64",
+                    "/lib32",
+                    "/etc",
+                )
+                if os.path.isdir(path)
+            ]
+            + read_fs,
+            write_fs=[],
+        )
+
+    def decisions(
+        self, profile: IsolateTracer, paths: list[str], landlock: bool
+    ) -> list[int]:
+        process = TracedPopen(
+            [self.opener.encode()] + [path.encode() for path in paths],
+            executable=self.opener.encode(),
+            security=profile,
+            time=10,
+            memory=65536,
+            stdout=PIPE,
+            landlock=landlock,
+        )
+        stdout, _ = process.communicate()
+        self.assertIsNone(process.protection_fault)
+        self.assertEqual(process.returncode, 0)
+        return [int(line) for line in stdout.split()]
+
+    def assertSameDecisions(
+        self, profile: IsolateTracer, paths: list[str]
+    ) -> list[int]:
+        traced = self.decisions(profile, paths, landlock=False)
+        self.assertEqual(self.decisions(profile, paths, landlock=True), traced)
+        return traced
+
+    def test_plain_reads(self) -> None:
+        profile = self.profile([RecursiveDir(self.granted)])
+        decisions = self.assertSameDecisions(
+            profile,
+            [
+                os.path.join(self.granted, "file"),
+                os.path.join(self.granted, "inside"),
+                os.path.join(self.granted, "outside"),
+                os.path.join(self.granted, "missing"),
+                os.path.join(self.secret, "file"),
+                "d:" + self.secret,
+            ],
+        )
+        self.assertTrue(profile.landlock)
+        self.assertEqual(decisions[:2], [0, 0])
+        self.assertNotIn(0, decisions[2:])
+
+    def test_link_beside_granted(self) -> None:
+        # The tracer denies the link, while Landlock would only see the file.
+        link = os.path.join(self.working_dir, "link")
+        os.symlink(self.granted, link)
+        profile = self.profile([RecursiveDir(self.granted)])
+        decisions = self.assertSameDecisions(
+            profile, [os.path.join(link, "file")]
+        )
+        self.assertFalse(profile.landlock)
+        self.assertNotEqual(decisions, [0])
+
+    def test_process_files(self) -> None:
+        fs = Filesystem.default()
+        profile = IsolateTracer(
+            read_fs=fs.read + [RecursiveDir(self.granted)], write_fs=fs.write
+        )
+        decisions = self.assertSameDecisions(
+            profile, ["/proc/self/maps", "/proc/self/fd/0", "/bin/sh"]
+        )
+        self.assertFalse(profile.landlock)
+        self.assertEqual(decisions[0], 0)
+        self.assertNotIn(0, decisions[1:])
@@ -0,0 +1,74 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+try:
+    from dmoj_judge.cptbox import TracedPopen, PIPE
+    from dmoj_judge.cptbox.filesystem_policies import RecursiveDir
+    from dmoj_judge.cptbox.isolate import IsolateTracer
+    from dmoj_judge.cptbox.tracer import SECCOMP_NOTIFY_SUPPORTED
+    from dmoj_judge.executors.filesystem import Filesystem
+except ImportError:
+    SECCOMP_NOTIFY_SUPPORTED = False
+
+
+@unittest.skipUnless(SECCOMP_NOTIFY_SUPPORTED, "needs seccomp notify")
+class SeccompNotifyTest(unittest.TestCase):
+    def launch(
+        self, args: list[bytes], read_fs: list = [], **kwargs
+    ) -> TracedPopen:
+        fs = Filesystem.default()
+        return TracedPopen(
+            args,
+            executable=args[0],
+            security=IsolateTracer(
+                read_fs=read_fs + fs.read, write_fs=fs.write
+            ),
+            time=10,
+            memory=65536,
+            stdout=PIPE,
+            notify=True,
+            **kwargs,
+        )
+
+    def test_runs_with_ptrace(self) -> None:
+        process = self.launch([b"/bin/echo", b"hi"])
+        stdout, _ = process.communicate()
+        self.assertIsNone(process.protection_fault)
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(stdout, b"hi\n")
+
+    def test_runs_without_ptrace(self) -> None:
+        process = self.launch([b"/bin/echo", b"hi"], ptrace=False)
+        stdout, _ = process.communicate()
+        self.assertIsNone(process.protection_fault)
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(stdout, b"hi\n")
+
+    @unittest.skipUnless(shutil.which("cc"), "needs a C compiler")
+    def test_reports_violation(self) -> None:
+        with tempfile.TemporaryDirectory() as working_dir:
+            source = os.path.join(working_dir, "prctl.c")
+            with open(source, "w") as f:
+                f.write(
+                    "#include <sys/prctl.h>\n"
+                    "int main(void) { return prctl(PR_SET_DUMPABLE, 0); }\n"
+                )
+            binary = os.path.join(working_dir, "prctl")
+            subprocess.run(["cc", "-o", binary, source], check=True)
+
+            for ptrace in (True, False):
+                with self.subTest(ptrace=ptrace):
+                    # The supervisor denies whatever fails to be checked, so
+                    # only its log tells a broken handler from a denial.
+                    with self.assertNoLogs(level="ERROR"):
+                        process = self.launch(
+                            [binary.encode()],
+                            read_fs=[RecursiveDir(working_dir)],
+                            ptrace=ptrace,
+                        )
+                        process.communicate()
+                    self.assertIsNotNone(process.protection_fault)
+                    self.assertEqual(process.protection_fault[1], "sys_prctl")
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from dmoj_judge.config import ExecutorManagerConfig, ProblemConfig
+    from dmoj_judge.executors import BaseExecutor
+    from dmoj_judge.executors.filesystem import Filesystem
+    from dmoj_judge.executors.manager import ExecutorManager
+    from dmoj_judge.graders.standard import StandardGrader
+    from dmoj_judge.types import Problem, ProblemDataManager, ResultKind
+
+    SANDBOX_SUPPORTED = True
+except ImportError:
+    SANDBOX_SUPPORTED = False
+    BaseExecutor = object
+
+
+class CatExecutor(BaseExecutor):
+    # Echoes its input, whatever the submission.
+    ext = ""
+    filesystem = Filesystem.default() if SANDBOX_SUPPORTED else None
+    allowed_syscalls = ["fadvise64"]
+
+    def get_executable(self) -> str:
+        return os.path.realpath("/bin/cat")
+
+    def get_cmdline(self, **kwargs) -> list[str]:
+        return ["cat"]
+
+    def create_files(self) -> None:
+        pass
+
+
+@unittest.skipUnless(SANDBOX_SUPPORTED, "needs the sandbox extension")
+class StandardGraderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.problem_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.problem_dir)
+        files = {
+            "echo.in": b"1 2\n3\n",
+            "echo.out": b"1  2\n3",
+            "other.out": b"1 2 4\n",
+        }
+        for name, data in files.items():
+            with open(os.path.join(self.problem_dir, name), "wb") as f:
+                f.write(data)
+
+        config = ProblemConfig(
+            test_cases=[
+                {"in": "echo.in", "out": "echo.out", "points": 5},
+                {"in": "echo.in", "out": "other.out", "points": 5},
+            ]
+        )
+        self.problem = Problem(
+            "echo",
+            2.0,
+            65536,
+            {},
+            config,
+            ProblemDataManager(self.problem_dir),
+        )
+        self.executors = ExecutorManager(
+            ExecutorManagerConfig(include_builtin=False)
+        )
+        self.executors["CAT"] = CatExecutor
+
+    def test_grades_cases(self) -> None:
+        grader = StandardGrader(self.executors, self.problem, "CAT", b"")
+        self.addCleanup(grader.executor.cleanup)
+        accepted, wrong = [
+            grader.grade(case) for case in self.problem.plan.cases
+        ]
+
+        self.assertEqual(accepted.result_flag, ResultKind.AC.value[0])
+        self.assertEqual(accepted.points, 5)
+        self.assertEqual(accepted.proc_output, b"1 2\n3\n")
+        self.assertGreater(accepted.wall_clock_time, 0)
+
+        self.assertEqual(wrong.readable_codes, ["WA"])
+        self.assertEqual(wrong.points, 0)
+
+    def test_restores_replaced_assets(self) -> None:
+        grader = StandardGrader(self.executors, self.problem, "CAT", b"")
+        self.addCleanup(grader.executor.cleanup)
+        case = self.problem.plan.cases[0]
+        grader.grade(case)
+        agent = os.path.join(grader.executor.working_dir, "setbufsize.so")
+        if not os.path.exists(agent):
+            self.skipTest("setbufsize.so isn't built")
+        with open(agent, "rb") as f:
+            data = f.read()
+
+        os.unlink(agent)
+        with open(agent, "wb") as f:
+            f.write(b"not an agent")
+        self.assertEqual(grader.grade(case).result_flag, ResultKind.AC.value[0])
+        with open(agent, "rb") as f:
+            self.assertEqual(f.read(), data)